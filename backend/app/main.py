@@ -1,8 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import users, projects, audio, transcriptions, segments, shares, notifications, health
+from starlette.concurrency import run_in_threadpool
+from app import db_pool, pg_listener
+from app.routers import users, projects, audio, transcriptions, segments, shares, notifications, health, search
 
-app = FastAPI(title="Speech2Text X API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Las rutas async usan el pool asíncrono, ligado al event loop del servidor
+    await db_pool.open_async_pool()
+    # LISTEN/NOTIFY para invalidar cachés entre procesos (share_cache)
+    await run_in_threadpool(pg_listener.start)
+    try:
+        yield
+    finally:
+        await run_in_threadpool(pg_listener.stop)
+        await db_pool.close_async_pool()
+
+app = FastAPI(title="Speech2Text X API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,6 +25,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(health.router, prefix="/health", tags=["health"])
@@ -20,3 +36,4 @@ app.include_router(transcriptions.router, prefix="/transcriptions", tags=["trans
 app.include_router(segments.router, prefix="/segments", tags=["segments"])
 app.include_router(shares.router, prefix="/shares", tags=["shares"])
 app.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
+app.include_router(search.router, prefix="/search", tags=["search"])
@@ -0,0 +1,53 @@
+"""
+Métricas simples en memoria del proceso (contadores, observaciones e histogramas).
+
+Se exponen en GET /health/metrics.
+"""
+import threading
+from typing import Dict, Sequence
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_observations: Dict[str, Dict[str, float]] = {}
+_histograms: Dict[str, Dict[str, float]] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, value: float) -> None:
+    """Registra un valor por evento (p. ej. por trabajo): cantidad, suma, último y máximo."""
+    with _lock:
+        o = _observations.setdefault(name, {"count": 0, "sum": 0, "last": 0, "max": 0})
+        o["count"] += 1
+        o["sum"] += value
+        o["last"] = value
+        o["max"] = max(o["max"], value)
+
+
+def histogram(name: str, value: float, buckets: Sequence[float]) -> None:
+    """Cuenta el valor en el primer tramo 'le' que lo contiene (o en '+Inf')."""
+    label = next((str(b) for b in buckets if value <= b), "+Inf")
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = {**{str(b): 0 for b in buckets}, "+Inf": 0, "count": 0, "sum": 0}
+        h[label] += 1
+        h["count"] += 1
+        h["sum"] += value
+
+
+def get_histogram(name: str) -> Dict[str, float]:
+    with _lock:
+        return dict(_histograms.get(name, {}))
+
+
+def snapshot() -> Dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "observations": {k: dict(v) for k, v in _observations.items()},
+            "histograms": {k: dict(v) for k, v in _histograms.items()},
+        }
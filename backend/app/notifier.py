@@ -0,0 +1,202 @@
+"""
+Despachador de notificaciones respaldado por Postgres (outbox).
+
+Uso: python -m app.notifier [--concurrency N] [--batch-size N]
+
+Reclama lotes de notifications 'pending' con FOR UPDATE SKIP LOCKED (una
+reserva con vencimiento, ver repo_notifications.claim_pending), las entrega
+en paralelo por el canal de su tipo (services.notify_channels) y registra
+cada resultado apenas termina su envío: 'sent', 'failed' o 'pending' con el
+próximo intento según el backoff. El lote se acota para que su peor caso
+(todos los envíos colgados hasta el timeout) quede holgado dentro de la
+reserva. Varios despachadores pueden correr a la vez: ninguno toma una
+notificación reservada por otro.
+"""
+import argparse
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app import metrics, repo_notifications
+from app.services import notify_channels
+from app.services.notify_channels import Channel, PermanentDeliveryError
+
+log = logging.getLogger("s2x.notifier")
+
+
+class RateLimiter:
+    """
+    Token bucket por destino: 'burst' envíos seguidos y luego 'per_minute'.
+    Es por proceso; con N despachadores el límite efectivo es N veces mayor.
+    """
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._pruned = time.monotonic()
+
+    def _prune(self, now: float) -> None:
+        # Un balde que volvió a llenarse equivale a uno ausente: se descarta
+        self._pruned = now
+        for key, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * self.rate >= self.burst:
+                del self._buckets[key]
+
+    def acquire(self, key: str) -> float:
+        """0 si puede enviarse ya; si no, segundos hasta el próximo turno."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            # Una pasada por cada intervalo de recarga completa: costo amortizado constante
+            if now - self._pruned >= self.burst / self.rate:
+                self._prune(now)
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        concurrency: int = 4,
+        batch_size: int = 50,
+        poll_interval: float = 1.0,
+        lease_sec: float = 300.0,
+        send_timeout_sec: float = 30.0,
+        max_attempts: int = 5,
+        backoff_sec: float = 30.0,
+        max_backoff_sec: float = 3600.0,
+        limiter: Optional[RateLimiter] = None,
+        channels: Callable[[str], Channel] = notify_channels.get_channel,
+    ):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.lease_sec = lease_sec
+        # Peor caso de un lote: rondas de 'concurrency' envíos que agotan el
+        # timeout. Se limita a la mitad de la reserva.
+        rounds = max(1, int(lease_sec / 2 // send_timeout_sec)) if send_timeout_sec > 0 else batch_size
+        self.batch_size = max(1, min(batch_size, self.concurrency * rounds))
+        if self.batch_size < batch_size:
+            log.info("batch size capped to %s to fit the %ss lease", self.batch_size, lease_sec)
+        elif send_timeout_sec > lease_sec / 2:
+            log.warning("send timeout %ss does not fit in half the %ss lease", send_timeout_sec, lease_sec)
+        self.max_attempts = max_attempts
+        self.backoff_sec = backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.limiter = limiter or RateLimiter(0, 1)
+        self.channels = channels
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="s2x-notify")
+        self._stop = threading.Event()
+
+    def backoff(self, attempts: int) -> float:
+        # Exponencial con jitter para no reintentar todos a la vez
+        delay = min(self.max_backoff_sec, self.backoff_sec * 2 ** max(0, attempts - 1))
+        return delay * random.uniform(0.8, 1.0)
+
+    def deliver(self, n: Dict[str, Any]) -> Dict[str, Any]:
+        wait = self.limiter.acquire(f"{n['type']}:{n['target']}")
+        if wait > 0:
+            metrics.incr("notifications.rate_limited")
+            return {"id": n["id"], "status": "pending", "delay_sec": wait, "rate_limited": True}
+        try:
+            self.channels(n["type"]).send(n)
+        except PermanentDeliveryError as e:
+            log.warning("notification %s failed permanently: %s", n["id"], e)
+            return {"id": n["id"], "status": "failed", "error": str(e)}
+        except Exception as e:
+            if n["attempts"] >= self.max_attempts:
+                log.warning("notification %s failed after %s attempts: %s", n["id"], n["attempts"], e)
+                return {"id": n["id"], "status": "failed", "error": str(e)}
+            metrics.incr("notifications.retried")
+            return {"id": n["id"], "status": "pending", "error": str(e), "delay_sec": self.backoff(n["attempts"])}
+        return {"id": n["id"], "status": "sent"}
+
+    def _record(self, results: List[Dict[str, Any]]) -> None:
+        recorded = repo_notifications.finish_deliveries(self.worker_id, results)
+        if recorded < len(results):
+            # La reserva venció antes de terminar: otro despachador pudo tomarlas
+            log.warning("%s notification result(s) dropped: lease expired", len(results) - recorded)
+        for r in results:
+            if r["status"] != "pending":
+                metrics.incr(f"notifications.{r['status']}")
+
+    def run_once(self) -> int:
+        """
+        Reclama un lote y lo entrega en paralelo. Cada resultado se registra
+        apenas termina su envío (junto con los que terminaron a la vez), así
+        un envío colgado no retiene los ya hechos hasta que vence la reserva.
+        """
+        claimed = repo_notifications.claim_pending(self.worker_id, self.batch_size, self.lease_sec)
+        if not claimed:
+            return 0
+        pending = {self._executor.submit(self.deliver, n) for n in claimed}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            self._record([f.result() for f in done])
+        return len(claimed)
+
+    def stop(self, *_args) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        log.info("notifier %s started (concurrency=%s, batch=%s)", self.worker_id, self.concurrency, self.batch_size)
+        while not self._stop.is_set():
+            try:
+                n = self.run_once()
+            except Exception:
+                log.exception("dispatch failed")
+                n = 0
+            # Lote lleno: probablemente quedan más, se sigue sin esperar
+            if n < self.batch_size:
+                self._stop.wait(self.poll_interval)
+        self._executor.shutdown(wait=True)
+        log.info("notifier %s stopped", self.worker_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Speech2Text X notification dispatcher")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("S2X_NOTIFY_CONCURRENCY", "8")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("S2X_NOTIFY_BATCH", "50")))
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("S2X_NOTIFY_POLL_SEC", "1.0")))
+    # El lote se acota para que el peor caso (timeout x lote / concurrencia) quepa en la mitad de la reserva
+    parser.add_argument("--lease", type=float, default=float(os.getenv("S2X_NOTIFY_LEASE_SEC", "300")))
+    parser.add_argument("--send-timeout", type=float, default=float(os.getenv("S2X_SMTP_TIMEOUT_SEC", "30")))
+    parser.add_argument("--max-attempts", type=int, default=int(os.getenv("S2X_NOTIFY_MAX_ATTEMPTS", "5")))
+    parser.add_argument("--backoff", type=float, default=float(os.getenv("S2X_NOTIFY_BACKOFF_SEC", "30")))
+    parser.add_argument("--rate-per-minute", type=float, default=float(os.getenv("S2X_NOTIFY_RATE_PER_MIN", "20")))
+    parser.add_argument("--burst", type=int, default=int(os.getenv("S2X_NOTIFY_BURST", "5")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    dispatcher = Dispatcher(
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        lease_sec=args.lease,
+        send_timeout_sec=args.send_timeout,
+        max_attempts=args.max_attempts,
+        backoff_sec=args.backoff,
+        limiter=RateLimiter(args.rate_per_minute, args.burst),
+    )
+    signal.signal(signal.SIGTERM, dispatcher.stop)
+    signal.signal(signal.SIGINT, dispatcher.stop)
+    dispatcher.run()
+
+
+if __name__ == "__main__":
+    main()
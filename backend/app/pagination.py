@@ -0,0 +1,84 @@
+"""
+Paginación por keyset (cursor) para los endpoints de listado.
+
+El cursor es opaco para el cliente: base64 de la lista de valores de orden
+de la última fila entregada. La siguiente página se pide con ?cursor=... y
+se filtra con una comparación de tuplas, que el índice compuesto resuelve
+sin recorrer las filas anteriores (a diferencia de OFFSET, que por eso no se
+acepta junto con un cursor). El cuerpo sigue
+siendo la lista de filas; el cursor siguiente va en la cabecera X-Next-Cursor.
+La página se devuelve ya serializada con orjson (app.responses).
+"""
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from app.responses import FastJSONResponse
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"No serializable en cursor: {type(value)!r}")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), default=_default, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_cursor(token: Optional[str], size: int, offset: int = 0) -> Optional[List[Any]]:
+    if not token:
+        return None
+    # Con cursor, OFFSET volvería a recorrer 'offset' filas en cada página
+    if offset:
+        raise HTTPException(status_code=400, detail="offset cannot be combined with cursor")
+    try:
+        return decode_cursor(token, size)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_clause(columns: Sequence[Tuple[str, str]], after: Optional[Sequence[Any]],
+                  descending: bool) -> Tuple[str, Dict[str, Any]]:
+    """
+    Condición ' AND (c1, c2) > (v1, v2)' (o '<' si el orden es descendente)
+    para continuar después de 'after'. 'columns' son pares (columna, tipo SQL).
+    """
+    if after is None:
+        return "", {}
+    params = {f"k{i}": v for i, v in enumerate(after)}
+    cols = ", ".join(c for c, _ in columns)
+    vals = ", ".join(f"%(k{i})s::{t}" for i, (_, t) in enumerate(columns))
+    return f" AND ({cols}) {'<' if descending else '>'} ({vals})", params
+
+
+def page(rows: List[Dict[str, Any]], limit: int, keys: Sequence[str]) -> FastJSONResponse:
+    """
+    Recorta a 'limit' filas (el repositorio se consulta con limit + 1) y, si
+    hay más, publica el cursor de la última fila en la cabecera.
+    """
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor([rows[-1][k] for k in keys])
+    return FastJSONResponse(rows, headers=headers)
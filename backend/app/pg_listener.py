@@ -0,0 +1,103 @@
+"""
+Escucha de canales de Postgres (LISTEN/NOTIFY) en un hilo propio.
+
+Los módulos registran manejadores por canal con subscribe(); el hilo abre
+una conexión dedicada en autocommit (fuera de los pools), hace LISTEN de
+todos los canales registrados y entrega cada payload al manejador. Si la
+conexión se cae, reconecta con espera creciente y llama a 'on_reconnect'
+de cada suscripción, porque las notificaciones enviadas mientras tanto se
+pierden. Se arranca y detiene en el lifespan de la API.
+"""
+import logging
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import psycopg
+from psycopg import sql
+
+from app import metrics
+from app.db_pool import DB_URL
+
+log = logging.getLogger(__name__)
+
+
+class _Subscription(NamedTuple):
+    handler: Callable[[str], None]
+    on_reconnect: Optional[Callable[[], None]]
+
+
+_subscriptions: Dict[str, List[_Subscription]] = {}
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+_connected = threading.Event()
+
+
+def subscribe(channel: str, handler: Callable[[str], None], on_reconnect: Optional[Callable[[], None]] = None) -> None:
+    """Agrega un manejador al canal; debe llamarse antes de start()."""
+    with _lock:
+        _subscriptions.setdefault(channel, []).append(_Subscription(handler, on_reconnect))
+
+
+def is_listening() -> bool:
+    return _connected.is_set()
+
+
+def _dispatch(channel: str, payload: str) -> None:
+    metrics.incr(f"pg_notify.{channel}")
+    for sub in _subscriptions.get(channel, ()):
+        try:
+            sub.handler(payload)
+        except Exception:
+            log.exception("Error handling notification on %s", channel)
+
+
+def _listen_once(poll_sec: float) -> None:
+    with psycopg.connect(DB_URL, autocommit=True) as conn:
+        with _lock:
+            subs = {channel: list(handlers) for channel, handlers in _subscriptions.items()}
+        for channel in subs:
+            conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        # Lo que cambió mientras no escuchábamos no llegó: se descarta
+        for sub in (s for handlers in subs.values() for s in handlers):
+            if sub.on_reconnect:
+                sub.on_reconnect()
+        _connected.set()
+        try:
+            while not _stop.is_set():
+                for n in conn.notifies(timeout=poll_sec):
+                    _dispatch(n.channel, n.payload)
+        finally:
+            _connected.clear()
+
+
+def _run(poll_sec: float) -> None:
+    backoff = 0.5
+    while not _stop.is_set():
+        try:
+            _listen_once(poll_sec)
+            backoff = 0.5
+        except Exception:
+            log.exception("LISTEN connection lost; retrying in %.1fs", backoff)
+            metrics.incr("pg_listener.reconnects")
+            _stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+def start(poll_sec: float = 1.0, wait_sec: float = 5.0) -> None:
+    """Arranca el hilo y espera (hasta 'wait_sec') a que el LISTEN esté activo."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=(poll_sec,), name="pg-listener", daemon=True)
+    _thread.start()
+    _connected.wait(wait_sec)
+
+
+def stop() -> None:
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+        _thread = None
@@ -1,12 +1,6 @@
 from typing import List, Dict, Any, Optional
-from app.db_pool import get_conn
-
-def _rows_to_dicts(cur, rows):
-    cols = [d[0] for d in cur.description]
-    return [dict(zip(cols, r)) for r in rows]
-
-def _row_to_dict(cur, row):
-    return dict(zip([d[0] for d in cur.description], row)) if row else None
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
 
 def upsert_artifact(transcription_id: str, kind: str, s3_uri: str) -> Dict[str, Any]:
     sql = (
@@ -15,22 +9,40 @@ def upsert_artifact(transcription_id: str, kind: str, s3_uri: str) -> Dict[str,
         "ON CONFLICT (transcription_id, kind) DO UPDATE SET s3_uri = EXCLUDED.s3_uri, created_at = NOW() "
         "RETURNING id, transcription_id, kind, s3_uri, created_at;"
     )
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn() as conn, dict_cursor(conn) as cur:
         cur.execute(sql, {"tid": transcription_id, "kind": kind, "uri": s3_uri})
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+_LIST_ARTIFACTS_SQL = "SELECT * FROM transcription_artifacts WHERE transcription_id = %(tid)s ORDER BY created_at DESC;"
 
 def list_artifacts(transcription_id: str) -> List[Dict[str, Any]]:
-    sql = "SELECT * FROM transcription_artifacts WHERE transcription_id = %(tid)s ORDER BY created_at DESC;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"tid": transcription_id})
-        return _rows_to_dicts(cur, cur.fetchall())
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_LIST_ARTIFACTS_SQL, {"tid": transcription_id})
+        return cur.fetchall()
+
+async def list_artifacts_async(transcription_id: str) -> List[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_LIST_ARTIFACTS_SQL, {"tid": transcription_id})
+        return await cur.fetchall()
+
+_GET_ARTIFACT_SQL = "SELECT * FROM transcription_artifacts WHERE transcription_id = %(tid)s AND kind = %(kind)s;"
+
+def get_artifact(transcription_id: str, kind: str) -> Optional[Dict[str, Any]]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_GET_ARTIFACT_SQL, {"tid": transcription_id, "kind": kind})
+        return cur.fetchone()
+
+async def get_artifact_async(transcription_id: str, kind: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_GET_ARTIFACT_SQL, {"tid": transcription_id, "kind": kind})
+        return await cur.fetchone()
 
 def delete_artifact(transcription_id: str, kind: str) -> Optional[str]:
     sql = "DELETE FROM transcription_artifacts WHERE transcription_id = %(tid)s AND kind = %(kind)s RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn() as conn, dict_cursor(conn) as cur:
         cur.execute(sql, {"tid": transcription_id, "kind": kind})
         row = cur.fetchone()
         conn.commit()
-        return row[0] if row else None
+        return row["id"] if row else None
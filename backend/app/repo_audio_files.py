@@ -1,42 +1,74 @@
-from typing import Optional, List, Dict, Any
-from app.db_pool import get_conn
+from typing import Optional, List, Dict, Any, Sequence
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
+from app.pagination import keyset_clause
 
-def _rows_to_dicts(cur, rows):
-    cols = [d[0] for d in cur.description]
-    return [dict(zip(cols, r)) for r in rows]
-
-def _row_to_dict(cur, row):
-    return dict(zip([d[0] for d in cur.description], row)) if row else None
+_CREATE_AUDIO_SQL = (
+    "INSERT INTO audio_files (project_id, s3_uri, duration_sec, sample_rate, channels, format, size_bytes) "
+    "VALUES (%(project_id)s, %(s3_uri)s, %(duration_sec)s, %(sample_rate)s, %(channels)s, %(format)s, %(size_bytes)s) "
+    "RETURNING id, project_id, s3_uri, duration_sec, sample_rate, channels, format, size_bytes, created_at;"
+)
 
 def create_audio(project_id: str, s3_uri: str, duration_sec: int = None,
                  sample_rate: int = None, channels: int = None,
                  format: str = None, size_bytes: int = None) -> Dict[str, Any]:
-    sql = (
-        "INSERT INTO audio_files (project_id, s3_uri, duration_sec, sample_rate, channels, format, size_bytes) "
-        "VALUES (%(project_id)s, %(s3_uri)s, %(duration_sec)s, %(sample_rate)s, %(channels)s, %(format)s, %(size_bytes)s) "
-        "RETURNING id, project_id, s3_uri, duration_sec, sample_rate, channels, format, size_bytes, created_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, { "project_id": project_id, "s3_uri": s3_uri, "duration_sec": duration_sec,
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_CREATE_AUDIO_SQL, { "project_id": project_id, "s3_uri": s3_uri, "duration_sec": duration_sec,
                            "sample_rate": sample_rate, "channels": channels, "format": format, "size_bytes": size_bytes })
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def create_audio_async(project_id: str, s3_uri: str, duration_sec: int = None,
+                             sample_rate: int = None, channels: int = None,
+                             format: str = None, size_bytes: int = None) -> Dict[str, Any]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_CREATE_AUDIO_SQL, { "project_id": project_id, "s3_uri": s3_uri, "duration_sec": duration_sec,
+                                 "sample_rate": sample_rate, "channels": channels, "format": format, "size_bytes": size_bytes })
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+_GET_AUDIO_SQL = "SELECT * FROM audio_files WHERE id = %(id)s;"
 
 def get_audio(audio_id: str) -> Optional[Dict[str, Any]]:
-    sql = "SELECT * FROM audio_files WHERE id = %(id)s;"
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_GET_AUDIO_SQL, {"id": audio_id})
+        return cur.fetchone()
+
+async def get_audio_async(audio_id: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_GET_AUDIO_SQL, {"id": audio_id})
+        return await cur.fetchone()
+
+_SET_CONTENT_SHA256_SQL = "UPDATE audio_files SET content_sha256 = %(sha)s WHERE id = %(id)s;"
+
+def set_content_sha256(audio_id: str, sha: str) -> None:
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": audio_id})
-        return _row_to_dict(cur, cur.fetchone())
+        cur.execute(_SET_CONTENT_SHA256_SQL, {"id": audio_id, "sha": sha})
+        conn.commit()
 
-def list_audio(project_id: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+AUDIO_KEYS = (("created_at", "timestamptz"), ("id", "uuid"))
+
+def _list_audio_query(project_id: str, limit: int, offset: int, after: Optional[Sequence[Any]]):
+    keyset, kparams = keyset_clause(AUDIO_KEYS, after, descending=True)
     sql = (
-        "SELECT * FROM audio_files WHERE project_id = %(project_id)s "
-        "ORDER BY created_at DESC LIMIT %(limit)s OFFSET %(offset)s;"
+        "SELECT * FROM audio_files WHERE project_id = %(project_id)s" + keyset + " "
+        "ORDER BY created_at DESC, id DESC LIMIT %(limit)s OFFSET %(offset)s;"
     )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"project_id": project_id, "limit": limit, "offset": offset})
-        return _rows_to_dicts(cur, cur.fetchall())
+    return sql, {"project_id": project_id, "limit": limit, "offset": offset, **kparams}
+
+def list_audio(project_id: str, limit: int = 50, offset: int = 0,
+               after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(*_list_audio_query(project_id, limit, offset, after))
+        return cur.fetchall()
+
+async def list_audio_async(project_id: str, limit: int = 50, offset: int = 0,
+                           after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(*_list_audio_query(project_id, limit, offset, after))
+        return await cur.fetchall()
 
 def update_audio(audio_id: str, **fields) -> Optional[Dict[str, Any]]:
     sql = (
@@ -48,16 +80,16 @@ def update_audio(audio_id: str, **fields) -> Optional[Dict[str, Any]]:
         "WHERE id = %(id)s RETURNING *;"
     )
     params = {"id": audio_id, **fields}
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn() as conn, dict_cursor(conn) as cur:
         cur.execute(sql, params)
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
 
 def delete_audio(audio_id: str) -> Optional[str]:
     sql = "DELETE FROM audio_files WHERE id = %(id)s RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn() as conn, dict_cursor(conn) as cur:
         cur.execute(sql, {"id": audio_id})
         row = cur.fetchone()
         conn.commit()
-        return row[0] if row else None
+        return row["id"] if row else None
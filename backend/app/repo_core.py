@@ -0,0 +1,12 @@
+"""
+Núcleo común de los repositorios.
+
+Los cursores usan la row_factory dict_row de psycopg: cada fila llega ya
+como dict desde el adaptador, sin reconstruirla en cada módulo a partir de
+cur.description. Sirve igual para conexiones síncronas y asíncronas.
+"""
+from psycopg.rows import dict_row
+
+
+def dict_cursor(conn, **kwargs):
+    return conn.cursor(row_factory=dict_row, **kwargs)
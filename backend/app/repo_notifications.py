@@ -1,16 +1,33 @@
-from typing import Optional, List, Dict, Any
-from app.db_pool import get_conn
+from typing import Optional, List, Dict, Any, Sequence
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
+from app.pagination import keyset_clause
 import json
 
 VALID_STATUS = {"pending", "sent", "failed"}
-VALID_TYPE = {"email", "slack", "sms"}
+VALID_TYPE = {"email", "whatsapp"}
 
-def _rows_to_dicts(cur, rows):
-    cols = [d[0] for d in cur.description]
-    return [dict(zip(cols, r)) for r in rows]
+_CREATE_NOTIFICATION_SQL = (
+    "INSERT INTO notifications (transcription_id, user_id, type, target, status, payload) "
+    "VALUES (%(tid)s, %(uid)s, %(type)s::notification_type_enum, %(target)s, %(status)s::notification_status_enum, %(payload)s::jsonb) "
+    "RETURNING id, transcription_id, type, target, status, payload, created_at;"
+)
 
-def _row_to_dict(cur, row):
-    return dict(zip([d[0] for d in cur.description], row)) if row else None
+def _create_notification_params(transcription_id, type_, target, user_id, status, payload) -> Dict[str, Any]:
+    if type_ not in VALID_TYPE:
+        raise ValueError(f"Invalid type '{type_}', must be one of {VALID_TYPE}")
+
+    if status not in VALID_STATUS:
+        raise ValueError(f"Invalid status '{status}', must be one of {VALID_STATUS}")
+
+    return {
+        "tid": transcription_id,
+        "uid": user_id,
+        "type": type_,
+        "target": target,
+        "status": status,
+        "payload": json.dumps(payload) if payload else None
+    }
 
 def create_notification(
     transcription_id: str,
@@ -20,66 +37,152 @@ def create_notification(
     status: str = "pending",
     payload: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
+    params = _create_notification_params(transcription_id, type_, target, user_id, status, payload)
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_CREATE_NOTIFICATION_SQL, params)
+        row = cur.fetchone()
+        conn.commit()
+        return row
 
-    if type_ not in VALID_TYPE:
-        raise ValueError(f"Invalid type '{type_}', must be one of {VALID_TYPE}")
+async def create_notification_async(
+    transcription_id: str,
+    type_: str,
+    target: str,
+    user_id: Optional[str] = None,
+    status: str = "pending",
+    payload: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    params = _create_notification_params(transcription_id, type_, target, user_id, status, payload)
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_CREATE_NOTIFICATION_SQL, params)
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
 
-    if status not in VALID_STATUS:
-        raise ValueError(f"Invalid status '{status}', must be one of {VALID_STATUS}")
+NOTIFICATION_KEYS = (("created_at", "timestamptz"), ("id", "uuid"))
 
+def _list_notifications_query(transcription_id: str, limit: int, offset: int, after: Optional[Sequence[Any]]):
+    keyset, kparams = keyset_clause(NOTIFICATION_KEYS, after, descending=True)
     sql = (
-        "INSERT INTO notifications (transcription_id, user_id, type, target, status, payload) "
-        "VALUES (%(tid)s, %(uid)s, %(type)s::notification_type_enum, %(target)s, %(status)s::notification_status_enum, %(payload)s::jsonb) "
-        "RETURNING id, transcription_id, type, target, status, payload, created_at;"
+        "SELECT * FROM notifications WHERE transcription_id = %(tid)s" + keyset + " "
+        "ORDER BY created_at DESC, id DESC LIMIT %(limit)s OFFSET %(offset)s;"
     )
+    return sql, {"tid": transcription_id, "limit": limit, "offset": offset, **kparams}
 
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {
-            "tid": transcription_id,
-            "uid": user_id,
-            "type": type_,
-            "target": target,
-            "status": status,
-            "payload": json.dumps(payload) if payload else None
-        })
-        row = cur.fetchone()
-        conn.commit()
-        return _row_to_dict(cur, row)
+def list_notifications(transcription_id: str, limit: int = 50, offset: int = 0,
+                       after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(*_list_notifications_query(transcription_id, limit, offset, after))
+        return cur.fetchall()
 
-def list_notifications(transcription_id: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-    sql = (
-        "SELECT * FROM notifications WHERE transcription_id = %(tid)s "
-        "ORDER BY created_at DESC LIMIT %(limit)s OFFSET %(offset)s;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"tid": transcription_id, "limit": limit, "offset": offset})
-        return _rows_to_dicts(cur, cur.fetchall())
+async def list_notifications_async(transcription_id: str, limit: int = 50, offset: int = 0,
+                                   after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(*_list_notifications_query(transcription_id, limit, offset, after))
+        return await cur.fetchall()
 
-def update_notification_status(nid: str, status: str, payload: dict = None) -> Optional[Dict[str, Any]]:
+_UPDATE_NOTIFICATION_STATUS_SQL = (
+    "UPDATE notifications SET "
+    "status = %(status)s::notification_status_enum, "
+    "payload = COALESCE(%(payload)s::jsonb, payload) "
+    "WHERE id = %(id)s "
+    "RETURNING id, status, payload, created_at;"
+)
+
+def _update_status_params(nid: str, status: str, payload: Optional[dict]) -> Dict[str, Any]:
     if status not in VALID_STATUS:
         raise ValueError(f"Invalid status: {status}. Must be one of {VALID_STATUS}")
+    return {"id": nid, "status": status, "payload": json.dumps(payload) if payload else None}
 
-    sql = (
-        "UPDATE notifications SET "
-        "status = %(status)s::notification_status_enum, "
-        "payload = COALESCE(%(payload)s::jsonb, payload) "
-        "WHERE id = %(id)s "
-        "RETURNING id, status, payload, created_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {
-            "id": nid,
-            "status": status,
-            "payload": json.dumps(payload) if payload else None
-        })
+def update_notification_status(nid: str, status: str, payload: dict = None) -> Optional[Dict[str, Any]]:
+    params = _update_status_params(nid, status, payload)
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_UPDATE_NOTIFICATION_STATUS_SQL, params)
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def update_notification_status_async(nid: str, status: str, payload: dict = None) -> Optional[Dict[str, Any]]:
+    params = _update_status_params(nid, status, payload)
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_UPDATE_NOTIFICATION_STATUS_SQL, params)
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+_DELETE_NOTIFICATION_SQL = "DELETE FROM notifications WHERE id = %(id)s RETURNING id;"
 
 def delete_notification(nid: str) -> Optional[str]:
-    sql = "DELETE FROM notifications WHERE id = %(id)s RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": nid})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_DELETE_NOTIFICATION_SQL, {"id": nid})
         row = cur.fetchone()
         conn.commit()
-        return row[0] if row else None
+        return row["id"] if row else None
+
+async def delete_notification_async(nid: str) -> Optional[str]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_DELETE_NOTIFICATION_SQL, {"id": nid})
+        row = await cur.fetchone()
+        await conn.commit()
+        return row["id"] if row else None
+
+# --- Despacho (app/notifier.py) ---
+
+_CLAIM_PENDING_SQL = (
+    "UPDATE notifications n SET locked_by = %(worker)s, "
+    "locked_until = NOW() + make_interval(secs => %(lease)s), attempts = n.attempts + 1 "
+    "FROM (SELECT id FROM notifications WHERE status = 'pending' AND next_attempt_at <= NOW() "
+    "AND (locked_until IS NULL OR locked_until < NOW()) "
+    "ORDER BY next_attempt_at, id LIMIT %(limit)s FOR UPDATE SKIP LOCKED) q "
+    "WHERE n.id = q.id "
+    "RETURNING n.id, n.transcription_id, n.user_id, n.type, n.target, n.payload, n.attempts;"
+)
+
+def claim_pending(worker_id: str, limit: int, lease_sec: float) -> List[Dict[str, Any]]:
+    """
+    Reserva hasta 'limit' notificaciones pendientes y vencidas para este
+    despachador durante 'lease_sec' segundos. Con FOR UPDATE SKIP LOCKED
+    varios despachadores reclaman en paralelo sin tomar la misma fila; si uno
+    muere, la reserva vence y otro la reintenta.
+    """
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_CLAIM_PENDING_SQL, {"worker": worker_id, "limit": limit, "lease": lease_sec})
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+# 'refund' descuenta el intento de las que no llegaron a enviarse (límite por destino)
+_FINISH_DELIVERIES_SQL = (
+    "UPDATE notifications n SET status = r.status::notification_status_enum, "
+    "sent_at = CASE WHEN r.status = 'sent' THEN NOW() END, "
+    "next_attempt_at = NOW() + make_interval(secs => r.delay), "
+    "attempts = n.attempts - r.refund, "
+    "last_error = COALESCE(r.error, CASE WHEN r.status = 'sent' THEN NULL ELSE n.last_error END), "
+    "locked_by = NULL, locked_until = NULL "
+    "FROM unnest(%(ids)s::uuid[], %(statuses)s::text[], %(errors)s::text[], %(delays)s::float8[], %(refunds)s::int[]) "
+    "AS r(id, status, error, delay, refund) "
+    "WHERE n.id = r.id AND n.locked_by = %(worker)s RETURNING n.id;"
+)
+
+def finish_deliveries(worker_id: str, results: List[Dict[str, Any]]) -> int:
+    """
+    Registra el resultado de un lote en una sola sentencia. Cada resultado
+    tiene id, status ('sent', 'failed' o 'pending' para reintentar), error,
+    delay_sec y rate_limited. Solo se tocan filas que siguen reservadas por
+    este despachador.
+    """
+    if not results:
+        return 0
+    params = {
+        "worker": worker_id,
+        "ids": [r["id"] for r in results],
+        "statuses": [r["status"] for r in results],
+        "errors": [r.get("error") for r in results],
+        "delays": [float(r.get("delay_sec") or 0) for r in results],
+        "refunds": [1 if r.get("rate_limited") else 0 for r in results],
+    }
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_FINISH_DELIVERIES_SQL, params)
+        rows = cur.fetchall()
+        conn.commit()
+        return len(rows)
@@ -1,56 +1,94 @@
-from typing import Optional, List, Dict, Any
-from app.db_pool import get_conn
+from typing import Optional, List, Dict, Any, Sequence
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
+from app.pagination import keyset_clause
 
-def _rows_to_dicts(cur, rows):
-    cols = [d[0] for d in cur.description]
-    return [dict(zip(cols, r)) for r in rows]
-
-def _row_to_dict(cur, row):
-    return dict(zip([d[0] for d in cur.description], row)) if row else None
+_CREATE_PROJECT_SQL = (
+    "INSERT INTO projects (owner_id, name) VALUES (%(owner_id)s, %(name)s) "
+    "RETURNING id, owner_id, name, created_at;"
+)
 
 def create_project(owner_id: str, name: str) -> Dict[str, Any]:
-    sql = (
-        "INSERT INTO projects (owner_id, name) VALUES (%(owner_id)s, %(name)s) "
-        "RETURNING id, owner_id, name, created_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"owner_id": owner_id, "name": name})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_CREATE_PROJECT_SQL, {"owner_id": owner_id, "name": name})
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def create_project_async(owner_id: str, name: str) -> Dict[str, Any]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_CREATE_PROJECT_SQL, {"owner_id": owner_id, "name": name})
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+_GET_PROJECT_SQL = "SELECT id, owner_id, name, created_at FROM projects WHERE id = %(id)s;"
 
 def get_project(project_id: str) -> Optional[Dict[str, Any]]:
-    sql = "SELECT id, owner_id, name, created_at FROM projects WHERE id = %(id)s;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": project_id})
-        return _row_to_dict(cur, cur.fetchone())
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_GET_PROJECT_SQL, {"id": project_id})
+        return cur.fetchone()
+
+async def get_project_async(project_id: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_GET_PROJECT_SQL, {"id": project_id})
+        return await cur.fetchone()
 
-def list_projects(owner_id: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+PROJECT_KEYS = (("created_at", "timestamptz"), ("id", "uuid"))
+
+def _list_projects_query(owner_id: str, limit: int, offset: int, after: Optional[Sequence[Any]]):
+    keyset, kparams = keyset_clause(PROJECT_KEYS, after, descending=True)
     sql = (
         "SELECT id, owner_id, name, created_at FROM projects "
-        "WHERE owner_id = %(owner_id)s ORDER BY created_at DESC "
+        "WHERE owner_id = %(owner_id)s" + keyset + " ORDER BY created_at DESC, id DESC "
         "LIMIT %(limit)s OFFSET %(offset)s;"
     )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"owner_id": owner_id, "limit": limit, "offset": offset})
-        return _rows_to_dicts(cur, cur.fetchall())
+    return sql, {"owner_id": owner_id, "limit": limit, "offset": offset, **kparams}
+
+def list_projects(owner_id: str, limit: int = 50, offset: int = 0,
+                  after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(*_list_projects_query(owner_id, limit, offset, after))
+        return cur.fetchall()
+
+async def list_projects_async(owner_id: str, limit: int = 50, offset: int = 0,
+                              after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(*_list_projects_query(owner_id, limit, offset, after))
+        return await cur.fetchall()
+
+_UPDATE_PROJECT_SQL = (
+    "UPDATE projects SET name = COALESCE(%(name)s, name) "
+    "WHERE id = %(id)s AND owner_id = %(owner_id)s "
+    "RETURNING id, owner_id, name, created_at;"
+)
 
 def update_project(project_id: str, owner_id: str, name: Optional[str]) -> Optional[Dict[str, Any]]:
-    sql = (
-        "UPDATE projects SET name = COALESCE(%(name)s, name) "
-        "WHERE id = %(id)s AND owner_id = %(owner_id)s "
-        "RETURNING id, owner_id, name, created_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": project_id, "owner_id": owner_id, "name": name})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_UPDATE_PROJECT_SQL, {"id": project_id, "owner_id": owner_id, "name": name})
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def update_project_async(project_id: str, owner_id: str, name: Optional[str]) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_UPDATE_PROJECT_SQL, {"id": project_id, "owner_id": owner_id, "name": name})
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+_DELETE_PROJECT_SQL = "DELETE FROM projects WHERE id = %(id)s AND owner_id = %(owner_id)s RETURNING id;"
 
 def delete_project(project_id: str, owner_id: str) -> Optional[str]:
-    sql = "DELETE FROM projects WHERE id = %(id)s AND owner_id = %(owner_id)s RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": project_id, "owner_id": owner_id})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_DELETE_PROJECT_SQL, {"id": project_id, "owner_id": owner_id})
         row = cur.fetchone()
         conn.commit()
-        return row[0] if row else None
+        return row["id"] if row else None
+
+async def delete_project_async(project_id: str, owner_id: str) -> Optional[str]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_DELETE_PROJECT_SQL, {"id": project_id, "owner_id": owner_id})
+        row = await cur.fetchone()
+        await conn.commit()
+        return row["id"] if row else None
@@ -0,0 +1,105 @@
+from typing import Optional, Dict, Any
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
+
+def lookup(cache_key: str) -> Optional[str]:
+    sql = (
+        "SELECT c.transcription_id FROM transcription_cache c "
+        "JOIN transcriptions t ON t.id = c.transcription_id "
+        "WHERE c.cache_key = %(key)s AND t.status = 'succeeded';"
+    )
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(sql, {"key": cache_key})
+        row = cur.fetchone()
+        return str(row["transcription_id"]) if row else None
+
+def copy_result(cache_key: str, src_tid: str, dst_tid: str) -> Optional[Dict[str, Any]]:
+    """
+    Copia los segmentos de una transcripción resuelta a otra en una sola
+    transacción y devuelve idioma, confianza, texto y artifacts del origen
+    (None si el origen ya no está 'succeeded'). Los archivos de artefactos no
+    se comparten: quien llama los genera para el destino.
+    """
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(
+            "SELECT language_detected, confidence, text_full, artifacts FROM transcriptions "
+            "WHERE id = %(src)s AND status = 'succeeded' FOR SHARE;",
+            {"src": src_tid},
+        )
+        src = cur.fetchone()
+        if src is None:
+            conn.rollback()
+            return None
+        cur.execute(
+            "INSERT INTO segments (transcription_id, start_ms, end_ms, speaker_label, text, confidence) "
+            "SELECT %(dst)s, start_ms, end_ms, speaker_label, text, confidence "
+            "FROM segments WHERE transcription_id = %(src)s;",
+            {"src": src_tid, "dst": dst_tid},
+        )
+        cur.execute(
+            "UPDATE transcription_cache SET hits = hits + 1, last_hit_at = NOW() WHERE cache_key = %(key)s;",
+            {"key": cache_key},
+        )
+        conn.commit()
+        return src
+
+def add_stats(hits: int, misses: int) -> None:
+    """Suma los aciertos y fallos acumulados por un proceso (result_cache.flush_stats)."""
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(
+            "UPDATE transcription_cache_stats SET hits = hits + %(hits)s, misses = misses + %(misses)s WHERE id = 1;",
+            {"hits": hits, "misses": misses},
+        )
+        conn.commit()
+
+def store(cache_key: str, transcription_id: str) -> None:
+    # El tamaño estimado es el texto completo más el de sus segmentos
+    sql = (
+        "INSERT INTO transcription_cache (cache_key, transcription_id, size_bytes) "
+        "SELECT %(key)s, t.id, COALESCE(octet_length(t.text_full), 0) + "
+        "COALESCE((SELECT SUM(octet_length(s.text)) FROM segments s WHERE s.transcription_id = t.id), 0) "
+        "FROM transcriptions t WHERE t.id = %(tid)s "
+        "ON CONFLICT (cache_key) DO UPDATE SET transcription_id = EXCLUDED.transcription_id, "
+        "size_bytes = EXCLUDED.size_bytes, created_at = NOW(), last_hit_at = NULL;"
+    )
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(sql, {"key": cache_key, "tid": transcription_id})
+        conn.commit()
+
+def evict(max_age_days: int, max_bytes: int) -> int:
+    """Borra entradas más antiguas que 'max_age_days' y las menos usadas sobre 'max_bytes'."""
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(
+            "DELETE FROM transcription_cache WHERE created_at < NOW() - make_interval(days => %(days)s);",
+            {"days": max_age_days},
+        )
+        n = cur.rowcount
+        cur.execute(
+            "WITH ranked AS ("
+            "SELECT cache_key, SUM(size_bytes) OVER (ORDER BY COALESCE(last_hit_at, created_at) DESC, cache_key) AS running "
+            "FROM transcription_cache) "
+            "DELETE FROM transcription_cache c USING ranked r "
+            "WHERE c.cache_key = r.cache_key AND r.running > %(max)s;",
+            {"max": max_bytes},
+        )
+        n += cur.rowcount
+        conn.commit()
+        return n
+
+_STATS_SQL = (
+    "SELECT s.hits, s.misses, "
+    "(SELECT COUNT(*) FROM transcription_cache) AS entries, "
+    "(SELECT COALESCE(SUM(size_bytes), 0) FROM transcription_cache) AS size_bytes "
+    "FROM transcription_cache_stats s WHERE s.id = 1;"
+)
+_EMPTY_STATS = {"hits": 0, "misses": 0, "entries": 0, "size_bytes": 0}
+
+def stats() -> Dict[str, Any]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_STATS_SQL)
+        return cur.fetchone() or dict(_EMPTY_STATS)
+
+async def stats_async() -> Dict[str, Any]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_STATS_SQL)
+        return await cur.fetchone() or dict(_EMPTY_STATS)
@@ -0,0 +1,150 @@
+"""
+Búsqueda en el archivo de transcripciones.
+
+- 'phrase': búsqueda por palabras/frases con rango sobre segments.text
+  (índice GIN de to_tsvector('simple', text)); acepta la sintaxis de
+  websearch_to_tsquery: "frase exacta", OR y -exclusión.
+- 'fuzzy': coincidencia aproximada (tolera errores de tipeo) con pg_trgm
+  sobre transcriptions.text_full (índice idx_transcriptions_text_trgm).
+
+Se resuelve en dos consultas: la página de transcripciones ordenada por
+(rank, transcription_id) con keyset, y luego los segmentos que coinciden
+solo para esas transcripciones, con el fragmento resaltado.
+
+El rango no se puede indexar (ts_rank_cd y word_similarity se calculan fila
+por fila), así que solo se rankean candidatas: las primeras
+S2X_SEARCH_MAX_CANDIDATES transcripciones que coinciden, en orden de id, y
+de cada una a lo sumo S2X_SEARCH_MAX_SEGMENTS_PER_CANDIDATE segmentos (en
+'phrase'; así una transcripción larga no agota el cupo). El conjunto no
+depende del cursor: todas las páginas rankean las mismas candidatas y el
+keyset las recorre sin repetir ni saltar. Elegirlas sigue leyendo todas las
+coincidencias (solo el id de la transcripción, vía el índice GIN), pero el
+rango, que es lo caro, se calcula sobre candidatas x segmentos filas como
+máximo (benchmarks/bench_search.py). A cambio, con términos muy frecuentes
+el resultado es lo mejor de esas candidatas (una muestra fija, no las
+mejores del archivo entero); una consulta más específica (frase,
+project_id) vuelve a cubrir todo.
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.db_pool import get_conn, get_async_conn
+from app.pagination import keyset_clause
+from app.repo_core import dict_cursor
+
+MODES = ("phrase", "fuzzy")
+SEARCH_KEYS = (("rank", "real"), ("transcription_id", "uuid"))
+
+# Configuración sin stemming: el archivo mezcla idiomas
+TS_CONFIG = "simple"
+_TSV = f"to_tsvector('{TS_CONFIG}', s.text)"
+_TSQ = f"websearch_to_tsquery('{TS_CONFIG}', %(q)s)"
+_HEADLINE_OPTS = "StartSel=<mark>, StopSel=</mark>, HighlightAll=true"
+
+_PROJECT_JOIN = " JOIN audio_files a ON a.id = t.audio_id AND a.project_id = %(project_id)s"
+
+
+def max_candidates() -> int:
+    return int(os.getenv("S2X_SEARCH_MAX_CANDIDATES", "1000"))
+
+
+def max_segments_per_candidate() -> int:
+    return int(os.getenv("S2X_SEARCH_MAX_SEGMENTS_PER_CANDIDATE", "5"))
+
+
+# Candidatas fijas (ver docstring del módulo): las primeras por id y, en
+# 'phrase', el rango de cada una sobre sus primeros segmentos coincidentes
+# (índice idx_segments_tid_start_id); el keyset se aplica después
+_MATCHES = {
+    "phrase": (
+        "SELECT c.transcription_id, ("
+        "SELECT max(ts_rank_cd(to_tsvector('" + TS_CONFIG + "', x.text), " + _TSQ + ")) FROM ("
+        "SELECT m.text FROM segments m WHERE m.transcription_id = c.transcription_id "
+        "AND to_tsvector('" + TS_CONFIG + "', m.text) @@ " + _TSQ + " "
+        "ORDER BY m.start_ms, m.id LIMIT %(per_candidate)s) x) AS rank "
+        "FROM (SELECT DISTINCT s.transcription_id FROM segments s{project} "
+        "WHERE " + _TSV + " @@ " + _TSQ + " ORDER BY s.transcription_id LIMIT %(candidates)s) c"
+    ),
+    "fuzzy": (
+        "SELECT c.transcription_id, word_similarity(%(q)s, c.text_full) AS rank "
+        "FROM (SELECT t.id AS transcription_id, t.text_full FROM transcriptions t{project} "
+        "WHERE %(q)s <%% t.text_full ORDER BY t.id LIMIT %(candidates)s) c"
+    ),
+}
+
+_HITS = {
+    "phrase": (
+        "WITH m AS ("
+        "SELECT s.transcription_id, s.id, s.start_ms, s.end_ms, s.speaker_label, s.text, "
+        "row_number() OVER (PARTITION BY s.transcription_id ORDER BY s.start_ms, s.id) AS n, "
+        "count(*) OVER (PARTITION BY s.transcription_id) AS num_hits "
+        "FROM segments s WHERE s.transcription_id = ANY(%(ids)s::uuid[]) AND " + _TSV + " @@ " + _TSQ + ") "
+        "SELECT transcription_id, id AS segment_id, start_ms, end_ms, speaker_label, num_hits, "
+        "ts_headline('" + TS_CONFIG + "', text, " + _TSQ + ", '" + _HEADLINE_OPTS + "') AS snippet "
+        "FROM m WHERE n <= %(per)s ORDER BY transcription_id, start_ms, id;"
+    ),
+    # Sin tsquery no hay resaltado: el fragmento es el texto del segmento
+    "fuzzy": (
+        "WITH m AS ("
+        "SELECT s.transcription_id, s.id, s.start_ms, s.end_ms, s.speaker_label, s.text, "
+        "row_number() OVER (PARTITION BY s.transcription_id "
+        "ORDER BY word_similarity(%(q)s, s.text) DESC, s.start_ms, s.id) AS n, "
+        "count(*) OVER (PARTITION BY s.transcription_id) AS num_hits "
+        "FROM segments s WHERE s.transcription_id = ANY(%(ids)s::uuid[]) AND %(q)s <%% s.text) "
+        "SELECT transcription_id, id AS segment_id, start_ms, end_ms, speaker_label, num_hits, text AS snippet "
+        "FROM m WHERE n <= %(per)s ORDER BY transcription_id, start_ms, id;"
+    ),
+}
+
+
+def _page_query(q: str, mode: str, project_id: Optional[str], limit: int,
+                after: Optional[Sequence[Any]]) -> Tuple[str, Dict[str, Any]]:
+    if mode not in MODES:
+        raise ValueError(f"Invalid search mode: {mode}")
+    keyset, kparams = keyset_clause(SEARCH_KEYS, after, descending=True)
+    project = ""
+    if project_id:
+        project = (" JOIN transcriptions t ON t.id = s.transcription_id" if mode == "phrase" else "") + _PROJECT_JOIN
+    matches = _MATCHES[mode].format(project=project)
+    sql = (
+        "WITH r AS (" + matches + ") "
+        "SELECT r.transcription_id, r.rank, t.audio_id, t.status, t.language_detected, t.finished_at "
+        "FROM r JOIN transcriptions t ON t.id = r.transcription_id "
+        "WHERE true" + keyset + " ORDER BY r.rank DESC, r.transcription_id DESC LIMIT %(limit)s;"
+    )
+    return sql, {"q": q, "project_id": project_id, "limit": limit, "candidates": max_candidates(),
+                 "per_candidate": max_segments_per_candidate(), **kparams}
+
+
+def _attach_hits(rows: List[Dict[str, Any]], hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    by_tid: Dict[Any, List[Dict[str, Any]]] = {}
+    for h in hits:
+        by_tid.setdefault(h.pop("transcription_id"), []).append(h)
+    for r in rows:
+        r["hits"] = by_tid.get(r["transcription_id"], [])
+        r["num_hits"] = r["hits"][0].pop("num_hits") if r["hits"] else 0
+        for h in r["hits"][1:]:
+            h.pop("num_hits")
+    return rows
+
+
+def search(q: str, mode: str = "phrase", project_id: Optional[str] = None, limit: int = 20,
+           hits_per_result: int = 5, after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(*_page_query(q, mode, project_id, limit, after))
+        rows = cur.fetchall()
+        if not rows:
+            return rows
+        cur.execute(_HITS[mode], {"q": q, "ids": [r["transcription_id"] for r in rows], "per": hits_per_result})
+        return _attach_hits(rows, cur.fetchall())
+
+
+async def search_async(q: str, mode: str = "phrase", project_id: Optional[str] = None, limit: int = 20,
+                       hits_per_result: int = 5, after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(*_page_query(q, mode, project_id, limit, after))
+        rows = await cur.fetchall()
+        if not rows:
+            return rows
+        await cur.execute(_HITS[mode], {"q": q, "ids": [r["transcription_id"] for r in rows], "per": hits_per_result})
+        return _attach_hits(rows, await cur.fetchall())
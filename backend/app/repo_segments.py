@@ -1,53 +1,130 @@
-from typing import Optional, List, Dict, Any, Iterable
-from app.db_pool import get_conn
+import uuid
+from decimal import Decimal
+from typing import Optional, List, Dict, Any, AsyncIterator, Iterable, Iterator, Sequence
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
+from app.pagination import keyset_clause
 
-def _rows_to_dicts(cur, rows):
-    cols = [d[0] for d in cur.description]
-    return [dict(zip(cols, r)) for r in rows]
+_INSERT_SEGMENT_SQL = (
+    "INSERT INTO segments (transcription_id, start_ms, end_ms, speaker_label, text, confidence) "
+    "VALUES (%(tid)s, %(start)s, %(end)s, %(spk)s, %(txt)s, %(conf)s) RETURNING id;"
+)
 
 def insert_segment(transcription_id: str, start_ms: int, end_ms: int, text: str,
                    speaker_label: str = None, confidence: float = None) -> str:
-    sql = (
-        "INSERT INTO segments (transcription_id, start_ms, end_ms, speaker_label, text, confidence) "
-        "VALUES (%(tid)s, %(start)s, %(end)s, %(spk)s, %(txt)s, %(conf)s) RETURNING id;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"tid": transcription_id, "start": start_ms, "end": end_ms,
-                          "spk": speaker_label, "txt": text, "conf": confidence})
-        seg_id = cur.fetchone()[0]
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_INSERT_SEGMENT_SQL, {"tid": transcription_id, "start": start_ms, "end": end_ms,
+                                          "spk": speaker_label, "txt": text, "conf": confidence})
+        seg_id = cur.fetchone()["id"]
         conn.commit()
         return seg_id
 
+async def insert_segment_async(transcription_id: str, start_ms: int, end_ms: int, text: str,
+                               speaker_label: str = None, confidence: float = None) -> str:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_INSERT_SEGMENT_SQL, {"tid": transcription_id, "start": start_ms, "end": end_ms,
+                                                "spk": speaker_label, "txt": text, "conf": confidence})
+        seg_id = (await cur.fetchone())["id"]
+        await conn.commit()
+        return seg_id
+
+_COPY_SQL = (
+    "COPY segments (transcription_id, start_ms, end_ms, speaker_label, text, confidence) "
+    "FROM STDIN (FORMAT BINARY)"
+)
+_COPY_TYPES = ["uuid", "int4", "int4", "text", "text", "numeric"]
+
+def _numeric(value):
+    # El COPY binario de numeric no acepta float
+    return None if value is None else Decimal(str(value))
+
 def bulk_insert_segments(transcription_id: str, segments: Iterable[Dict[str, Any]]) -> int:
-    sql = (
-        "INSERT INTO segments (transcription_id, start_ms, end_ms, speaker_label, text, confidence) "
-        "VALUES (%(tid)s, %(start)s, %(end)s, %(spk)s, %(txt)s, %(conf)s)"
-    )
+    """
+    Inserta los segmentos con un único COPY FROM STDIN binario. Acepta
+    cualquier iterable (p. ej. un generador): las filas se envían a medida
+    que se consumen, sin armar la lista completa.
+    """
+    tid = uuid.UUID(str(transcription_id))
     count = 0
-    with get_conn() as conn, conn.cursor() as cur:
-        for s in segments:
-            cur.execute(sql, {
-                "tid": transcription_id,
-                "start": s["start_ms"], "end": s["end_ms"], "spk": s.get("speaker_label"),
-                "txt": s["text"], "conf": s.get("confidence")
-            })
-            count += 1
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        with cur.copy(_COPY_SQL) as copy:
+            copy.set_types(_COPY_TYPES)
+            for s in segments:
+                copy.write_row((
+                    tid, s["start_ms"], s["end_ms"], s.get("speaker_label"),
+                    s["text"], _numeric(s.get("confidence")),
+                ))
+                count += 1
         conn.commit()
     return count
 
-def list_segments(transcription_id: str, limit: int = 1000, offset: int = 0) -> List[Dict[str, Any]]:
+SEGMENT_KEYS = (("start_ms", "int"), ("id", "uuid"))
+
+def _list_segments_query(transcription_id: str, limit: int, offset: int, after: Optional[Sequence[Any]]):
+    keyset, kparams = keyset_clause(SEGMENT_KEYS, after, descending=False)
     sql = (
         "SELECT id, start_ms, end_ms, speaker_label, text, confidence FROM segments "
-        "WHERE transcription_id = %(tid)s ORDER BY start_ms ASC LIMIT %(limit)s OFFSET %(offset)s;"
+        "WHERE transcription_id = %(tid)s" + keyset + " "
+        "ORDER BY start_ms ASC, id ASC LIMIT %(limit)s OFFSET %(offset)s;"
     )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"tid": transcription_id, "limit": limit, "offset": offset})
-        return _rows_to_dicts(cur, cur.fetchall())
+    return sql, {"tid": transcription_id, "limit": limit, "offset": offset, **kparams}
+
+def list_segments(transcription_id: str, limit: int = 1000, offset: int = 0,
+                  after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(*_list_segments_query(transcription_id, limit, offset, after))
+        return cur.fetchall()
+
+async def list_segments_async(transcription_id: str, limit: int = 1000, offset: int = 0,
+                              after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(*_list_segments_query(transcription_id, limit, offset, after))
+        return await cur.fetchall()
+
+_ITER_SEGMENTS_SQL = (
+    "SELECT id, start_ms, end_ms, speaker_label, text, confidence FROM segments "
+    "WHERE transcription_id = %(tid)s ORDER BY start_ms ASC, id ASC;"
+)
+
+def iter_segments(transcription_id: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre los segmentos en orden con un cursor del lado del servidor,
+    trayendo 'batch_size' filas por viaje sin materializar la lista completa.
+    """
+    with get_conn() as conn:
+        with dict_cursor(conn, name=f"segments_{uuid.uuid4().hex}") as cur:
+            cur.itersize = batch_size
+            cur.execute(_ITER_SEGMENTS_SQL, {"tid": transcription_id})
+            yield from cur
+
+async def iter_segments_async(transcription_id: str, batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Recorre los segmentos en orden por páginas de keyset (start_ms, id). Cada
+    página toma una conexión del pool solo mientras se lee: un cliente lento
+    de la API no retiene la conexión ni una transacción abierta entre páginas.
+    Una edición concurrente puede verse a partir de la página siguiente.
+    """
+    after = None
+    while True:
+        rows = await list_segments_async(transcription_id, batch_size, after=after)
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1]["start_ms"], rows[-1]["id"])
+
+_DELETE_BY_TRANSCRIPTION_SQL = "DELETE FROM segments WHERE transcription_id = %(tid)s RETURNING id;"
 
 def delete_segments_by_transcription(transcription_id: str) -> int:
-    sql = "DELETE FROM segments WHERE transcription_id = %(tid)s RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"tid": transcription_id})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_DELETE_BY_TRANSCRIPTION_SQL, {"tid": transcription_id})
         rows = cur.fetchall()
         conn.commit()
         return len(rows)
+
+async def delete_segments_by_transcription_async(transcription_id: str) -> int:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_DELETE_BY_TRANSCRIPTION_SQL, {"tid": transcription_id})
+        rows = await cur.fetchall()
+        await conn.commit()
+        return len(rows)
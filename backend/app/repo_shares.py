@@ -1,21 +1,35 @@
+import asyncio
+import os
+import time
 from typing import Optional, Dict, Any
-from app.db_pool import get_conn
+from app import share_cache
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
 
 VALID_KINDS = {"private", "public"}
 
-def _row_to_dict(cur, row):
-    return dict(zip([d[0] for d in cur.description], row)) if row else None
+# Margen por defecto de resolve_share; ningún llamador usa uno mayor
+DEFAULT_GRACE_SECONDS = 300
+
+def sweep_grace_seconds() -> int:
+    """
+    Margen del barrido: solo se borran los shares con expires_at anterior a
+    now() - margen, para no quitar uno que resolve_share aún acepta. Nunca
+    es menor que DEFAULT_GRACE_SECONDS.
+    """
+    return max(int(os.getenv("S2X_SHARE_SWEEP_GRACE_SEC", str(DEFAULT_GRACE_SECONDS))), DEFAULT_GRACE_SECONDS)
+
+_CREATE_SHARE_SQL = (
+    "INSERT INTO shares (transcription_id, kind, token, can_edit, expires_at, created_by) "
+    "VALUES (%(tid)s, COALESCE(%(kind)s, 'private')::share_kind_enum, %(token)s, "
+    "COALESCE(%(edit)s,false), %(exp)s, %(by)s) "
+    "RETURNING id, transcription_id, kind, token, can_edit, expires_at, created_at;"
+)
 
 def create_share(transcription_id: str, token: str, kind: str = "private",
                  can_edit: bool = False, expires_at: str = None, created_by: str = None) -> Dict[str, Any]:
-    sql = (
-        "INSERT INTO shares (transcription_id, kind, token, can_edit, expires_at, created_by) "
-        "VALUES (%(tid)s, COALESCE(%(kind)s, 'private')::share_kind_enum, %(token)s, "
-        "COALESCE(%(edit)s,false), %(exp)s, %(by)s) "
-        "RETURNING id, transcription_id, kind, token, can_edit, expires_at, created_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_CREATE_SHARE_SQL, {
             "tid": transcription_id,
             "kind": kind,
             "token": token,
@@ -25,54 +39,164 @@ def create_share(transcription_id: str, token: str, kind: str = "private",
         })
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def create_share_async(transcription_id: str, token: str, kind: str = "private",
+                             can_edit: bool = False, expires_at: str = None, created_by: str = None) -> Dict[str, Any]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_CREATE_SHARE_SQL, {
+            "tid": transcription_id,
+            "kind": kind,
+            "token": token,
+            "edit": can_edit,
+            "exp": expires_at,
+            "by": created_by
+        })
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+_RESOLVE_SHARE_SQL = (
+    "SELECT s.id, s.transcription_id, s.kind, s.token, s.can_edit, s.expires_at, "
+    "s.created_by, s.created_at, t.status "
+    "FROM shares s "
+    "JOIN transcriptions t ON t.id = s.transcription_id "
+    "WHERE s.token = %(token)s "
+    "AND (s.expires_at IS NULL OR (s.expires_at + (%(grace)s || ' seconds')::interval) > NOW());"
+)
 
-def resolve_share(token: str, grace_seconds: int = 300) -> Optional[Dict[str, Any]]:
+def resolve_share(token: str, grace_seconds: int = DEFAULT_GRACE_SECONDS) -> Optional[Dict[str, Any]]:
     """
     Resuelve un share por token, incluyendo un margen de 'grace_seconds'
-    para evitar que un share recién creado aparezca como expirado.
+    para evitar que un share recién creado aparezca como expirado. Los
+    tokens ya resueltos se sirven desde share_cache sin ir a la base.
     """
-    sql = (
-        "SELECT s.id, s.transcription_id, s.kind, s.token, s.can_edit, s.expires_at, "
-        "s.created_by, s.created_at, t.status "
-        "FROM shares s "
-        "JOIN transcriptions t ON t.id = s.transcription_id "
-        "WHERE s.token = %(token)s "
-        "AND (s.expires_at IS NULL OR (s.expires_at + (%(grace)s || ' seconds')::interval) > NOW());"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"token": token, "grace": grace_seconds})
-        return _row_to_dict(cur, cur.fetchone())
-
-def cleanup_expired() -> int:
-    sql = "DELETE FROM shares WHERE expires_at IS NOT NULL AND expires_at <= NOW() RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql)
-        rows = cur.fetchall()
-        conn.commit()
-        return len(rows)
+    use_cache = share_cache.enabled()
+    if use_cache:
+        hit = share_cache.get(token, grace_seconds)
+        if hit is not None:
+            return hit
+        gen = share_cache.generation()
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_RESOLVE_SHARE_SQL, {"token": token, "grace": grace_seconds})
+        row = cur.fetchone()
+    if row and use_cache:
+        share_cache.put(token, grace_seconds, row, gen)
+    return row
 
+async def resolve_share_async(token: str, grace_seconds: int = DEFAULT_GRACE_SECONDS) -> Optional[Dict[str, Any]]:
+    use_cache = share_cache.enabled()
+    if use_cache:
+        hit = share_cache.get(token, grace_seconds)
+        if hit is not None:
+            return hit
+        gen = share_cache.generation()
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_RESOLVE_SHARE_SQL, {"token": token, "grace": grace_seconds})
+        row = await cur.fetchone()
+    if row and use_cache:
+        share_cache.put(token, grace_seconds, row, gen)
+    return row
 
-def update_share(share_id: str, kind: str = None, can_edit: bool = None, expires_at: str = None):
+def _invalidate(rows) -> None:
+    # Los demás procesos se enteran por el trigger de db/06_shares_notify.sql
+    for r in rows:
+        share_cache.invalidate_share(r["id"])
+
+# Un lote de expirados por transacción, en orden de expires_at (índice
+# parcial idx_shares_expires_at); SKIP LOCKED no espera por filas que otro
+# barrido o un PATCH tengan tomadas. Solo devuelve el conteo. El corte es
+# now() - margen, fijado en el primer lote.
+_CLEANUP_EXPIRED_BATCH_SQL = (
+    "WITH c AS (SELECT COALESCE(%(cutoff)s::timestamptz, now() - make_interval(secs => %(grace)s)) AS cutoff), "
+    "doomed AS ("
+    "SELECT id FROM shares, c WHERE expires_at IS NOT NULL AND expires_at <= c.cutoff "
+    "ORDER BY expires_at LIMIT %(batch)s FOR UPDATE SKIP LOCKED), "
+    "gone AS (DELETE FROM shares s USING doomed d WHERE s.id = d.id RETURNING s.expires_at) "
+    "SELECT count(*) AS n, max(expires_at) AS upto, (SELECT cutoff FROM c) AS cutoff FROM gone;"
+)
+
+def _cleanup_batch_done(row: Dict[str, Any], batch_size: int) -> bool:
+    if row["upto"] is not None:
+        share_cache.invalidate_expired(row["upto"])
+    return row["n"] < batch_size
+
+def cleanup_expired(batch_size: int = 1000, pause_sec: float = 0.0, grace_seconds: Optional[int] = None) -> int:
+    """
+    Borra los shares expirados hace más de 'grace_seconds' (por defecto
+    sweep_grace_seconds()) en lotes de 'batch_size', cada uno en su propia
+    transacción corta, hasta el corte del primer lote.
+    """
+    grace = sweep_grace_seconds() if grace_seconds is None else grace_seconds
+    total, cutoff = 0, None
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        while True:
+            cur.execute(_CLEANUP_EXPIRED_BATCH_SQL, {"cutoff": cutoff, "grace": grace, "batch": batch_size})
+            row = cur.fetchone()
+            conn.commit()
+            total, cutoff = total + row["n"], row["cutoff"]
+            if _cleanup_batch_done(row, batch_size):
+                return total
+            if pause_sec:
+                time.sleep(pause_sec)
+
+async def cleanup_expired_async(batch_size: int = 1000, pause_sec: float = 0.0,
+                                grace_seconds: Optional[int] = None) -> int:
+    grace = sweep_grace_seconds() if grace_seconds is None else grace_seconds
+    total, cutoff = 0, None
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        while True:
+            await cur.execute(_CLEANUP_EXPIRED_BATCH_SQL, {"cutoff": cutoff, "grace": grace, "batch": batch_size})
+            row = await cur.fetchone()
+            await conn.commit()
+            total, cutoff = total + row["n"], row["cutoff"]
+            if _cleanup_batch_done(row, batch_size):
+                return total
+            await asyncio.sleep(pause_sec)
+
+_UPDATE_SHARE_SQL = (
+    "UPDATE shares SET kind = COALESCE(%(kind)s, kind)::share_kind_enum, "
+    "can_edit = COALESCE(%(edit)s, can_edit), "
+    "expires_at = COALESCE(%(exp)s, expires_at) "
+    "WHERE id = %(id)s RETURNING id, kind, can_edit, expires_at;"
+)
+
+def _check_kind(kind: Optional[str]) -> None:
     if kind is not None and kind not in VALID_KINDS:
         raise ValueError(f"Invalid kind: {kind}. Must be one of {VALID_KINDS}")
 
-    sql = (
-        "UPDATE shares SET kind = COALESCE(%(kind)s, kind)::share_kind_enum, "
-        "can_edit = COALESCE(%(edit)s, can_edit), "
-        "expires_at = COALESCE(%(exp)s, expires_at) "
-        "WHERE id = %(id)s RETURNING id, kind, can_edit, expires_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": share_id, "kind": kind, "edit": can_edit, "exp": expires_at})
+def update_share(share_id: str, kind: str = None, can_edit: bool = None, expires_at: str = None):
+    _check_kind(kind)
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_UPDATE_SHARE_SQL, {"id": share_id, "kind": kind, "edit": can_edit, "exp": expires_at})
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+    _invalidate([row] if row else [])
+    return row
+
+async def update_share_async(share_id: str, kind: str = None, can_edit: bool = None, expires_at: str = None):
+    _check_kind(kind)
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_UPDATE_SHARE_SQL, {"id": share_id, "kind": kind, "edit": can_edit, "exp": expires_at})
+        row = await cur.fetchone()
+        await conn.commit()
+    _invalidate([row] if row else [])
+    return row
+
+_DELETE_SHARE_SQL = "DELETE FROM shares WHERE id = %(id)s RETURNING id;"
 
 def delete_share(share_id: str) -> Optional[str]:
-    sql = "DELETE FROM shares WHERE id = %(id)s RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": share_id})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_DELETE_SHARE_SQL, {"id": share_id})
         row = cur.fetchone()
         conn.commit()
-        return row[0] if row else None
+    _invalidate([row] if row else [])
+    return row["id"] if row else None
+
+async def delete_share_async(share_id: str) -> Optional[str]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_DELETE_SHARE_SQL, {"id": share_id})
+        row = await cur.fetchone()
+        await conn.commit()
+    _invalidate([row] if row else [])
+    return row["id"] if row else None
@@ -1,82 +1,325 @@
-from typing import Optional, List, Dict, Any
-from app.db_pool import get_conn
+from typing import Optional, List, Dict, Any, Sequence, Set
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
+from app.pagination import keyset_clause
 import json
 
-def _rows_to_dicts(cur, rows):
-    cols = [d[0] for d in cur.description]
-    return [dict(zip(cols, r)) for r in rows]
-
-def _row_to_dict(cur, row):
-    return dict(zip([d[0] for d in cur.description], row)) if row else None
+_CREATE_TRANSCRIPTION_SQL = (
+    "INSERT INTO transcriptions (audio_id, mode, status, language_hint, model_name, temperature, beam_size, started_at) "
+    "VALUES (%(audio_id)s, COALESCE(%(mode)s, 'batch')::mode_enum, 'queued', %(language_hint)s, "
+    "%(model_name)s, %(temperature)s, %(beam_size)s, NOW()) "
+    "RETURNING id, audio_id, mode, status, started_at;"
+)
 
 def create_transcription(audio_id: str, mode: str = "batch", language_hint: str = None,
                          model_name: str = None, temperature: float = None, beam_size: int = None) -> Dict[str, Any]:
-    sql = (
-        "INSERT INTO transcriptions (audio_id, mode, status, language_hint, model_name, temperature, beam_size, started_at) "
-        "VALUES (%(audio_id)s, COALESCE(%(mode)s, 'batch')::mode_enum, 'queued', %(language_hint)s, "
-        "%(model_name)s, %(temperature)s, %(beam_size)s, NOW()) "
-        "RETURNING id, audio_id, mode, status, started_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_CREATE_TRANSCRIPTION_SQL, {
             "audio_id": audio_id, "mode": mode, "language_hint": language_hint,
             "model_name": model_name, "temperature": temperature, "beam_size": beam_size
         })
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def create_transcription_async(audio_id: str, mode: str = "batch", language_hint: str = None,
+                                     model_name: str = None, temperature: float = None,
+                                     beam_size: int = None) -> Dict[str, Any]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_CREATE_TRANSCRIPTION_SQL, {
+            "audio_id": audio_id, "mode": mode, "language_hint": language_hint,
+            "model_name": model_name, "temperature": temperature, "beam_size": beam_size
+        })
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+# Proyecciones de lectura: 'status' y 'meta' no tocan text_full ni artifacts,
+# así que la consulta por PK no destostea (TOAST) esos valores grandes
+VIEWS = ("status", "meta", "full")
+_VIEW_COLUMNS = {
+    "status": "id, status, progress, mode, started_at, finished_at",
+    "meta": (
+        "id, audio_id, mode, status, progress, language_hint, language_detected, model_name, temperature, "
+        "beam_size, confidence, attempts, worker_id, heartbeat_at, started_at, finished_at, deleted_at, "
+        "segments_rev"
+    ),
+    "full": "*",
+}
+
+def _get_transcription_sql(view: str) -> str:
+    if view not in VIEWS:
+        raise ValueError(f"Invalid view: {view}")
+    return f"SELECT {_VIEW_COLUMNS[view]} FROM transcriptions WHERE id = %(id)s;"
+
+def get_transcription(tid: str, view: str = "full") -> Optional[Dict[str, Any]]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_get_transcription_sql(view), {"id": tid})
+        return cur.fetchone()
+
+async def get_transcription_async(tid: str, view: str = "full") -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_get_transcription_sql(view), {"id": tid})
+        return await cur.fetchone()
+
+# Validadores para ETag: consulta por PK que no lee text_full, artifacts ni segmentos
+_VERSION_SQL = "SELECT id, status, rev, segments_rev FROM transcriptions WHERE id = %(id)s;"
+
+async def get_version_async(tid: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_VERSION_SQL, {"id": tid})
+        return await cur.fetchone()
+
+_SEGMENTS_REV_SQL = "SELECT id, segments_rev, segments_updated_at FROM transcriptions WHERE id = %(id)s;"
+
+async def get_segments_rev_async(tid: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_SEGMENTS_REV_SQL, {"id": tid})
+        return await cur.fetchone()
 
-def get_transcription(tid: str) -> Optional[Dict[str, Any]]:
-    sql = "SELECT * FROM transcriptions WHERE id = %(id)s;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": tid})
-        return _row_to_dict(cur, cur.fetchone())
+_GET_TEXT_SQL = "SELECT id, status, text_full FROM transcriptions WHERE id = %(id)s;"
 
-def list_transcriptions_by_audio(audio_id: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+async def get_text_async(tid: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_GET_TEXT_SQL, {"id": tid})
+        return await cur.fetchone()
+
+_ARTIFACTS_SUMMARY_SQL = (
+    "SELECT id, status, (artifacts->>'num_segments')::int AS num_segments, "
+    "ARRAY(SELECT k FROM jsonb_object_keys(COALESCE(artifacts, '{}'::jsonb)) k "
+    "WHERE k <> 'num_segments' ORDER BY k) AS kinds "
+    "FROM transcriptions WHERE id = %(id)s;"
+)
+
+async def get_artifacts_summary_async(tid: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_ARTIFACTS_SUMMARY_SQL, {"id": tid})
+        return await cur.fetchone()
+
+_GET_ARTIFACT_SQL = "SELECT id, artifacts->>%(kind)s AS content FROM transcriptions WHERE id = %(id)s;"
+
+async def get_artifact_async(tid: str, kind: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_GET_ARTIFACT_SQL, {"id": tid, "kind": kind})
+        return await cur.fetchone()
+
+TRANSCRIPTION_KEYS = (("started_at", "timestamptz"), ("id", "uuid"))
+
+def _list_by_audio_query(audio_id: str, limit: int, offset: int, after: Optional[Sequence[Any]]):
+    keyset, kparams = keyset_clause(TRANSCRIPTION_KEYS, after, descending=True)
     sql = (
         "SELECT id, audio_id, mode, status, language_detected, model_name, started_at, finished_at "
-        "FROM transcriptions WHERE audio_id = %(audio_id)s "
-        "ORDER BY started_at DESC LIMIT %(limit)s OFFSET %(offset)s;"
+        "FROM transcriptions WHERE audio_id = %(audio_id)s" + keyset + " "
+        "ORDER BY started_at DESC, id DESC LIMIT %(limit)s OFFSET %(offset)s;"
     )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"audio_id": audio_id, "limit": limit, "offset": offset})
-        return _rows_to_dicts(cur, cur.fetchall())
+    return sql, {"audio_id": audio_id, "limit": limit, "offset": offset, **kparams}
+
+def list_transcriptions_by_audio(audio_id: str, limit: int = 50, offset: int = 0,
+                                 after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(*_list_by_audio_query(audio_id, limit, offset, after))
+        return cur.fetchall()
+
+async def list_transcriptions_by_audio_async(audio_id: str, limit: int = 50, offset: int = 0,
+                                             after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(*_list_by_audio_query(audio_id, limit, offset, after))
+        return await cur.fetchall()
+
+# heartbeat_at desde el inicio: sin él, el reaper no vería la fila si su proceso muere
+_MARK_RUNNING_SQL = (
+    "UPDATE transcriptions SET status='running', heartbeat_at=NOW() "
+    "WHERE id=%(id)s AND status='queued' RETURNING id, status;"
+)
 
 def mark_running(tid: str) -> Optional[Dict[str, Any]]:
-    sql = "UPDATE transcriptions SET status='running' WHERE id=%(id)s AND status='queued' RETURNING id, status;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": tid})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_MARK_RUNNING_SQL, {"id": tid})
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def mark_running_async(tid: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_MARK_RUNNING_SQL, {"id": tid})
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+_MARK_SUCCEEDED_SQL = (
+    "UPDATE transcriptions SET status='succeeded', language_detected=%(language_detected)s, confidence=%(confidence)s, "
+    "text_full=%(text_full)s, artifacts=%(artifacts)s::jsonb, progress=1, finished_at=NOW() "
+    "WHERE id=%(id)s RETURNING id, status, language_detected, finished_at;"
+)
 
 def mark_succeeded(tid: str, language_detected: str, confidence: float, text_full: str, artifacts: dict) -> Optional[Dict[str, Any]]:
-    sql = (
-        "UPDATE transcriptions SET status='succeeded', language_detected=%(language_detected)s, confidence=%(confidence)s, "
-        "text_full=%(text_full)s, artifacts=%(artifacts)s::jsonb, finished_at=NOW() "
-        "WHERE id=%(id)s RETURNING id, status, language_detected, finished_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_MARK_SUCCEEDED_SQL, {
             "id": tid, "language_detected": language_detected, "confidence": confidence,
             "text_full": text_full, "artifacts": json.dumps(artifacts or {})
         })
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def mark_succeeded_async(tid: str, language_detected: str, confidence: float, text_full: str,
+                               artifacts: dict) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_MARK_SUCCEEDED_SQL, {
+            "id": tid, "language_detected": language_detected, "confidence": confidence,
+            "text_full": text_full, "artifacts": json.dumps(artifacts or {})
+        })
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+def update_progress(tid: str, progress: float) -> bool:
+    sql = "UPDATE transcriptions SET progress=%(progress)s WHERE id=%(id)s AND status='running';"
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(sql, {"id": tid, "progress": progress})
+        n = cur.rowcount
+        conn.commit()
+        return n > 0
+
+_MARK_FAILED_SQL = "UPDATE transcriptions SET status='failed', finished_at=NOW() WHERE id=%(id)s RETURNING id, status, finished_at;"
 
 def mark_failed(tid: str) -> Optional[Dict[str, Any]]:
-    sql = "UPDATE transcriptions SET status='failed', finished_at=NOW() WHERE id=%(id)s RETURNING id, status, finished_at;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": tid})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_MARK_FAILED_SQL, {"id": tid})
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def mark_failed_async(tid: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_MARK_FAILED_SQL, {"id": tid})
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+def claim_queued(worker_id: str, limit: int = 1) -> List[Dict[str, Any]]:
+    """
+    Reclama hasta 'limit' transcripciones en cola para este worker.
+    FOR UPDATE SKIP LOCKED permite que varios workers compitan sin bloquearse
+    ni tomar la misma fila. Las de modo 'stream' las atiende el WebSocket.
+    """
+    sql = (
+        "UPDATE transcriptions t SET status='running', worker_id=%(worker)s, heartbeat_at=NOW(), "
+        "attempts = t.attempts + 1 "
+        "FROM (SELECT id FROM transcriptions WHERE status='queued' AND mode='batch' ORDER BY started_at "
+        "LIMIT %(limit)s FOR UPDATE SKIP LOCKED) q "
+        "WHERE t.id = q.id RETURNING t.id, t.audio_id, t.status, t.attempts;"
+    )
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(sql, {"worker": worker_id, "limit": limit})
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+_BATCH_LEADER_SQL = (
+    "SELECT t.id, t.model_name, t.language_hint, t.beam_size, t.temperature "
+    "FROM transcriptions t JOIN audio_files a ON a.id = t.audio_id "
+    "WHERE t.status='queued' AND t.mode='batch' AND a.duration_sec <= %(max_sec)s "
+    "ORDER BY t.started_at LIMIT 1 FOR UPDATE OF t SKIP LOCKED"
+)
+
+_BATCH_LIKE_SQL = (
+    "SELECT id, model_name, language_hint, beam_size, temperature "
+    "FROM transcriptions WHERE id = %(like)s"
+)
+
+def claim_batch(worker_id: str, limit: int, max_duration_sec: int, like: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Reclama audios cortos en cola con parámetros compatibles (modelo, idioma,
+    beam_size, temperatura) para decodificarlos en un mismo lote. Sin 'like'
+    el lote se arma alrededor del trabajo más antiguo; con 'like' se buscan más
+    trabajos compatibles con esa transcripción.
+    """
+    sql = (
+        "WITH leader AS (" + (_BATCH_LIKE_SQL if like else _BATCH_LEADER_SQL) + "), "
+        "batch AS ("
+        "SELECT t.id FROM transcriptions t JOIN audio_files a ON a.id = t.audio_id, leader l "
+        "WHERE t.status='queued' AND t.mode='batch' AND a.duration_sec <= %(max_sec)s "
+        "AND t.model_name IS NOT DISTINCT FROM l.model_name "
+        "AND t.language_hint IS NOT DISTINCT FROM l.language_hint "
+        "AND t.beam_size IS NOT DISTINCT FROM l.beam_size "
+        "AND t.temperature IS NOT DISTINCT FROM l.temperature "
+        "ORDER BY t.started_at LIMIT %(limit)s FOR UPDATE OF t SKIP LOCKED) "
+        "UPDATE transcriptions t SET status='running', worker_id=%(worker)s, heartbeat_at=NOW(), "
+        "attempts = t.attempts + 1 "
+        "FROM batch WHERE t.id = batch.id "
+        "RETURNING t.id, t.audio_id, t.status, t.attempts, t.model_name, t.language_hint, "
+        "t.beam_size, t.temperature;"
+    )
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(sql, {"worker": worker_id, "limit": limit, "max_sec": max_duration_sec, "like": like})
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+def heartbeat(worker_id: str, tids: List[str]) -> int:
+    if not tids:
+        return 0
+    sql = (
+        "UPDATE transcriptions SET heartbeat_at=NOW() "
+        "WHERE id = ANY(%(ids)s::uuid[]) AND worker_id=%(worker)s AND status='running';"
+    )
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(sql, {"ids": list(tids), "worker": worker_id})
+        n = cur.rowcount
+        conn.commit()
+        return n
+
+async def touch_heartbeat_async(tid: str) -> bool:
+    """Latido de una fila 'running' sin worker (sesión de streaming en la API)."""
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute("UPDATE transcriptions SET heartbeat_at=NOW() WHERE id=%(id)s AND status='running';",
+                          {"id": tid})
+        n = cur.rowcount
+        await conn.commit()
+        return n == 1
+
+def requeue_stale(stale_seconds: int, max_attempts: int) -> List[Dict[str, Any]]:
+    """
+    Devuelve a la cola los trabajos 'running' cuyo worker dejó de latir.
+    Los que ya agotaron sus intentos quedan como 'failed', igual que las
+    sesiones de streaming cuyo proceso murió (su audio no se puede repetir).
+    """
+    sql = (
+        "UPDATE transcriptions SET "
+        "status = CASE WHEN mode = 'stream' OR attempts >= %(max)s THEN 'failed' ELSE 'queued' END::status_enum, "
+        "finished_at = CASE WHEN mode = 'stream' OR attempts >= %(max)s THEN NOW() ELSE NULL END, "
+        "worker_id = NULL, heartbeat_at = NULL "
+        "WHERE status='running' AND heartbeat_at IS NOT NULL "
+        "AND heartbeat_at < NOW() - make_interval(secs => %(stale)s) "
+        "RETURNING id, status, attempts;"
+    )
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(sql, {"stale": stale_seconds, "max": max_attempts})
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+def existing_ids(tids: List[str]) -> Set[str]:
+    """Los ids de 'tids' que todavía tienen fila (en cualquier estado)."""
+    if not tids:
+        return set()
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute("SELECT id::text AS id FROM transcriptions WHERE id = ANY(%(ids)s::uuid[]);", {"ids": list(tids)})
+        return {r["id"] for r in cur.fetchall()}
+
+_HARD_DELETE_SQL = "DELETE FROM transcriptions WHERE id=%(id)s RETURNING id;"
 
 def hard_delete(tid: str) -> Optional[str]:
-    sql = "DELETE FROM transcriptions WHERE id=%(id)s RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": tid})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_HARD_DELETE_SQL, {"id": tid})
         row = cur.fetchone()
         conn.commit()
-        return row[0] if row else None
+        return row["id"] if row else None
+
+async def hard_delete_async(tid: str) -> Optional[str]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_HARD_DELETE_SQL, {"id": tid})
+        row = await cur.fetchone()
+        await conn.commit()
+        return row["id"] if row else None
@@ -1,48 +1,60 @@
 from typing import Optional, Dict, Any
-from app.db_pool import get_conn
+from app.db_pool import get_conn, get_async_conn
+from app.repo_core import dict_cursor
 
-def _row_to_dict(cur, row):
-    return dict(zip([d[0] for d in cur.description], row)) if row else None
+_CREATE_USER_SQL = (
+    "INSERT INTO users (email, name, pwd_hash, role) "
+    "VALUES (%(email)s, %(name)s, %(pwd_hash)s, COALESCE(%(role)s, 'user')::role_enum) "
+    "RETURNING id, email, name, role, created_at;"
+)
 
 def create_user(email: str, name: Optional[str], pwd_hash: str, role: str = "user") -> Dict[str, Any]:
-    sql = (
-        "INSERT INTO users (email, name, pwd_hash, role) "
-        "VALUES (%(email)s, %(name)s, %(pwd_hash)s, COALESCE(%(role)s, 'user')::role_enum) "
-        "RETURNING id, email, name, role, created_at;"
-    )
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"email": email, "name": name, "pwd_hash": pwd_hash, "role": role})
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_CREATE_USER_SQL, {"email": email, "name": name, "pwd_hash": pwd_hash, "role": role})
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
+
+async def create_user_async(email: str, name: Optional[str], pwd_hash: str, role: str = "user") -> Dict[str, Any]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_CREATE_USER_SQL, {"email": email, "name": name, "pwd_hash": pwd_hash, "role": role})
+        row = await cur.fetchone()
+        await conn.commit()
+        return row
+
+_GET_USER_SQL = "SELECT id, email, name, role, created_at FROM users WHERE id = %(id)s;"
 
 def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
-    sql = "SELECT id, email, name, role, created_at FROM users WHERE id = %(id)s;"
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, {"id": user_id})
-        return _row_to_dict(cur, cur.fetchone())
+    with get_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(_GET_USER_SQL, {"id": user_id})
+        return cur.fetchone()
+
+async def get_user_by_id_async(user_id: str) -> Optional[Dict[str, Any]]:
+    async with get_async_conn() as conn, dict_cursor(conn) as cur:
+        await cur.execute(_GET_USER_SQL, {"id": user_id})
+        return await cur.fetchone()
 
 def get_user_for_login(email: str) -> Optional[Dict[str, Any]]:
     sql = "SELECT id, email, pwd_hash, role FROM users WHERE email = %(email)s;"
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn() as conn, dict_cursor(conn) as cur:
         cur.execute(sql, {"email": email})
-        return _row_to_dict(cur, cur.fetchone())
+        return cur.fetchone()
 
 def update_user(user_id: str, name: Optional[str] = None, role: Optional[str] = None) -> Optional[Dict[str, Any]]:
     sql = (
         "UPDATE users SET name = COALESCE(%(name)s, name), role = COALESCE(%(role)s, role) "
         "WHERE id = %(id)s RETURNING id, email, name, role, created_at;"
     )
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn() as conn, dict_cursor(conn) as cur:
         cur.execute(sql, {"id": user_id, "name": name, "role": role})
         row = cur.fetchone()
         conn.commit()
-        return _row_to_dict(cur, row)
+        return row
 
 def delete_user(user_id: str) -> Optional[str]:
     sql = "DELETE FROM users WHERE id = %(id)s RETURNING id;"
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn() as conn, dict_cursor(conn) as cur:
         cur.execute(sql, {"id": user_id})
         row = cur.fetchone()
         conn.commit()
-        return row[0] if row else None
+        return row["id"] if row else None
@@ -0,0 +1,125 @@
+"""
+GET condicional y caché en memoria de respuestas de transcripciones terminadas.
+
+GET /transcriptions/{tid} y GET /segments/{tid} calculan un ETag fuerte con
+la versión de la fila (transcriptions.rev, que sube con cada UPDATE, y
+segments_rev), leída con repo_transcriptions.get_version_async: una consulta
+por PK que no toca text_full, artifacts ni los segmentos. Si If-None-Match
+coincide se responde 304 sin buscar el cuerpo. Si no, y la transcripción
+está en un estado final, el cuerpo ya serializado se sirve desde esta caché
+mientras el ETag siga siendo el mismo; una edición posterior cambia la
+versión, así que una entrada vieja nunca se sirve y se reemplaza al volver a
+leer.
+
+El total de bytes guardados se acota con S2X_RESPONSE_CACHE_MB (LRU).
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app import metrics
+from app.responses import etag_matches
+
+# Costo aproximado de la entrada además del cuerpo (clave, cabeceras, objetos)
+_ENTRY_OVERHEAD = 256
+# Cabeceras propias de la respuesta que se recalculan al servir desde caché
+_DROP_HEADERS = {"content-length", "content-type", "etag", "cache-control"}
+
+
+def max_bytes() -> int:
+    return int(float(os.getenv("S2X_RESPONSE_CACHE_MB", "64")) * 1024 * 1024)
+
+
+def cache_control(final: bool) -> str:
+    # Por defecto el cliente revalida siempre (304 barato); las ediciones de
+    # segmentos siguen siendo posibles después de terminar
+    max_age = int(os.getenv("S2X_FINISHED_MAX_AGE_SEC", "0"))
+    return f"private, max-age={max_age}" if final and max_age > 0 else "no-cache"
+
+
+_lock = threading.Lock()
+# clave -> (etag, cuerpo, cabeceras, tamaño)
+_entries: "OrderedDict[Hashable, Tuple[str, bytes, Dict[str, str], int]]" = OrderedDict()
+_size = 0
+
+
+def _drop(key: Hashable) -> None:
+    global _size
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _size -= entry[3]
+
+
+def get(key: Hashable, etag: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == etag:
+            _entries.move_to_end(key)
+            metrics.incr("response_cache.hits")
+            return entry[1], entry[2]
+        if entry is not None:
+            _drop(key)
+    metrics.incr("response_cache.misses")
+    return None
+
+
+def put(key: Hashable, etag: str, body: bytes, headers: Dict[str, str]) -> None:
+    global _size
+    size = len(body) + sum(len(k) + len(v) for k, v in headers.items()) + _ENTRY_OVERHEAD
+    limit = max_bytes()
+    if size > limit:
+        return
+    with _lock:
+        _drop(key)
+        _entries[key] = (etag, body, headers, size)
+        _size += size
+        while _size > limit:
+            _drop(next(iter(_entries)))
+
+
+def clear() -> None:
+    global _size
+    with _lock:
+        _entries.clear()
+        _size = 0
+
+
+def stats() -> Dict[str, Any]:
+    counters = metrics.snapshot()["counters"]
+    with _lock:
+        entries, size = len(_entries), _size
+    return {
+        "entries": entries,
+        "bytes": size,
+        "max_bytes": max_bytes(),
+        "hits": counters.get("response_cache.hits", 0),
+        "misses": counters.get("response_cache.misses", 0),
+        "not_modified": counters.get("response_cache.not_modified", 0),
+    }
+
+
+async def conditional_json(request: Request, key: Hashable, etag: str, final: bool,
+                           build: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    304 si If-None-Match coincide; si no, el cuerpo cacheado (solo estados
+    finales) o el que arme 'build', que se guarda si la respuesta es 200.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control(final)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        metrics.incr("response_cache.not_modified")
+        return Response(status_code=304, headers=headers)
+    if final:
+        hit = get(key, etag)
+        if hit is not None:
+            body, extra = hit
+            return Response(body, media_type="application/json", headers={**extra, **headers})
+    response = await build()
+    if response.status_code != 200:
+        return response
+    if final:
+        put(key, etag, response.body, {k: v for k, v in response.headers.items() if k not in _DROP_HEADERS})
+    response.headers.update(headers)
+    return response
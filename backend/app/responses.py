@@ -0,0 +1,54 @@
+"""
+Respuestas comunes: JSON serializado con orjson y archivos con validadores.
+
+Las rutas de listado la devuelven directamente, así FastAPI no pasa cada fila
+por jsonable_encoder: orjson serializa UUID, datetime y date de forma nativa
+y aquí solo se agrega Decimal (columnas numeric), con el mismo criterio que
+el encoder de FastAPI.
+"""
+import os
+from decimal import Decimal
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def file_response(request: Request, path: str, media_type: str, filename: Optional[str] = None) -> Response:
+    """
+    Sirve un archivo desde disco sin cargarlo en memoria. FileResponse agrega
+    Content-Length y atiende Range/If-Range; aquí se fija el ETag (tamaño y
+    mtime) y se responde 304 a If-None-Match.
+    """
+    st = os.stat(path)
+    etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, filename=filename, stat_result=st, headers=headers,
+                        content_disposition_type="inline")
@@ -1,14 +1,17 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import List, Any, Dict
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Any, Dict, Optional
 from app.schemas import AudioCreate
-from app import repo_audio_files
+from app import repo_audio_files, pagination
+from app.services import pcm_cache
+from app.services.transcribe import load_pcm
 
 router = APIRouter()
 
 @router.post("")
-def create_audio(payload: AudioCreate):
+async def create_audio(payload: AudioCreate):
     try:
-        return repo_audio_files.create_audio(
+        return await repo_audio_files.create_audio_async(
             project_id=payload.project_id,
             s3_uri=payload.s3_uri,
             duration_sec=payload.duration_sec,
@@ -21,12 +24,32 @@ def create_audio(payload: AudioCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{audio_id}")
-def get_audio(audio_id: str):
-    a = repo_audio_files.get_audio(audio_id)
+async def get_audio(audio_id: str):
+    a = await repo_audio_files.get_audio_async(audio_id)
     if not a:
         raise HTTPException(status_code=404, detail="Audio not found")
     return a
 
+@router.get("/{audio_id}/waveform")
+async def get_waveform(audio_id: str, points: int = Query(1000, ge=1, le=10000)):
+    a = await repo_audio_files.get_audio_async(audio_id)
+    if not a:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    try:
+        # La decodificación (si no está en caché) no debe bloquear el event loop
+        pcm = await run_in_threadpool(load_pcm, a)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audio source not available")
+    return {
+        "audio_id": a["id"],
+        "sample_rate": pcm_cache.SAMPLE_RATE,
+        "duration_sec": pcm_cache.duration_sec(pcm),
+        "peaks": await run_in_threadpool(pcm_cache.peaks, pcm, points),
+    }
+
 @router.get("")
-def list_audio(project_id: str, limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0)):
-    return repo_audio_files.list_audio(project_id, limit, offset)
+async def list_audio(project_id: str, limit: int = Query(50, ge=1, le=200),
+               offset: int = Query(0, ge=0), cursor: Optional[str] = None):
+    after = pagination.parse_cursor(cursor, len(repo_audio_files.AUDIO_KEYS), offset)
+    rows = await repo_audio_files.list_audio_async(project_id, limit + 1, offset, after=after)
+    return pagination.page(rows, limit, ("created_at", "id"))
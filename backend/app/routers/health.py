@@ -1,14 +1,36 @@
 from fastapi import APIRouter
-from app.db_pool import get_conn
+from app.db_pool import get_async_conn
+from app import db_pool, metrics, response_cache, share_cache
+from app.services import result_cache
 
 router = APIRouter()
 
 @router.get("")
-def ok():
+async def ok():
     try:
-        with get_conn() as conn, conn.cursor() as cur:
-            cur.execute("select 1")
-            one = cur.fetchone()[0]
+        async with get_async_conn() as conn, conn.cursor() as cur:
+            await cur.execute("select 1")
+            one = (await cur.fetchone())[0]
         return {"status": "ok", "db": one}
     except Exception as e:
         return {"status": "error", "error": str(e)}
+
+@router.get("/cache")
+async def cache_stats():
+    return await result_cache.stats_async()
+
+@router.get("/share-cache")
+async def share_cache_stats():
+    return share_cache.stats()
+
+@router.get("/response-cache")
+async def response_cache_stats():
+    return response_cache.stats()
+
+@router.get("/metrics")
+async def process_metrics():
+    return metrics.snapshot()
+
+@router.get("/db")
+async def pool_stats():
+    return db_pool.stats()
@@ -1,14 +1,14 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from typing import List, Optional
 from app.schemas import NotificationCreate, UpdateNotificationStatus
-from app import repo_notifications
+from app import repo_notifications, pagination
 
 router = APIRouter()
 
 @router.post("")
-def create_notification(payload: NotificationCreate):
+async def create_notification(payload: NotificationCreate):
     try:
-        return repo_notifications.create_notification(
+        return await repo_notifications.create_notification_async(
             transcription_id=payload.transcription_id,
             user_id=payload.user_id,
             type_=payload.type,
@@ -22,13 +22,16 @@ def create_notification(payload: NotificationCreate):
         raise HTTPException(status_code=400, detail=f"DB error: {str(e)}")
 
 @router.get("")
-def list_notifications(transcription_id: str, limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0)):
-    return repo_notifications.list_notifications(transcription_id, limit, offset)
+async def list_notifications(transcription_id: str, limit: int = Query(50, ge=1, le=200),
+                       offset: int = Query(0, ge=0), cursor: Optional[str] = None):
+    after = pagination.parse_cursor(cursor, len(repo_notifications.NOTIFICATION_KEYS), offset)
+    rows = await repo_notifications.list_notifications_async(transcription_id, limit + 1, offset, after=after)
+    return pagination.page(rows, limit, ("created_at", "id"))
 
 @router.post("/{nid}/status")
-def update_status(nid: str, payload: UpdateNotificationStatus):
+async def update_status(nid: str, payload: UpdateNotificationStatus):
     try:
-        n = repo_notifications.update_notification_status(nid, payload.status, payload.payload)
+        n = await repo_notifications.update_notification_status_async(nid, payload.status, payload.payload)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     if not n:
@@ -36,8 +39,8 @@ def update_status(nid: str, payload: UpdateNotificationStatus):
     return n
 
 @router.delete("/{nid}")
-def delete_notification(nid: str):
-    did = repo_notifications.delete_notification(nid)
+async def delete_notification(nid: str):
+    did = await repo_notifications.delete_notification_async(nid)
     if not did:
         raise HTTPException(status_code=404, detail="Notification not found")
     return {"deleted": did}
@@ -1,38 +1,41 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from typing import List, Optional
 from app.schemas import ProjectCreate, ProjectUpdate, ProjectOut
-from app import repo_projects
+from app import repo_projects, pagination
 
 router = APIRouter()
 
 @router.post("", response_model=ProjectOut)
-def create_project(payload: ProjectCreate):
+async def create_project(payload: ProjectCreate):
     try:
-        return repo_projects.create_project(payload.owner_id, payload.name)
+        return await repo_projects.create_project_async(payload.owner_id, payload.name)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{project_id}", response_model=ProjectOut)
-def get_project(project_id: str):
-    p = repo_projects.get_project(project_id)
+async def get_project(project_id: str):
+    p = await repo_projects.get_project_async(project_id)
     if not p:
         raise HTTPException(status_code=404, detail="Project not found")
     return p
 
 @router.get("", response_model=List[ProjectOut])
-def list_projects(owner_id: str, limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0)):
-    return repo_projects.list_projects(owner_id, limit, offset)
+async def list_projects(owner_id: str, limit: int = Query(50, ge=1, le=200),
+                  offset: int = Query(0, ge=0), cursor: Optional[str] = None):
+    after = pagination.parse_cursor(cursor, len(repo_projects.PROJECT_KEYS), offset)
+    rows = await repo_projects.list_projects_async(owner_id, limit + 1, offset, after=after)
+    return pagination.page(rows, limit, ("created_at", "id"))
 
 @router.patch("/{project_id}", response_model=ProjectOut)
-def update_project(project_id: str, owner_id: str, payload: ProjectUpdate):
-    p = repo_projects.update_project(project_id, owner_id, payload.name)
+async def update_project(project_id: str, owner_id: str, payload: ProjectUpdate):
+    p = await repo_projects.update_project_async(project_id, owner_id, payload.name)
     if not p:
         raise HTTPException(status_code=404, detail="Not found or not owner")
     return p
 
 @router.delete("/{project_id}")
-def delete_project(project_id: str, owner_id: str):
-    pid = repo_projects.delete_project(project_id, owner_id)
+async def delete_project(project_id: str, owner_id: str):
+    pid = await repo_projects.delete_project_async(project_id, owner_id)
     if not pid:
         raise HTTPException(status_code=404, detail="Not found or not owner")
     return {"deleted": pid}
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from app import repo_search, pagination
+
+router = APIRouter()
+
+@router.get("")
+async def search(q: str = Query(..., min_length=1, max_length=200), mode: str = "phrase",
+                 project_id: Optional[str] = None, limit: int = Query(20, ge=1, le=100),
+                 hits_per_result: int = Query(5, ge=1, le=50), cursor: Optional[str] = None):
+    """
+    Transcripciones que coinciden con 'q', de mayor a menor rango, cada una con
+    sus segmentos coincidentes (start_ms/end_ms) y el fragmento resaltado con <mark>.
+    """
+    if mode not in repo_search.MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid search mode: {mode}")
+    after = pagination.parse_cursor(cursor, len(repo_search.SEARCH_KEYS))
+    rows = await repo_search.search_async(q, mode, project_id, limit + 1, hits_per_result, after=after)
+    return pagination.page(rows, limit, ("rank", "transcription_id"))
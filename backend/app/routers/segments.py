@@ -1,13 +1,14 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+import hashlib
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional
 from app.schemas import SegmentCreate
-from app import repo_segments
+from app import repo_segments, repo_transcriptions, pagination, response_cache, transcription_events
 
 router = APIRouter()
 
 @router.post("/{tid}")
-def create_segment(tid: str, payload: SegmentCreate):
-    seg_id = repo_segments.insert_segment(
+async def create_segment(tid: str, payload: SegmentCreate):
+    seg_id = await repo_segments.insert_segment_async(
         transcription_id=tid,
         start_ms=payload.start_ms,
         end_ms=payload.end_ms,
@@ -18,10 +19,24 @@ def create_segment(tid: str, payload: SegmentCreate):
     return {"id": seg_id}
 
 @router.get("/{tid}")
-def list_segments(tid: str, limit: int = Query(1000, ge=1, le=5000), offset: int = Query(0, ge=0)):
-    return repo_segments.list_segments(tid, limit, offset)
+async def list_segments(tid: str, request: Request, limit: int = Query(1000, ge=1, le=5000),
+                  offset: int = Query(0, ge=0), cursor: Optional[str] = None):
+    """ETag = revisión de los segmentos (segments_rev) y parámetros de la página."""
+    after = pagination.parse_cursor(cursor, len(repo_segments.SEGMENT_KEYS), offset)
+
+    async def build():
+        rows = await repo_segments.list_segments_async(tid, limit + 1, offset, after=after)
+        return pagination.page(rows, limit, ("start_ms", "id"))
+
+    v = await repo_transcriptions.get_version_async(tid)
+    if not v:
+        return await build()
+    page_key = hashlib.sha1(f"{limit}:{offset}:{cursor or ''}".encode()).hexdigest()[:16]
+    etag = f'"s.{v["id"]}.{v["segments_rev"]}.{page_key}"'
+    final = v["status"] in transcription_events.TERMINAL_STATUSES
+    return await response_cache.conditional_json(request, ("segments", str(v["id"]), page_key), etag, final, build)
 
 @router.delete("/{tid}")
-def delete_segments(tid: str):
-    n = repo_segments.delete_segments_by_transcription(tid)
+async def delete_segments(tid: str):
+    n = await repo_segments.delete_segments_by_transcription_async(tid)
     return {"deleted": n}
@@ -1,3 +1,4 @@
+import os
 from fastapi import APIRouter, HTTPException
 from app.schemas import ShareCreate, ShareUpdate
 from app import repo_shares
@@ -5,9 +6,9 @@ from app import repo_shares
 router = APIRouter()
 
 @router.post("")
-def create_share(payload: ShareCreate):
+async def create_share(payload: ShareCreate):
     try:
-        return repo_shares.create_share(
+        return await repo_shares.create_share_async(
             transcription_id=payload.transcription_id,
             token=payload.token,
             kind=payload.kind,
@@ -19,21 +20,22 @@ def create_share(payload: ShareCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/resolve/{token}")
-def resolve_share(token: str):
-    s = repo_shares.resolve_share(token, grace_seconds=60)
+async def resolve_share(token: str):
+    s = await repo_shares.resolve_share_async(token, grace_seconds=60)
     if not s:
         raise HTTPException(status_code=404, detail="Not found or expired")
     return s
 
 @router.post("/cleanup")
-def cleanup():
-    n = repo_shares.cleanup_expired()
+async def cleanup():
+    # Mismo borrado por lotes que el barrido periódico del worker
+    n = await repo_shares.cleanup_expired_async(batch_size=int(os.getenv("S2X_SHARE_SWEEP_BATCH", "1000")))
     return {"deleted": n}
 
 @router.patch("/{share_id}")
-def update_share_endpoint(share_id: str, payload: ShareUpdate):
+async def update_share_endpoint(share_id: str, payload: ShareUpdate):
     try:
-        s = repo_shares.update_share(share_id, payload.kind, payload.can_edit, payload.expires_at)
+        s = await repo_shares.update_share_async(share_id, payload.kind, payload.can_edit, payload.expires_at)
         if not s:
             raise HTTPException(status_code=404, detail="Share not found")
         return s
@@ -41,8 +43,8 @@ def update_share_endpoint(share_id: str, payload: ShareUpdate):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.delete("/{share_id}")
-def delete_share(share_id: str):
-    sid = repo_shares.delete_share(share_id)
+async def delete_share(share_id: str):
+    sid = await repo_shares.delete_share_async(share_id)
     if not sid:
         raise HTTPException(status_code=404, detail="Share not found")
     return {"deleted": sid}
@@ -1,15 +1,31 @@
-from fastapi import APIRouter, HTTPException, Query, BackgroundTasks
-from typing import List
+import asyncio
+import json
+import os
+from fastapi import APIRouter, HTTPException, Query, BackgroundTasks, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 from app.schemas import TranscriptionCreate, TranscriptionSuccess
-from app import repo_transcriptions, repo_segments
-from app.services.transcribe import process_transcription
+from app import (pg_listener, repo_artifacts, repo_transcriptions, repo_segments, pagination, response_cache,
+                 transcription_events)
+from app.responses import FastJSONResponse, dumps, etag_matches, file_response
+from app.services import artifact_store, exports, streaming
+from app.services.transcribe import process_transcription, allowed_models
 
 router = APIRouter()
 
+ARTIFACT_MEDIA_TYPES = {
+    "srt": "application/x-subrip; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "json": "application/json",
+}
+
 @router.post("")
-def create_transcription(payload: TranscriptionCreate, background_tasks: BackgroundTasks):
+async def create_transcription(payload: TranscriptionCreate, background_tasks: BackgroundTasks):
+    if payload.model_name is not None and payload.model_name not in allowed_models():
+        raise HTTPException(status_code=400, detail=f"Unsupported model_name: {payload.model_name}")
     try:
-        t = repo_transcriptions.create_transcription(
+        t = await repo_transcriptions.create_transcription_async(
             audio_id=payload.audio_id,
             mode=payload.mode,
             language_hint=payload.language_hint,
@@ -17,33 +33,240 @@ def create_transcription(payload: TranscriptionCreate, background_tasks: Backgro
             temperature=payload.temperature,
             beam_size=payload.beam_size,
         )
-        # Encolar procesamiento en background
-        background_tasks.add_task(process_transcription, t["id"])
+        # La fila 'queued' la toma un worker (python -m app.worker); en modo
+        # inline se procesa en el propio proceso de la API. Las de modo
+        # 'stream' esperan la conexión al WebSocket.
+        if t["mode"] == "batch" and os.getenv("S2X_JOB_EXECUTOR", "queue") == "inline":
+            background_tasks.add_task(process_transcription, t["id"])
         return t
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{tid}")
-def get_transcription(tid: str):
-    t = repo_transcriptions.get_transcription(tid)
+async def get_transcription(tid: str, request: Request, view: str = "meta"):
+    """
+    view=status: estado y progreso (para sondeo); meta: todo salvo el texto y
+    los artefactos; full: la fila completa. El texto y los subtítulos se piden
+    aparte en /text y /artifacts/{kind}. ETag = versión de la fila (rev).
+    """
+    if view not in repo_transcriptions.VIEWS:
+        raise HTTPException(status_code=400, detail=f"Invalid view: {view}")
+    v = await repo_transcriptions.get_version_async(tid)
+    if not v:
+        raise HTTPException(status_code=404, detail="Transcription not found")
+
+    async def build():
+        t = await repo_transcriptions.get_transcription_async(tid, view=view)
+        if not t:
+            raise HTTPException(status_code=404, detail="Transcription not found")
+        return FastJSONResponse(t)
+
+    final = v["status"] in transcription_events.TERMINAL_STATUSES
+    etag = f'"t.{v["id"]}.{v["rev"]}.{view}"'
+    return await response_cache.conditional_json(request, ("transcription", str(v["id"]), view), etag, final, build)
+
+@router.get("/{tid}/text", response_class=PlainTextResponse)
+async def get_transcription_text(tid: str):
+    t = await repo_transcriptions.get_text_async(tid)
     if not t:
         raise HTTPException(status_code=404, detail="Transcription not found")
-    return t
+    if t["text_full"] is None:
+        raise HTTPException(status_code=404, detail="Text not available")
+    return PlainTextResponse(t["text_full"])
+
+@router.get("/{tid}/artifacts")
+async def list_transcription_artifacts(tid: str):
+    t = await repo_transcriptions.get_artifacts_summary_async(tid)
+    if not t:
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    stored = await repo_artifacts.list_artifacts_async(tid)
+    # Las transcripciones anteriores al almacén tienen el contenido en la columna artifacts
+    kinds = sorted({a["kind"] for a in stored} | set(t["kinds"]))
+    return {
+        "transcription_id": t["id"],
+        "status": t["status"],
+        "num_segments": t["num_segments"],
+        "artifacts": [{"kind": k, "url": f"/transcriptions/{tid}/artifacts/{k}"} for k in kinds],
+    }
+
+@router.get("/{tid}/artifacts/{kind}")
+async def get_transcription_artifact(tid: str, kind: str, request: Request):
+    """Descarga el artefacto desde el almacén, con Range, ETag y Content-Length."""
+    if kind not in ARTIFACT_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    stored = await repo_artifacts.get_artifact_async(tid, kind)
+    if stored:
+        path = artifact_store.get_store().local_path(stored["s3_uri"])
+        if not path or not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Artifact file not available")
+        return file_response(request, path, ARTIFACT_MEDIA_TYPES[kind], filename=f"{tid}.{kind}")
+    t = await repo_transcriptions.get_artifact_async(tid, kind)
+    if not t:
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    if t["content"] is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return Response(t["content"], media_type=ARTIFACT_MEDIA_TYPES[kind])
+
+@router.get("/{tid}/export/{fmt}")
+async def export_transcription(tid: str, fmt: str, request: Request):
+    """
+    Genera SRT, VTT o JSON lines desde la tabla segments al vuelo, leyendo por
+    páginas de keyset con conexiones cortas: refleja las ediciones, la memoria
+    no depende del largo y un cliente lento no retiene una conexión del pool.
+    El ETag es la revisión de los segmentos (segments_rev).
+    """
+    if fmt not in exports.FORMATS:
+        raise HTTPException(status_code=404, detail="Unsupported export format")
+    t = await repo_transcriptions.get_segments_rev_async(tid)
+    if not t:
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    etag = f'"{t["id"]}.{t["segments_rev"]}.{fmt}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache",
+               "Content-Disposition": f'inline; filename="{tid}.{fmt}"'}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    segments = repo_segments.iter_segments_async(tid)
+    return StreamingResponse(exports.aiter_export(fmt, segments), media_type=exports.FORMATS[fmt], headers=headers)
+
+_EVENT_FIELDS = ("id", "status", "progress", "finished_at")
+
+def _sse_status(t) -> bytes:
+    return b"event: status\ndata: " + dumps({k: t.get(k) for k in _EVENT_FIELDS}) + b"\n\n"
+
+async def _status_stream(sub, t):
+    keepalive = float(os.getenv("S2X_SSE_KEEPALIVE_SEC", "15"))
+    try:
+        yield _sse_status(t)
+        while t["status"] not in transcription_events.TERMINAL_STATUSES:
+            event = await sub.get(keepalive)
+            if event is None and pg_listener.is_listening():
+                yield b": keepalive\n\n"
+                continue
+            # Sin LISTEN activo o con avisos perdidos: se relee la fila
+            if event is None or event is transcription_events.RESYNC:
+                event = await repo_transcriptions.get_transcription_async(sub.transcription_id, view="status")
+                if not event:
+                    return
+            t = event
+            yield _sse_status(t)
+    finally:
+        transcription_events.unsubscribe(sub)
+
+@router.get("/{tid}/events")
+async def transcription_status_events(tid: str):
+    """
+    Server-Sent Events con el estado: un evento 'status' al conectar y uno por
+    cada transición o avance de progreso hasta 'succeeded' o 'failed'. Llegan
+    por LISTEN/NOTIFY (una conexión por proceso), sin sondear la base.
+    """
+    # Suscripción antes de leer el estado, para no perder una transición entre ambos
+    sub = transcription_events.subscribe(tid)
+    try:
+        t = await repo_transcriptions.get_transcription_async(tid, view="status")
+    except Exception:
+        transcription_events.unsubscribe(sub)
+        raise
+    if not t:
+        transcription_events.unsubscribe(sub)
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_status_stream(sub, t), media_type="text/event-stream", headers=headers)
+
+@router.websocket("/{tid}/stream")
+async def stream_transcription(websocket: WebSocket, tid: str, format: str = "pcm_s16le"):
+    """
+    Recibe frames binarios de audio (pcm_s16le/pcm_f32le mono 16 kHz u opus) y
+    responde con eventos JSON 'partial', 'final' y 'done'. El cliente cierra la
+    sesión enviando {"event": "stop"} o desconectándose. Con
+    S2X_STREAM_MAX_SESSIONS sesiones activas en el proceso se cierra con 1013.
+    """
+    t = await repo_transcriptions.get_transcription_async(tid, view="meta")
+    if not t or t["mode"] != "stream" or format not in streaming.FORMATS:
+        await websocket.close(code=1008)
+        return
+    # Whisper corre en este proceso: sin lugar libre se rechaza (1013, reintentar luego)
+    if not streaming.try_open_slot():
+        await websocket.close(code=1013)
+        return
+    try:
+        await _run_stream_session(websocket, tid, t, format)
+    finally:
+        streaming.close_slot()
+
+async def _stream_heartbeat(tid: str) -> None:
+    # Mismo latido que los workers: si la API muere, el reaper cierra la sesión como 'failed'
+    interval = float(os.getenv("S2X_WORKER_HEARTBEAT_SEC", "10"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await repo_transcriptions.touch_heartbeat_async(tid)
+        except Exception:
+            # Un fallo pasajero de la base se reintenta en el próximo latido
+            pass
+
+async def _run_stream_session(websocket: WebSocket, tid: str, t: dict, format: str) -> None:
+    if not await repo_transcriptions.mark_running_async(tid):
+        await websocket.close(code=1008)
+        return
+    heartbeat = asyncio.create_task(_stream_heartbeat(tid))
+    try:
+        await _stream_session_loop(websocket, tid, t, format)
+    finally:
+        heartbeat.cancel()
+
+async def _stream_session_loop(websocket: WebSocket, tid: str, t: dict, format: str) -> None:
+    await websocket.accept()
+
+    session = None
+    connected = True
+    try:
+        session = await streaming.run(streaming.StreamSession, t, format)
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                connected = False
+                break
+            if msg.get("bytes"):
+                for event in await streaming.run(session.feed, msg["bytes"]):
+                    await websocket.send_json(event)
+            elif msg.get("text"):
+                try:
+                    data = json.loads(msg["text"])
+                except ValueError:
+                    data = {}
+                if isinstance(data, dict) and data.get("event") == "stop":
+                    break
+        events = await streaming.run(session.finish)
+        if connected:
+            for event in events:
+                await websocket.send_json(event)
+            await websocket.close()
+    except WebSocketDisconnect:
+        # Lo ya confirmado queda guardado; la sesión se cierra con eso
+        if session is not None:
+            await streaming.run(session.finish)
+    except Exception:
+        await repo_transcriptions.mark_failed_async(tid)
+        if connected:
+            await websocket.close(code=1011)
 
 @router.get("")
-def list_transcriptions(audio_id: str, limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0)):
-    return repo_transcriptions.list_transcriptions_by_audio(audio_id, limit, offset)
+async def list_transcriptions(audio_id: str, limit: int = Query(50, ge=1, le=200),
+                        offset: int = Query(0, ge=0), cursor: Optional[str] = None):
+    after = pagination.parse_cursor(cursor, len(repo_transcriptions.TRANSCRIPTION_KEYS), offset)
+    rows = await repo_transcriptions.list_transcriptions_by_audio_async(audio_id, limit + 1, offset, after=after)
+    return pagination.page(rows, limit, ("started_at", "id"))
 
 @router.post("/{tid}/running")
-def mark_running(tid: str):
-    t = repo_transcriptions.mark_running(tid)
+async def mark_running(tid: str):
+    t = await repo_transcriptions.mark_running_async(tid)
     if not t:
         raise HTTPException(status_code=409, detail="Cannot move to running from current state")
     return t
 
 @router.post("/{tid}/succeeded")
-def mark_succeeded(tid: str, payload: TranscriptionSuccess):
-    t = repo_transcriptions.mark_succeeded(
+async def mark_succeeded(tid: str, payload: TranscriptionSuccess):
+    t = await repo_transcriptions.mark_succeeded_async(
         tid, payload.language_detected, payload.confidence, payload.text_full, payload.artifacts
     )
     if not t:
@@ -51,15 +274,17 @@ def mark_succeeded(tid: str, payload: TranscriptionSuccess):
     return t
 
 @router.post("/{tid}/failed")
-def mark_failed(tid: str):
-    t = repo_transcriptions.mark_failed(tid)
+async def mark_failed(tid: str):
+    t = await repo_transcriptions.mark_failed_async(tid)
     if not t:
         raise HTTPException(status_code=404, detail="Transcription not found")
     return t
 
 @router.delete("/{tid}")
-def delete_transcription(tid: str):
-    tid2 = repo_transcriptions.hard_delete(tid)
+async def delete_transcription(tid: str):
+    tid2 = await repo_transcriptions.hard_delete_async(tid)
     if not tid2:
         raise HTTPException(status_code=404, detail="Transcription not found")
+    # Las filas de artefactos se borran en cascada; los archivos del almacén no
+    await run_in_threadpool(artifact_store.get_store().delete_transcription, str(tid2))
     return {"deleted": tid2}
@@ -0,0 +1,114 @@
+"""
+Almacén de artefactos (SRT, VTT, JSON) de las transcripciones.
+
+Los archivos se escriben en un backend y se registran en
+transcription_artifacts (s3_uri) con repo_artifacts.upsert_artifact; la fila
+de transcriptions ya no guarda su contenido. El backend se elige con
+S2X_ARTIFACT_STORE; por ahora solo existe 'local' (directorio
+S2X_ARTIFACT_DIR, URIs file://). Un backend compatible con S3 debe ofrecer
+la misma interfaz; como no tiene ruta local, la descarga redirigirá a una URL
+firmada en lugar de servir el archivo.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Union
+from urllib.parse import unquote, urlparse
+
+Chunk = Union[str, bytes]
+
+
+def backend_name() -> str:
+    return os.getenv("S2X_ARTIFACT_STORE", "local")
+
+
+def artifact_dir() -> str:
+    return os.getenv("S2X_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "s2x_artifacts"))
+
+
+class LocalArtifactStore:
+    """Guarda cada artefacto en <root>/<transcription_id>/<kind>.<kind>."""
+
+    scheme = "file"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def put(self, transcription_id: str, kind: str, chunks: Iterable[Chunk]) -> str:
+        return self.put_many(transcription_id, ({kind: chunk} for chunk in chunks))[kind]
+
+    def put_many(self, transcription_id: str, parts: Iterable[Dict[str, Chunk]]) -> Dict[str, str]:
+        """
+        Escribe varios artefactos a la vez: cada elemento de 'parts' trae el
+        próximo trozo de uno o más tipos. Devuelve la URI de cada tipo.
+        """
+        folder = os.path.join(self.root, str(transcription_id))
+        os.makedirs(folder, exist_ok=True)
+        suffix = f"{os.getpid()}.{threading.get_ident()}.part"
+        files: Dict[str, BinaryIO] = {}
+        try:
+            for part in parts:
+                for kind, chunk in part.items():
+                    if kind not in files:
+                        files[kind] = open(os.path.join(folder, f"{kind}.{kind}.{suffix}"), "wb")
+                    files[kind].write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            for f in files.values():
+                f.close()
+            # Escritura atómica: quien esté descargando la versión anterior la conserva
+            uris = {}
+            for kind, f in files.items():
+                path = f.name[: -len(suffix) - 1]
+                os.replace(f.name, path)
+                uris[kind] = f"file://{path}"
+            return uris
+        except Exception:
+            for f in files.values():
+                f.close()
+                if os.path.exists(f.name):
+                    os.remove(f.name)
+            raise
+
+    def local_path(self, uri: str) -> Optional[str]:
+        parsed = urlparse(uri)
+        if parsed.scheme != self.scheme:
+            return None
+        path = os.path.abspath(unquote(parsed.path))
+        # Solo se sirven archivos dentro del directorio del almacén
+        if os.path.commonpath([path, self.root]) != self.root:
+            return None
+        return path
+
+    def delete(self, uri: str) -> None:
+        path = self.local_path(uri)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def delete_transcription(self, transcription_id: str) -> None:
+        """Borra todos los artefactos de la transcripción (su carpeta)."""
+        shutil.rmtree(os.path.join(self.root, str(transcription_id)), ignore_errors=True)
+
+    def transcription_ids(self) -> Iterator[str]:
+        """Transcripciones con carpeta en el almacén (para barrer huérfanas)."""
+        if not os.path.isdir(self.root):
+            return
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    yield entry.name
+
+
+_BACKENDS = {"local": lambda: LocalArtifactStore(artifact_dir())}
+_stores: Dict[tuple, LocalArtifactStore] = {}
+_lock = threading.Lock()
+
+
+def get_store() -> LocalArtifactStore:
+    name = backend_name()
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown artifact store: {name}")
+    key = (name, artifact_dir())
+    with _lock:
+        if key not in _stores:
+            _stores[key] = _BACKENDS[name]()
+        return _stores[key]
@@ -0,0 +1,169 @@
+"""
+Inferencia por lotes entre trabajos.
+
+Varios audios cortos con parámetros compatibles se concatenan en un solo
+arreglo y se decodifican juntos con BatchedInferencePipeline: cada audio se
+pasa como uno o más clip_timestamps de hasta 30 s, de modo que el encoder y el
+beam search trabajan sobre lotes completos. Luego cada segmento se devuelve a
+su transcripción según el offset del audio al que pertenece.
+"""
+import bisect
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from faster_whisper import BatchedInferencePipeline
+from faster_whisper.audio import pad_or_trim
+
+from app import repo_audio_files, repo_segments, repo_transcriptions
+from app.services import pcm_cache, result_cache, transcribe
+
+SAMPLE_RATE = 16000
+CLIP_SEC = 30
+
+
+def max_clip_sec() -> int:
+    return int(os.getenv("S2X_BATCH_MAX_SEC", "60"))
+
+
+def batch_size() -> int:
+    return int(os.getenv("S2X_BATCH_SIZE", "8"))
+
+
+def window_sec() -> float:
+    return int(os.getenv("S2X_BATCH_WINDOW_MS", "500")) / 1000.0
+
+
+def detect_languages(model, clips: Sequence[np.ndarray]) -> List[Tuple[str, float]]:
+    """Detecta el idioma de varios audios con una sola pasada del encoder."""
+    features = np.stack([
+        pad_or_trim(model.feature_extractor(clip[: CLIP_SEC * SAMPLE_RATE])[..., :-1])
+        for clip in clips
+    ])
+    encoder_output = model.encode(features)
+    results = model.model.detect_language(encoder_output)
+    # Cada resultado es [(token '<|es|>', prob), ...] ordenado por probabilidad
+    return [(r[0][0][2:-2], r[0][1]) for r in results]
+
+
+def clip_timestamps(offsets: Sequence[int], lengths: Sequence[int]) -> List[Dict[str, float]]:
+    clips: List[Dict[str, float]] = []
+    step = CLIP_SEC * SAMPLE_RATE
+    for offset, length in zip(offsets, lengths):
+        for start in range(0, length, step):
+            end = min(length, start + step)
+            clips.append({"start": (offset + start) / SAMPLE_RATE, "end": (offset + end) / SAMPLE_RATE})
+    return clips
+
+
+def assign_segments(segments, offsets: Sequence[int]) -> List[List[Dict]]:
+    """Reparte los segmentos del lote entre los audios, con tiempos relativos a cada uno."""
+    starts_sec = [o / SAMPLE_RATE for o in offsets]
+    out: List[List[Dict]] = [[] for _ in offsets]
+    for seg in segments:
+        idx = max(0, bisect.bisect_right(starts_sec, seg.start + 1e-6) - 1)
+        offset_ms = offsets[idx] * 1000 // SAMPLE_RATE
+        segment = transcribe._segment_dict(seg)
+        if not segment["text"]:
+            continue
+        segment["start_ms"] = max(0, segment["start_ms"] - offset_ms)
+        segment["end_ms"] = max(0, segment["end_ms"] - offset_ms)
+        out[idx].append(segment)
+    return out
+
+
+def _load_audio(job: Dict) -> Tuple[np.ndarray, Optional[str]]:
+    audio = repo_audio_files.get_audio(job["audio_id"])
+    if not audio:
+        raise RuntimeError("Archivo de audio no encontrado")
+    source = transcribe.LazySource(audio["s3_uri"])
+    try:
+        name, compute_type, _ = transcribe._model_key(job.get("model_name"))
+        key = result_cache.key_for(lambda: transcribe.content_sha256(audio, source), name, compute_type, job)
+        return pcm_cache.load(job["audio_id"], source.path), key
+    finally:
+        source.release()
+
+
+def _decode_group(model, jobs: List[Dict], clips: List[np.ndarray], language: str) -> List[List[Dict]]:
+    offsets: List[int] = []
+    total = 0
+    for clip in clips:
+        offsets.append(total)
+        total += len(clip)
+    first = jobs[0]
+    pipeline = BatchedInferencePipeline(model)
+    segments, _ = pipeline.transcribe(
+        np.concatenate(clips),
+        language=language,
+        temperature=0.0 if first.get("temperature") is None else float(first["temperature"]),
+        beam_size=5 if first.get("beam_size") is None else int(first["beam_size"]),
+        clip_timestamps=clip_timestamps(offsets, [len(c) for c in clips]),
+        batch_size=batch_size(),
+        without_timestamps=False,
+    )
+    return assign_segments(list(segments), offsets)
+
+
+def run_batch(jobs: List[Dict]) -> None:
+    """
+    Procesa un lote de trabajos ya reclamados ('running') con parámetros
+    compatibles. Un fallo al cargar un audio solo marca como fallido ese trabajo.
+    """
+    if os.getenv("S2X_DISABLE_WHISPER") == "1":
+        for job in jobs:
+            transcribe.execute_transcription(str(job["id"]), attempt=job.get("attempts", 1))
+        return
+
+    ready: List[Tuple[Dict, np.ndarray]] = []
+    keys: Dict[str, Optional[str]] = {}
+    for job in jobs:
+        tid = str(job["id"])
+        try:
+            if job.get("attempts", 1) > 1:
+                repo_segments.delete_segments_by_transcription(tid)
+            clip, keys[tid] = _load_audio(job)
+            if keys[tid] and transcribe.reuse_cached_result(keys[tid], tid):
+                continue
+            ready.append((job, clip))
+        except Exception:
+            repo_transcriptions.mark_failed(tid)
+    if not ready:
+        return
+
+    try:
+        model = transcribe._load_model(jobs[0].get("model_name"))
+        hint: Optional[str] = jobs[0].get("language_hint")
+        if hint:
+            languages = [(hint, None)] * len(ready)
+        else:
+            languages = detect_languages(model, [clip for _, clip in ready])
+
+        # Un lote por idioma: el tokenizer del pipeline fija el idioma del prompt
+        by_language: Dict[str, List[int]] = {}
+        for i, (lang, _) in enumerate(languages):
+            by_language.setdefault(lang, []).append(i)
+
+        results: Dict[int, List[Dict]] = {}
+        for lang, idxs in by_language.items():
+            group = _decode_group(model, [ready[i][0] for i in idxs], [ready[i][1] for i in idxs], lang)
+            results.update(zip(idxs, group))
+    except Exception:
+        for job, _ in ready:
+            repo_transcriptions.mark_failed(str(job["id"]))
+        raise
+
+    for i, (job, _) in enumerate(ready):
+        tid = str(job["id"])
+        try:
+            writer = transcribe.SegmentWriter(tid)
+            for segment in results[i]:
+                writer.add(segment)
+            writer.flush()
+            text_full = " ".join(s["text"] for s in results[i])
+            lang, prob = languages[i]
+            transcribe.finish_transcription(tid, lang, prob, text_full, writer.count)
+            if keys.get(tid):
+                result_cache.remember(keys[tid], tid)
+        except Exception:
+            repo_transcriptions.mark_failed(tid)
@@ -0,0 +1,252 @@
+"""
+Descarga de audio remoto con caché en disco.
+
+La primera petición pide solo el primer bloque con Range: si el servidor
+responde 206 se conoce el tamaño y el resto se baja en paralelo por rangos,
+escribiendo cada uno en su offset del archivo. Los archivos se guardan en un
+caché LRU en disco indexado por URI + ETag/Last-Modified. Un índice en
+memoria URI -> validadores permite servir los aciertos sin tocar la red
+durante S2X_AUDIO_REVALIDATE_SEC; fuera de ese plazo (o en un proceso nuevo)
+se pregunta con un HEAD, sin cuerpo, y solo se descarga si el archivo con
+esos validadores no está en el caché.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import metrics
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+def cache_dir() -> str:
+    return os.getenv("S2X_AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "s2x_audio_cache"))
+
+
+def cache_max_bytes() -> int:
+    return int(os.getenv("S2X_AUDIO_CACHE_MB", "2048")) * 1024 * 1024
+
+
+def part_size() -> int:
+    return int(os.getenv("S2X_DOWNLOAD_PART_KB", "8192")) * 1024
+
+
+def num_parts() -> int:
+    return int(os.getenv("S2X_DOWNLOAD_WORKERS", "4"))
+
+
+def revalidate_sec() -> float:
+    return float(os.getenv("S2X_AUDIO_REVALIDATE_SEC", "300"))
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+# URI -> (clave del caché, momento de la última validación)
+_INDEX_MAX = 4096
+_index: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, num_parts() * 2))
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _session = s
+        return _session
+
+
+class Download(NamedTuple):
+    path: str
+    owned: bool  # False si el archivo vive en el caché y no debe borrarse
+    bytes_downloaded: int
+
+
+def _suffix(url: str) -> str:
+    return os.path.splitext(url.split("?")[0].split("#")[0])[-1] or ".bin"
+
+
+def _cache_key(url: str, etag: Optional[str], last_modified: Optional[str]) -> Optional[str]:
+    # Sin validadores no se puede saber si el recurso cambió: no se cachea
+    if not etag and not last_modified:
+        return None
+    raw = "|".join([url, etag or "", last_modified or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cached_path(url: str, key: str) -> str:
+    return os.path.join(cache_dir(), key + _suffix(url))
+
+
+def _remember(url: str, key: str) -> None:
+    with _index_lock:
+        _index[url] = (key, time.monotonic())
+        _index.move_to_end(url)
+        while len(_index) > _INDEX_MAX:
+            _index.popitem(last=False)
+
+
+def _lookup(url: str) -> Optional[str]:
+    """Clave validada hace menos de revalidate_sec(), si la hay."""
+    with _index_lock:
+        entry = _index.get(url)
+    if entry is None or time.monotonic() - entry[1] >= revalidate_sec():
+        return None
+    return entry[0]
+
+
+def _revalidate(url: str) -> Optional[str]:
+    """Clave actual según un HEAD, o None si el servidor no da validadores."""
+    try:
+        resp = get_session().head(url, allow_redirects=True, timeout=60)
+    except requests.RequestException:
+        return None
+    if resp.status_code != 200:
+        return None
+    return _cache_key(url, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+
+
+def _hit(url: str, key: str) -> Optional[Download]:
+    path = _cached_path(url, key)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    _remember(url, key)
+    metrics.incr("audio_cache_hits")
+    return Download(path, False, 0)
+
+
+def _write_stream(resp: requests.Response, fd: int, offset: int) -> int:
+    written = 0
+    for chunk in resp.iter_content(chunk_size=1024 * 1024):
+        if chunk:
+            os.pwrite(fd, chunk, offset + written)
+            written += len(chunk)
+    return written
+
+
+def _fetch_range(url: str, fd: int, start: int, end: int, validator: Optional[str]) -> int:
+    headers = {"Range": f"bytes={start}-{end}"}
+    if validator:
+        headers["If-Range"] = validator
+    with get_session().get(url, headers=headers, stream=True, timeout=60) as resp:
+        resp.raise_for_status()
+        if resp.status_code != 206:
+            raise RuntimeError(f"El servidor ignoró el rango {start}-{end}")
+        return _write_stream(resp, fd, start)
+
+
+def _download(url: str, first: requests.Response, path: str, validator: Optional[str]) -> int:
+    """Completa la descarga a 'path' a partir de la primera respuesta ya abierta."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        match = _CONTENT_RANGE.match(first.headers.get("Content-Range", ""))
+        if first.status_code != 206 or not match:
+            return _write_stream(first, fd, 0)
+
+        total = int(match.group(3))
+        os.ftruncate(fd, total)
+        written = _write_stream(first, fd, 0)
+        step = part_size()
+        ranges = [(s, min(total, s + step) - 1) for s in range(written, total, step)]
+        if ranges:
+            with ThreadPoolExecutor(max_workers=max(1, num_parts())) as pool:
+                futures = [pool.submit(_fetch_range, url, fd, s, e, validator) for s, e in ranges]
+                written += sum(f.result() for f in futures)
+        if written != total:
+            raise RuntimeError(f"Descarga incompleta: {written} de {total} bytes")
+        return written
+    finally:
+        os.close(fd)
+
+
+def _evict(keep: str) -> None:
+    """Borra los archivos menos usados (mtime) hasta respetar el tamaño máximo."""
+    root = cache_dir()
+    entries = []
+    for name in os.listdir(root):
+        full = os.path.join(root, name)
+        if name.endswith(".part") or full == keep:
+            continue
+        try:
+            st = os.stat(full)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, full))
+    total = sum(size for _, size, _ in entries)
+    if os.path.exists(keep):
+        total += os.path.getsize(keep)
+    for _, size, full in sorted(entries):
+        if total <= cache_max_bytes():
+            break
+        try:
+            os.remove(full)
+            total -= size
+        except OSError:
+            pass
+
+
+def fetch(url: str) -> Download:
+    if cache_max_bytes() > 0:
+        # Un acierto nunca empieza a bajar el cuerpo: índice vigente o HEAD
+        key = _lookup(url) or _revalidate(url)
+        hit = _hit(url, key) if key else None
+        if hit is not None:
+            return hit
+
+    first = get_session().get(url, headers={"Range": f"bytes=0-{part_size() - 1}"}, stream=True, timeout=60)
+    try:
+        first.raise_for_status()
+        etag = first.headers.get("ETag")
+        last_modified = first.headers.get("Last-Modified")
+        key = _cache_key(url, etag, last_modified) if cache_max_bytes() > 0 else None
+
+        if key is None:
+            fd, path = tempfile.mkstemp(prefix="s2x_", suffix=_suffix(url))
+            os.close(fd)
+            try:
+                n = _download(url, first, path, None)
+            except Exception:
+                os.remove(path)
+                raise
+            metrics.incr("audio_download_bytes", n)
+            return Download(path, True, n)
+
+        os.makedirs(cache_dir(), exist_ok=True)
+        path = _cached_path(url, key)
+        hit = _hit(url, key)
+        if hit is not None:
+            return hit
+
+        metrics.incr("audio_cache_misses")
+        part = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            n = _download(url, first, part, etag or last_modified)
+            os.replace(part, path)
+        except Exception:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        metrics.incr("audio_download_bytes", n)
+        with _cache_lock:
+            _evict(keep=path)
+        _remember(url, key)
+        return Download(path, False, n)
+    finally:
+        first.close()
+
@@ -0,0 +1,160 @@
+"""
+Exportación de segmentos a SRT, VTT, TSV, JSON y JSON lines.
+
+Los segmentos se procesan por lotes: para cada lote los campos de tiempo
+(horas, minutos, segundos, milisegundos) se calculan de una vez con
+aritmética entera de NumPy sobre los arreglos start_ms/end_ms, y el mismo
+lote se emite en todos los formatos pedidos. Así el documento puede
+alimentarse desde un cursor del lado del servidor y enviarse con
+StreamingResponse, o generarse en una sola pasada para varios artefactos
+(iter_render, que entrega cada lote en todos los formatos). build_srt/build_vtt de services.transcribe usan este módulo.
+"""
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Sequence
+
+import numpy as np
+
+from app.responses import dumps
+
+FORMATS = {
+    "srt": "application/x-subrip; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "tsv": "text/tab-separated-values; charset=utf-8",
+    "json": "application/json",
+    "jsonl": "application/x-ndjson",
+}
+
+# Segmentos por lote: cada lote se convierte en un bloque de la respuesta
+BATCH_ROWS = 1000
+# Tamaño aproximado de cada bloque que se envía al cliente
+CHUNK_BYTES = 64 * 1024
+
+_HEADERS = {"vtt": "WEBVTT\n", "tsv": "start\tend\ttext\n", "json": "["}
+_FOOTERS = {"json": "]"}
+
+
+def _timestamps(ms: Sequence, decimal_sep: str) -> List[str]:
+    """
+    'HH:MM:SS<sep>mmm' para cada valor en milisegundos. Se redondea a
+    milisegundos enteros antes de separar los campos, de modo que 1999.6 ms
+    da 00:00:02,000 y nunca un campo de milisegundos igual a 1000.
+    """
+    total = np.rint(np.asarray(ms, dtype=np.float64)).astype(np.int64)
+    np.maximum(total, 0, out=total)
+    secs, millis = np.divmod(total, 1000)
+    mins, secs = np.divmod(secs, 60)
+    hrs, mins = np.divmod(mins, 60)
+    digits = np.empty((len(total), 12), dtype=np.uint8)
+    digits[:, 0], digits[:, 1] = np.divmod(hrs % 100, 10)
+    digits[:, 3], digits[:, 4] = np.divmod(mins, 10)
+    digits[:, 6], digits[:, 7] = np.divmod(secs, 10)
+    digits[:, 9] = millis // 100
+    digits[:, 10] = millis // 10 % 10
+    digits[:, 11] = millis % 10
+    digits += ord("0")
+    digits[:, 2] = digits[:, 5] = ord(":")
+    digits[:, 8] = ord(decimal_sep)
+    out = digits.view("S12").ravel().astype("U12").tolist()
+    # Más de 99 horas: la hora usa todos los dígitos que necesite
+    for i in np.flatnonzero(hrs >= 100).tolist():
+        out[i] = f"{hrs[i]}{out[i][2:]}"
+    return out
+
+
+def render_batch(formats: Iterable[str], segments: Sequence[Dict], start_index: int = 1) -> Dict[str, str]:
+    """
+    Texto de un lote de segmentos en cada formato, sin cabecera ni cierre.
+    'start_index' es el número (desde 1) del primer segmento del lote.
+    """
+    formats = list(formats)
+    out: Dict[str, str] = {}
+    if not segments:
+        return {fmt: "" for fmt in formats}
+    texts = [s["text"].strip() for s in segments] if {"srt", "vtt", "tsv"} & set(formats) else []
+    if "srt" in formats or "vtt" in formats:
+        starts = _timestamps([s["start_ms"] for s in segments], ",")
+        ends = _timestamps([s["end_ms"] for s in segments], ",")
+    if "srt" in formats:
+        sep = "\n" if start_index > 1 else ""
+        numbers = range(start_index, start_index + len(texts))
+        out["srt"] = sep + "\n".join(f"{i}\n{a} --> {b}\n{t}\n" for i, a, b, t in zip(numbers, starts, ends, texts))
+    if "vtt" in formats:
+        # Mismos dígitos que SRT; solo cambia el separador de milisegundos
+        out["vtt"] = "".join(
+            f"\n{a[:-4]}.{a[-3:]} --> {b[:-4]}.{b[-3:]}\n{t}\n" for a, b, t in zip(starts, ends, texts)
+        )
+    if "tsv" in formats:
+        bounds = np.rint(np.array([(s["start_ms"], s["end_ms"]) for s in segments], dtype=np.float64)).astype(np.int64)
+        out["tsv"] = "".join(
+            f"{a}\t{b}\t{' '.join(t.split())}\n" for (a, b), t in zip(bounds.tolist(), texts)
+        )
+    if "json" in formats:
+        sep = "," if start_index > 1 else ""
+        out["json"] = sep + dumps(list(segments)).decode("utf-8")[1:-1]
+    if "jsonl" in formats:
+        out["jsonl"] = "".join(dumps(s).decode("utf-8") + "\n" for s in segments)
+    unknown = set(formats) - set(out)
+    if unknown:
+        raise ValueError(f"Unsupported export format: {', '.join(sorted(unknown))}")
+    return out
+
+
+def _batches(segments: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    it = iter(segments)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_render(formats: Iterable[str], segments: Iterable[Dict],
+                batch_size: int = BATCH_ROWS) -> Iterator[Dict[str, str]]:
+    """
+    Recorre los segmentos una sola vez y entrega, por lote, el texto de cada
+    formato (la cabecera en el primero y el cierre en el último), para
+    escribir varios documentos a la vez sin tenerlos completos en memoria.
+    """
+    formats = list(formats)
+    yield {fmt: _HEADERS.get(fmt, "") for fmt in formats}
+    index = 1
+    for batch in _batches(segments, batch_size):
+        yield render_batch(formats, batch, index)
+        index += len(batch)
+    yield {fmt: _FOOTERS.get(fmt, "") for fmt in formats}
+
+
+def render(formats: Iterable[str], segments: Iterable[Dict], batch_size: int = BATCH_ROWS) -> Dict[str, str]:
+    """Documentos completos en varios formatos recorriendo los segmentos una sola vez."""
+    formats = list(formats)
+    parts: Dict[str, List[str]] = {fmt: [] for fmt in formats}
+    for chunk in iter_render(formats, segments, batch_size):
+        for fmt, text in chunk.items():
+            parts[fmt].append(text)
+    return {fmt: "".join(p) for fmt, p in parts.items()}
+
+
+def iter_export(fmt: str, segments: Iterable[Dict], batch_size: int = BATCH_ROWS) -> Iterator[str]:
+    for chunk in iter_render((fmt,), segments, batch_size):
+        yield chunk[fmt]
+
+
+async def aiter_export(fmt: str, segments: AsyncIterable[Dict], batch_size: int = BATCH_ROWS,
+                       chunk_bytes: int = CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """
+    Versión asíncrona para StreamingResponse: renderiza por lotes de
+    'batch_size' segmentos y envía bloques de ~'chunk_bytes'.
+    """
+    out = bytearray(_HEADERS.get(fmt, "").encode("utf-8"))
+    batch, index = [], 1
+    async for s in segments:
+        batch.append(s)
+        if len(batch) >= batch_size:
+            out += render_batch((fmt,), batch, index)[fmt].encode("utf-8")
+            index, batch = index + len(batch), []
+            while len(out) >= chunk_bytes:
+                yield bytes(out[:chunk_bytes])
+                del out[:chunk_bytes]
+    out += (render_batch((fmt,), batch, index)[fmt] + _FOOTERS.get(fmt, "")).encode("utf-8")
+    for start in range(0, len(out), chunk_bytes):
+        yield bytes(out[start:start + chunk_bytes])
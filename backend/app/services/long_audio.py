@@ -0,0 +1,152 @@
+"""
+Transcripción en paralelo de audios largos.
+
+El audio se corta en silencios detectados por VAD y cada trozo se transcribe en
+un proceso distinto. Este módulo no importa nada de la base de datos: los
+procesos hijos se crean con 'spawn' y solo cargan faster-whisper y el caché
+de PCM.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from faster_whisper import WhisperModel
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from app.services import pcm_cache
+
+SAMPLE_RATE = 16000
+
+Span = Tuple[int, int]
+
+
+def threshold_sec() -> float:
+    return float(os.getenv("S2X_LONG_AUDIO_SEC", "600"))
+
+
+def chunk_sec() -> float:
+    return float(os.getenv("S2X_CHUNK_SEC", "120"))
+
+
+def num_workers() -> int:
+    return int(os.getenv("S2X_CHUNK_WORKERS", str(os.cpu_count() or 1)))
+
+
+def enabled_for(duration_sec: Optional[float]) -> bool:
+    limit = threshold_sec()
+    return bool(duration_sec) and limit > 0 and num_workers() > 1 and duration_sec >= limit
+
+
+def find_speech(audio: np.ndarray) -> List[Dict[str, int]]:
+    opts = VadOptions(min_silence_duration_ms=500, speech_pad_ms=200)
+    return get_speech_timestamps(audio, vad_options=opts, sampling_rate=SAMPLE_RATE)
+
+
+def plan_chunks(speech: Sequence[Dict[str, int]], total_samples: int,
+                target_samples: int, max_samples: Optional[int] = None) -> List[Span]:
+    """
+    Agrupa las regiones de voz en trozos de al menos 'target_samples', cortando
+    en el punto medio del silencio entre dos regiones. Los trozos cubren todo el
+    audio sin solaparse; si no hay silencios se corta duro en 'max_samples'.
+    """
+    max_samples = max_samples or 2 * target_samples
+    cuts = [0]
+    for prev, nxt in zip(speech, speech[1:]):
+        cut = (prev["end"] + nxt["start"]) // 2
+        if cut - cuts[-1] >= target_samples and total_samples - cut > 0:
+            cuts.append(cut)
+    bounds = cuts + [total_samples]
+
+    spans: List[Span] = []
+    for start, end in zip(bounds, bounds[1:]):
+        while end - start > max_samples:
+            spans.append((start, start + max_samples))
+            start += max_samples
+        if end > start:
+            spans.append((start, end))
+    return spans
+
+
+# ---- Lado de los procesos hijos ----
+
+_worker_model: Optional[Tuple[Tuple[str, str], WhisperModel]] = None
+_worker_threads = 0
+
+
+def _init_worker(cpu_threads: int) -> None:
+    global _worker_threads
+    _worker_threads = cpu_threads
+
+
+def _get_worker_model(model_name: str, compute_type: str) -> WhisperModel:
+    # Cada proceso mantiene residente solo el último modelo usado
+    global _worker_model
+    key = (model_name, compute_type)
+    if _worker_model is None or _worker_model[0] != key:
+        _worker_model = (key, WhisperModel(model_name, device="cpu", compute_type=compute_type,
+                                           cpu_threads=_worker_threads))
+    return _worker_model[1]
+
+
+def _detect_language(audio: np.ndarray, model_name: str, compute_type: str) -> Tuple[str, float]:
+    model = _get_worker_model(model_name, compute_type)
+    language, probability, _ = model.detect_language(audio=audio)
+    return language, probability
+
+
+def _transcribe_chunk(args) -> List[Dict]:
+    pcm_path, start, end, model_name, compute_type, options = args
+    model = _get_worker_model(model_name, compute_type)
+    # Se lee solo el tramo del .npy mapeado: las páginas se comparten entre procesos
+    audio = np.array(pcm_cache.open_pcm(pcm_path)[start:end])
+    offset_ms = start * 1000 // SAMPLE_RATE
+    segments_iter, _ = model.transcribe(audio, **options)
+    out: List[Dict] = []
+    for seg in segments_iter:
+        text = (seg.text or "").strip()
+        if not text:
+            continue
+        out.append({
+            "start_ms": offset_ms + int(seg.start * 1000),
+            "end_ms": offset_ms + int(seg.end * 1000),
+            "text": text,
+            "confidence": None,
+            "speaker_label": None,
+        })
+    return out
+
+
+# ---- Lado del proceso principal ----
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = max(1, num_workers())
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads,),
+            )
+        return _pool
+
+
+def detect_language(audio: np.ndarray, model_name: str, compute_type: str) -> Tuple[str, float]:
+    head = audio[: 30 * SAMPLE_RATE]
+    return get_pool().submit(_detect_language, head, model_name, compute_type).result()
+
+
+def transcribe_chunks(pcm_path: str, spans: Sequence[Span], model_name: str,
+                      compute_type: str, options: Dict) -> Iterator[List[Dict]]:
+    """Transcribe los trozos en paralelo y entrega sus segmentos en orden."""
+    tasks = ((pcm_path, start, end, model_name, compute_type, options) for start, end in spans)
+    return get_pool().map(_transcribe_chunk, tasks)
@@ -0,0 +1,158 @@
+"""
+Canales de entrega de notificaciones.
+
+Cada tipo de notification_type_enum tiene un backend elegido con
+S2X_NOTIFY_<TIPO>_BACKEND:
+  - email: 'smtp' (SmtpChannel). Para probar en local basta un servidor de
+    depuración, p. ej. `python -m smtpd -n -c DebuggingServer localhost:1025`
+    con S2X_SMTP_HOST=localhost y S2X_SMTP_PORT=1025.
+  - whatsapp: 'stub' (WhatsAppStubChannel), que valida el número y guarda el
+    mensaje en memoria hasta que exista un proveedor real.
+
+Un canal expone send(notification) y señala los fallos con DeliveryError
+(transitorio, se reintenta) o PermanentDeliveryError (no tiene sentido
+reintentar: destino inválido, rechazo 5xx).
+"""
+import logging
+import os
+import re
+import smtplib
+import threading
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Protocol, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    """Fallo transitorio: el despachador reintenta con backoff."""
+
+
+class PermanentDeliveryError(DeliveryError):
+    """El envío no puede funcionar nunca; la notificación queda 'failed'."""
+
+
+class Channel(Protocol):
+    def send(self, notification: Dict[str, Any]) -> None: ...
+
+
+def render_message(notification: Dict[str, Any]) -> Tuple[str, str]:
+    """Asunto y cuerpo: los del payload si vienen, si no un aviso genérico."""
+    payload = notification.get("payload") or {}
+    tid = notification["transcription_id"]
+    subject = payload.get("subject") or f"Speech2Text X: transcription {tid}"
+    body = payload.get("body") or payload.get("text") or f"Transcription {tid} has an update."
+    return subject, body
+
+
+class SmtpChannel:
+    """Envío por SMTP; cada hilo del despachador reutiliza su propia conexión."""
+
+    def __init__(self, host: str, port: int, sender: str, username: str = None, password: str = None,
+                 starttls: bool = False, timeout: float = 30.0):
+        self.host, self.port, self.sender = host, port, sender
+        self.username, self.password = username, password
+        self.starttls, self.timeout = starttls, timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> "SmtpChannel":
+        return cls(
+            host=os.getenv("S2X_SMTP_HOST", "localhost"),
+            port=int(os.getenv("S2X_SMTP_PORT", "25")),
+            sender=os.getenv("S2X_SMTP_FROM", "no-reply@speech2text.local"),
+            username=os.getenv("S2X_SMTP_USER") or None,
+            password=os.getenv("S2X_SMTP_PASSWORD") or None,
+            starttls=os.getenv("S2X_SMTP_STARTTLS", "0") == "1",
+            timeout=float(os.getenv("S2X_SMTP_TIMEOUT_SEC", "30")),
+        )
+
+    def _connection(self) -> smtplib.SMTP:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                conn.starttls()
+            if self.username:
+                conn.login(self.username, self.password or "")
+            self._local.conn = conn
+        return conn
+
+    def _close(self) -> None:
+        conn, self._local.conn = getattr(self._local, "conn", None), None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def send(self, notification: Dict[str, Any]) -> None:
+        subject, body = render_message(notification)
+        msg = EmailMessage()
+        msg["From"], msg["To"], msg["Subject"] = self.sender, notification["target"], subject
+        msg.set_content(body)
+        # Una conexión reutilizada puede haber expirado en el servidor: se reintenta una vez
+        for retry in (True, False):
+            try:
+                self._connection().send_message(msg)
+                return
+            except smtplib.SMTPServerDisconnected as e:
+                self._close()
+                if not retry:
+                    raise DeliveryError(f"SMTP disconnected: {e}") from e
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentDeliveryError(f"Recipient refused: {notification['target']}") from e
+            except smtplib.SMTPResponseException as e:
+                self._close()
+                error = e.smtp_error.decode("utf-8", "replace") if isinstance(e.smtp_error, bytes) else str(e.smtp_error)
+                if 500 <= e.smtp_code < 600:
+                    raise PermanentDeliveryError(f"SMTP {e.smtp_code}: {error}") from e
+                raise DeliveryError(f"SMTP {e.smtp_code}: {error}") from e
+            except (smtplib.SMTPException, OSError) as e:
+                self._close()
+                raise DeliveryError(f"SMTP error: {e}") from e
+
+
+_E164 = re.compile(r"^\+[1-9]\d{6,14}$")
+
+
+class WhatsAppStubChannel:
+    """Sustituto del proveedor de WhatsApp: valida el destino y registra el mensaje."""
+
+    def __init__(self):
+        self.sent: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+
+    def send(self, notification: Dict[str, Any]) -> None:
+        target = notification["target"]
+        if not _E164.match(target):
+            raise PermanentDeliveryError(f"Invalid WhatsApp number: {target}")
+        _, body = render_message(notification)
+        with self._lock:
+            self.sent.append({"to": target, "body": body})
+        log.info("whatsapp stub: message to %s", target)
+
+
+_BACKENDS: Dict[str, Dict[str, Callable[[], Channel]]] = {
+    "email": {"smtp": SmtpChannel.from_env},
+    "whatsapp": {"stub": WhatsAppStubChannel},
+}
+_DEFAULT_BACKEND = {"email": "smtp", "whatsapp": "stub"}
+_channels: Dict[Tuple[str, str], Channel] = {}
+_lock = threading.Lock()
+
+
+def backend_name(type_: str) -> str:
+    return os.getenv(f"S2X_NOTIFY_{type_.upper()}_BACKEND", _DEFAULT_BACKEND.get(type_, ""))
+
+
+def get_channel(type_: str) -> Channel:
+    name = backend_name(type_)
+    factory = _BACKENDS.get(type_, {}).get(name)
+    if factory is None:
+        raise PermanentDeliveryError(f"No delivery backend for {type_!r} ({name!r})")
+    key = (type_, name)
+    with _lock:
+        if key not in _channels:
+            _channels[key] = factory()
+        return _channels[key]
@@ -0,0 +1,111 @@
+"""
+Caché de audio decodificado.
+
+Cada audio_files se decodifica una sola vez a PCM mono float32 de 16 kHz y se
+guarda como <audio_id>.npy. Los trabajos, los procesos de trozos y el
+endpoint de forma de onda lo abren con np.load(mmap_mode="r"), así que
+comparten las páginas del page cache en lugar de volver a correr ffmpeg.
+Este módulo no toca la base de datos (lo importan los procesos hijos).
+"""
+import os
+import tempfile
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+_lock = threading.Lock()
+
+
+def cache_dir() -> str:
+    return os.getenv("S2X_PCM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "s2x_pcm_cache"))
+
+
+def cache_max_bytes() -> int:
+    return int(os.getenv("S2X_PCM_CACHE_MB", "4096")) * 1024 * 1024
+
+
+def path_for(audio_id: str) -> str:
+    return os.path.join(cache_dir(), f"{audio_id}.npy")
+
+
+def open_pcm(path: str) -> np.ndarray:
+    return np.load(path, mmap_mode="r")
+
+
+def _decode(source_path: str) -> np.ndarray:
+    from faster_whisper.audio import decode_audio
+
+    return decode_audio(source_path, sampling_rate=SAMPLE_RATE)
+
+
+def _evict(keep: str) -> None:
+    """Borra los .npy menos usados (mtime) hasta respetar el tamaño máximo."""
+    root = cache_dir()
+    entries = []
+    for name in os.listdir(root):
+        full = os.path.join(root, name)
+        if not name.endswith(".npy") or full == keep:
+            continue
+        try:
+            st = os.stat(full)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, full))
+    total = sum(size for _, size, _ in entries) + os.path.getsize(keep)
+    for _, size, full in sorted(entries):
+        if total <= cache_max_bytes():
+            break
+        try:
+            # Quien ya tenga el archivo mapeado conserva sus páginas
+            os.remove(full)
+            total -= size
+        except OSError:
+            pass
+
+
+def ensure(audio_id: str, resolve_source: Callable[[], str]) -> str:
+    """
+    Devuelve la ruta del .npy del audio, decodificándolo si aún no existe.
+    'resolve_source' solo se llama en un fallo de caché.
+    """
+    path = path_for(str(audio_id))
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    os.makedirs(cache_dir(), exist_ok=True)
+    audio = _decode(resolve_source())
+    part = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with open(part, "wb") as f:
+            np.save(f, np.ascontiguousarray(audio, dtype=np.float32))
+        os.replace(part, path)
+    except Exception:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    with _lock:
+        _evict(keep=path)
+    return path
+
+
+def load(audio_id: str, resolve_source: Callable[[], str]) -> np.ndarray:
+    return open_pcm(ensure(audio_id, resolve_source))
+
+
+def peaks(audio: np.ndarray, points: int) -> List[List[float]]:
+    """Pares [mín, máx] por tramo, para dibujar la forma de onda."""
+    n = len(audio)
+    if n == 0:
+        return []
+    points = max(1, min(points, n))
+    bounds = np.linspace(0, n, points + 1, dtype=np.int64)
+    mins = np.minimum.reduceat(audio, bounds[:-1])
+    maxs = np.maximum.reduceat(audio, bounds[:-1])
+    return [[round(float(a), 4), round(float(b), 4)] for a, b in zip(mins, maxs)]
+
+
+def duration_sec(audio: np.ndarray) -> Optional[float]:
+    return len(audio) / SAMPLE_RATE if len(audio) else None
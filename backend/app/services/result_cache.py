@@ -0,0 +1,135 @@
+"""
+Caché de resultados direccionada por contenido.
+
+La clave es el sha256 de los bytes del audio junto con los parámetros que
+afectan al resultado (modelo, compute_type, idioma, temperatura, beam_size).
+Si otra transcripción con la misma clave ya terminó, se copian sus segmentos
+en lugar de volver a ejecutar Whisper y se generan artefactos propios.
+
+Los aciertos y fallos se cuentan en metrics y se suman a
+transcription_cache_stats en bloque cada S2X_RESULT_CACHE_STATS_FLUSH_SEC,
+para no actualizar una única fila compartida en cada búsqueda.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app import metrics, repo_result_cache
+
+_lock = threading.Lock()
+# Aciertos y fallos de este proceso todavía no sumados a la base
+_pending = {"hits": 0, "misses": 0}
+_flushed_at = time.monotonic()
+
+
+def enabled() -> bool:
+    return os.getenv("S2X_RESULT_CACHE", "1") == "1"
+
+
+def flush_sec() -> float:
+    return float(os.getenv("S2X_RESULT_CACHE_STATS_FLUSH_SEC", "30"))
+
+
+def _count(kind: str) -> None:
+    metrics.incr(f"result_cache.{kind}")
+    with _lock:
+        _pending[kind] += 1
+    flush_stats(force=False)
+
+
+def flush_stats(force: bool = True) -> None:
+    """
+    Suma a la base lo acumulado por este proceso (sin 'force', solo si pasó
+    el intervalo desde la última vez). Si falla, se reintenta en la próxima.
+    """
+    global _flushed_at
+    with _lock:
+        if not force and time.monotonic() - _flushed_at < flush_sec():
+            return
+        hits, misses = _pending["hits"], _pending["misses"]
+        _pending["hits"] = _pending["misses"] = 0
+        _flushed_at = time.monotonic()
+    if not hits and not misses:
+        return
+    try:
+        repo_result_cache.add_stats(hits, misses)
+    except Exception:
+        with _lock:
+            _pending["hits"] += hits
+            _pending["misses"] += misses
+        raise
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(audio_sha256: str, model_name: str, compute_type: str, transcription: Dict) -> str:
+    # Se normalizan los valores por defecto para que None y el valor explícito coincidan
+    temperature = transcription.get("temperature")
+    beam_size = transcription.get("beam_size")
+    parts = [
+        audio_sha256,
+        model_name,
+        compute_type,
+        transcription.get("language_hint") or "",
+        repr(0.0 if temperature is None else float(temperature)),
+        str(5 if beam_size is None else int(beam_size)),
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def try_reuse(key: str, transcription_id: str) -> Optional[Dict]:
+    """
+    Copia los segmentos del resultado cacheado si existe y devuelve los campos
+    del origen para terminar la transcripción; cuenta un acierto o un fallo.
+    """
+    src = repo_result_cache.lookup(key)
+    if src and src != str(transcription_id):
+        copied = repo_result_cache.copy_result(key, src, str(transcription_id))
+        if copied is not None:
+            _count("hits")
+            return copied
+    _count("misses")
+    return None
+
+
+def remember(key: str, transcription_id: str) -> None:
+    repo_result_cache.store(key, str(transcription_id))
+    repo_result_cache.evict(
+        max_age_days=int(os.getenv("S2X_RESULT_CACHE_MAX_AGE_DAYS", "30")),
+        max_bytes=int(os.getenv("S2X_RESULT_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+    )
+
+
+def _with_ratio(s: Dict) -> Dict:
+    # Lo de este proceso que aún no llegó a la base
+    with _lock:
+        s["hits"] += _pending["hits"]
+        s["misses"] += _pending["misses"]
+    lookups = s["hits"] + s["misses"]
+    s["hit_ratio"] = round(s["hits"] / lookups, 4) if lookups else None
+    return s
+
+
+def stats() -> Dict:
+    return _with_ratio(repo_result_cache.stats())
+
+
+async def stats_async() -> Dict:
+    # Para la API: usa el pool 'api', no el de los workers
+    return _with_ratio(await repo_result_cache.stats_async())
+
+
+def key_for(audio_sha256: Callable[[], str], model_name: str, compute_type: str,
+            transcription: Dict) -> Optional[str]:
+    # El hash se pide solo si el caché está activo
+    if not enabled():
+        return None
+    return cache_key(audio_sha256(), model_name, compute_type, transcription)
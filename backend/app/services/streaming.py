@@ -0,0 +1,295 @@
+"""
+Transcripción en vivo (mode='stream') con ventana deslizante.
+
+El audio llega en frames y se acumula en un buffer. Cada 'step' de audio
+nuevo se vuelve a transcribir el buffer con timestamps por palabra y se
+aplica LocalAgreement: una palabra se confirma cuando dos hipótesis seguidas
+coinciden en ella (prefijo común). Lo no confirmado se envía como parcial;
+las palabras confirmadas se agrupan en segmentos finales (al cerrar una
+frase o superar una duración) que se guardan en la base apenas se cierran.
+El buffer se recorta al final de lo confirmado para acotar el costo.
+
+La decodificación corre dentro del proceso de la API, así que las sesiones
+simultáneas se limitan con S2X_STREAM_MAX_SESSIONS y todo el trabajo de
+Whisper va a un executor propio: no ocupa el threadpool que atiende las
+rutas sync ni los callbacks del pool async.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services import transcribe
+
+SAMPLE_RATE = 16000
+FORMATS = ("pcm_s16le", "pcm_f32le", "opus")
+
+Word = Tuple[float, float, str]  # inicio y fin en segundos absolutos, texto
+
+
+def step_sec() -> float:
+    return int(os.getenv("S2X_STREAM_STEP_MS", "500")) / 1000.0
+
+
+def max_buffer_sec() -> float:
+    return float(os.getenv("S2X_STREAM_MAX_BUFFER_SEC", "15"))
+
+
+def max_segment_sec() -> float:
+    return float(os.getenv("S2X_STREAM_SEGMENT_SEC", "8"))
+
+
+def max_sessions() -> int:
+    return int(os.getenv("S2X_STREAM_MAX_SESSIONS", "2"))
+
+
+_slots_lock = threading.Lock()
+_active = 0
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def try_open_slot() -> bool:
+    """Reserva un lugar para una sesión nueva; False si ya no hay."""
+    global _active
+    with _slots_lock:
+        if _active >= max_sessions():
+            return False
+        _active += 1
+        return True
+
+
+def close_slot() -> None:
+    global _active
+    with _slots_lock:
+        _active = max(0, _active - 1)
+
+
+def active_sessions() -> int:
+    with _slots_lock:
+        return _active
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Un hilo por sesión posible: una sesión nunca espera a otra
+    global _executor
+    with _slots_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, max_sessions()), thread_name_prefix="s2x-stream")
+        return _executor
+
+
+async def run(fn: Callable[..., Any], *args: Any) -> Any:
+    """Corre 'fn' en el executor de las sesiones en vivo."""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+class FrameDecoder:
+    """Convierte los frames recibidos a float32 mono de 16 kHz."""
+
+    def __init__(self, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt}")
+        self.fmt = fmt
+        # Un frame PCM puede cortar una muestra: el resto pasa al siguiente
+        self._pending = b""
+        self._codec = None
+        self._resampler = None
+        if fmt == "opus":
+            import av
+
+            self._codec = av.CodecContext.create("opus", "r")
+            self._codec.sample_rate = 48000
+            self._codec.layout = "mono"
+            self._resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+            self._packet = av.Packet
+
+    def _whole_samples(self, data: bytes, width: int) -> bytes:
+        data = self._pending + data
+        cut = len(data) - len(data) % width
+        self._pending = data[cut:]
+        return data[:cut]
+
+    def decode(self, data: bytes) -> np.ndarray:
+        if self.fmt == "pcm_s16le":
+            return np.frombuffer(self._whole_samples(data, 2), dtype="<i2").astype(np.float32) / 32768.0
+        if self.fmt == "pcm_f32le":
+            return np.frombuffer(self._whole_samples(data, 4), dtype="<f4").astype(np.float32)
+        out = [
+            r.to_ndarray().reshape(-1)
+            for frame in self._codec.decode(self._packet(data))
+            for r in self._resampler.resample(frame)
+        ]
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+
+def _norm(word: str) -> str:
+    return word.strip(".,;:!?¡¿\"'()[]…-").lower()
+
+
+def _ends_sentence(word: str) -> bool:
+    return word.rstrip("\"')]").endswith((".", "?", "!", "…"))
+
+
+def _segment(words: List[Word]) -> Dict:
+    return {
+        "start_ms": int(words[0][0] * 1000),
+        "end_ms": int(words[-1][1] * 1000),
+        "text": " ".join(w[2] for w in words),
+        "confidence": None,
+        "speaker_label": None,
+    }
+
+
+class StreamingTranscriber:
+    """Motor de LocalAgreement-2; no toca la base de datos."""
+
+    def __init__(self, model, language: Optional[str] = None, temperature: Optional[float] = None,
+                 beam_size: Optional[int] = None):
+        self.model = model
+        self.language = language
+        self.language_probability: Optional[float] = None
+        self.temperature = 0.0 if temperature is None else float(temperature)
+        self.beam_size = 5 if beam_size is None else int(beam_size)
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.offset = 0.0            # segundo absoluto donde empieza el buffer
+        self.committed_end = 0.0     # fin de la última palabra confirmada
+        self.hypothesis: List[Word] = []   # última hipótesis sin confirmar
+        self.open_words: List[Word] = []   # confirmadas, aún sin segmento final
+        self.history: List[str] = []       # texto confirmado, para el prompt
+        self._unprocessed = 0
+
+    def feed(self, audio: np.ndarray) -> List[Dict]:
+        self.buffer = np.concatenate([self.buffer, audio])
+        self._unprocessed += len(audio)
+        if self._unprocessed < step_sec() * SAMPLE_RATE:
+            return []
+        return self._process()
+
+    def finish(self) -> List[Dict]:
+        """Última pasada: confirma la hipótesis vigente y cierra todo lo abierto."""
+        events = self._process() if self._unprocessed else []
+        self._commit(self.hypothesis)
+        self.hypothesis = []
+        finals = [e for e in events if e["type"] == "final"]
+        return finals + [{"type": "final", "segment": s} for s in self._cut(force=True)]
+
+    def _transcribe(self) -> List[Word]:
+        prompt = " ".join(self.history[-40:]) or None
+        segments, info = self.model.transcribe(
+            self.buffer,
+            language=self.language,
+            temperature=self.temperature,
+            beam_size=self.beam_size,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=prompt,
+        )
+        words: List[Word] = []
+        for seg in segments:
+            for w in seg.words or []:
+                start, end = self.offset + w.start, self.offset + w.end
+                text = w.word.strip()
+                # Se descartan las palabras que ya quedaron confirmadas
+                if text and (start + end) / 2 > self.committed_end:
+                    words.append((start, end, text))
+        if self.language is None:
+            # El idioma se fija con la primera detección para toda la sesión
+            self.language = info.language
+            self.language_probability = info.language_probability
+        return words
+
+    def _commit(self, words: List[Word]) -> None:
+        if not words:
+            return
+        self.open_words.extend(words)
+        self.history.extend(w[2] for w in words)
+        self.committed_end = words[-1][1]
+
+    def _process(self) -> List[Dict]:
+        self._unprocessed = 0
+        words = self._transcribe()
+        agreed = 0
+        for prev, cur in zip(self.hypothesis, words):
+            if _norm(prev[2]) != _norm(cur[2]):
+                break
+            agreed += 1
+        self._commit(words[:agreed])
+        self.hypothesis = words[agreed:]
+        events = [{"type": "final", "segment": s} for s in self._cut(force=False)]
+        self._trim()
+        pending = self.open_words + self.hypothesis
+        if pending:
+            events.append({
+                "type": "partial",
+                "start_ms": int(pending[0][0] * 1000),
+                "text": " ".join(w[2] for w in pending),
+            })
+        return events
+
+    def _cut(self, force: bool) -> List[Dict]:
+        out: List[Dict] = []
+        start = 0
+        for i, w in enumerate(self.open_words):
+            if _ends_sentence(w[2]) or w[1] - self.open_words[start][0] >= max_segment_sec():
+                out.append(_segment(self.open_words[start:i + 1]))
+                start = i + 1
+        self.open_words = self.open_words[start:]
+        if force and self.open_words:
+            out.append(_segment(self.open_words))
+            self.open_words = []
+        return out
+
+    def _trim(self) -> None:
+        if len(self.buffer) / SAMPLE_RATE <= max_buffer_sec():
+            return
+        cut_at = self.committed_end
+        if cut_at <= self.offset:
+            # Nada confirmado en todo el buffer (silencio o ruido): se conserva la cola
+            cut_at = self.offset + len(self.buffer) / SAMPLE_RATE - max_buffer_sec() / 2
+            self.hypothesis = [w for w in self.hypothesis if w[0] >= cut_at]
+        drop = int((cut_at - self.offset) * SAMPLE_RATE)
+        self.buffer = self.buffer[drop:]
+        self.offset += drop / SAMPLE_RATE
+
+
+class StreamSession:
+    """Une el motor con la persistencia de una transcripción en modo 'stream'."""
+
+    def __init__(self, transcription: Dict, fmt: str):
+        self.transcription_id = str(transcription["id"])
+        self.decoder = FrameDecoder(fmt)
+        self.engine = StreamingTranscriber(
+            transcribe._load_model(transcription.get("model_name")),
+            language=transcription.get("language_hint"),
+            temperature=transcription.get("temperature"),
+            beam_size=transcription.get("beam_size"),
+        )
+        # Cada segmento final se escribe apenas se cierra
+        self.writer = transcribe.SegmentWriter(self.transcription_id, batch_size=1)
+        self.texts: List[str] = []
+
+    def _persist(self, events: List[Dict]) -> List[Dict]:
+        for e in events:
+            if e["type"] == "final":
+                self.writer.add(e["segment"])
+                self.texts.append(e["segment"]["text"])
+        return events
+
+    def feed(self, data: bytes) -> List[Dict]:
+        return self._persist(self.engine.feed(self.decoder.decode(data)))
+
+    def finish(self) -> List[Dict]:
+        events = self._persist(self.engine.finish())
+        self.writer.flush()
+        transcribe.finish_transcription(
+            self.transcription_id,
+            self.engine.language,
+            self.engine.language_probability,
+            " ".join(self.texts),
+            self.writer.count,
+        )
+        return events + [{"type": "done", "transcription_id": self.transcription_id,
+                          "num_segments": self.writer.count}]
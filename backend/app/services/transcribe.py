@@ -1,36 +1,19 @@
 import os
 import tempfile
+import threading
+import time
 import uuid
-from typing import Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
-import requests
 from faster_whisper import WhisperModel
 
-from app import repo_transcriptions, repo_segments, repo_audio_files
-
-
-def _download_http(url: str) -> str:
-    resp = requests.get(url, stream=True, timeout=60)
-    resp.raise_for_status()
-    suffix = os.path.splitext(url.split("?")[0].split("#")[0])[-1] or ".bin"
-    fd, path = tempfile.mkstemp(prefix="s2x_", suffix=suffix)
-    try:
-        with os.fdopen(fd, "wb") as f:
-            for chunk in resp.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
-    except Exception:
-        try:
-            os.remove(path)
-        except OSError:
-            pass
-        raise
-    return path
+from app import metrics, repo_artifacts, repo_transcriptions, repo_segments, repo_audio_files
+from app.responses import dumps
+from app.services import artifact_store, downloads, exports, long_audio, pcm_cache, result_cache
 
 
 def _download_local(path_like: str) -> str:
-    if not os.path.exists(path_like):
-        raise FileNotFoundError(f"No existe el archivo local: {path_like}")
     suffix = os.path.splitext(path_like)[-1] or ".bin"
     fd, tmp_path = tempfile.mkstemp(prefix="s2x_", suffix=suffix)
     with open(path_like, "rb") as src, os.fdopen(fd, "wb") as dst:
@@ -42,116 +25,372 @@ def _download_local(path_like: str) -> str:
     return tmp_path
 
 
-def download_audio_to_temp(uri: str) -> str:
+class AudioSource(NamedTuple):
+    path: str
+    owned: bool  # True si es un temporal creado para el trabajo y hay que borrarlo
+    bytes_copied: int
+
+
+def resolve_audio(uri: str) -> AudioSource:
+    """
+    Devuelve una ruta legible por el decoder. Los archivos locales regulares se
+    usan tal cual (sin copia); las URLs pasan por el caché de descargas y solo
+    se crea un temporal para fuentes locales no seekables (pipes, dispositivos).
+    """
     if uri.startswith("http://") or uri.startswith("https://"):
-        return _download_http(uri)
-    return _download_local(uri)
+        download = downloads.fetch(uri)
+        source = AudioSource(download.path, download.owned, download.bytes_downloaded)
+    elif not os.path.exists(uri):
+        raise FileNotFoundError(f"No existe el archivo local: {uri}")
+    elif os.path.isfile(uri):
+        source = AudioSource(uri, False, 0)
+    else:
+        path = _download_local(uri)
+        source = AudioSource(path, True, os.path.getsize(path))
+    metrics.observe("audio_bytes_copied", source.bytes_copied)
+    return source
 
 
-def _format_timestamp_srt(seconds: float) -> str:
-    hrs = int(seconds // 3600)
-    mins = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int(round((seconds - int(seconds)) * 1000))
-    return f"{hrs:02}:{mins:02}:{secs:02},{millis:03}"
+def release_audio(source: Optional[AudioSource]) -> None:
+    if source is None or not source.owned:
+        return
+    try:
+        os.remove(source.path)
+    except OSError:
+        pass
 
 
-def _format_timestamp_vtt(seconds: float) -> str:
-    hrs = int(seconds // 3600)
-    mins = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int(round((seconds - int(seconds)) * 1000))
-    return f"{hrs:02}:{mins:02}:{secs:02}.{millis:03}"
+class LazySource:
+    """Resuelve la fuente del audio solo la primera vez que se pide su ruta."""
+
+    def __init__(self, uri: str):
+        self.uri = uri
+        self.source: Optional[AudioSource] = None
+
+    def path(self) -> str:
+        if self.source is None:
+            self.source = resolve_audio(self.uri)
+        return self.source.path
+
+    def release(self) -> None:
+        release_audio(self.source)
+        self.source = None
+
+
+def content_sha256(audio: Dict, source: LazySource) -> str:
+    """sha256 de los bytes del audio; se calcula una vez y queda en audio_files."""
+    digest = audio.get("content_sha256")
+    if not digest:
+        digest = result_cache.file_sha256(source.path())
+        repo_audio_files.set_content_sha256(audio["id"], digest)
+        audio["content_sha256"] = digest
+    return digest
+
+
+def load_pcm(audio: Dict):
+    """PCM mapeado del audio; la fuente solo se resuelve si no está en caché."""
+    source = LazySource(audio["s3_uri"])
+    try:
+        return pcm_cache.load(audio["id"], source.path)
+    finally:
+        source.release()
 
 
 def build_srt(segments: Iterable[Dict]) -> str:
-    lines: List[str] = []
-    idx = 1
-    for s in segments:
-        start_s = s["start_ms"] / 1000.0
-        end_s = s["end_ms"] / 1000.0
-        lines.append(str(idx))
-        lines.append(f"{_format_timestamp_srt(start_s)} --> {_format_timestamp_srt(end_s)}")
-        lines.append(s["text"].strip())
-        lines.append("")
-        idx += 1
-    return "\n".join(lines).strip() + "\n"
+    return exports.render(("srt",), segments)["srt"] or "\n"
 
 
 def build_vtt(segments: Iterable[Dict]) -> str:
-    lines: List[str] = ["WEBVTT", ""]
-    for s in segments:
-        start_s = s["start_ms"] / 1000.0
-        end_s = s["end_ms"] / 1000.0
-        lines.append(f"{_format_timestamp_vtt(start_s)} --> {_format_timestamp_vtt(end_s)}")
-        lines.append(s["text"].strip())
-        lines.append("")
-    return "\n".join(lines).strip() + "\n"
-
-
-def _load_model() -> WhisperModel:
-    model_name = os.getenv("WHISPER_MODEL", "small")
+    return exports.render(("vtt",), segments)["vtt"]
+
+
+# Parámetros aproximados (millones) por modelo, para estimar memoria residente.
+_MODEL_PARAMS_M = {
+    "tiny": 39, "tiny.en": 39,
+    "base": 74, "base.en": 74,
+    "small": 244, "small.en": 244, "distil-small.en": 166,
+    "medium": 769, "medium.en": 769, "distil-medium.en": 394,
+    "large-v1": 1550, "large-v2": 1550, "large-v3": 1550, "large": 1550,
+    "distil-large-v2": 756, "distil-large-v3": 756,
+    "large-v3-turbo": 809, "turbo": 809,
+}
+
+_BYTES_PER_PARAM = {
+    "int8": 1, "int8_float32": 1, "int8_float16": 1, "int8_bfloat16": 1,
+    "int16": 2, "float16": 2, "bfloat16": 2, "float32": 4,
+}
+
+ModelKey = Tuple[str, str, int]
+
+
+def _estimate_model_mb(model_name: str, compute_type: str) -> int:
+    params = _MODEL_PARAMS_M.get(model_name, 500)
+    return params * _BYTES_PER_PARAM.get(compute_type, 4)
+
+
+def allowed_models() -> List[str]:
+    raw = os.getenv("WHISPER_ALLOWED_MODELS", "tiny,base,small,medium")
+    return [m.strip() for m in raw.split(",") if m.strip()]
+
+
+class ModelCache:
+    """
+    Registro LRU de WhisperModel compartido por todos los trabajos del proceso,
+    indexado por (model_name, compute_type, cpu_threads) y acotado por memoria.
+    """
+
+    def __init__(self, budget_mb: int):
+        self.budget_mb = budget_mb
+        self._models: "OrderedDict[ModelKey, Tuple[WhisperModel, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[ModelKey, threading.Lock] = {}
+
+    def get(self, key: ModelKey) -> WhisperModel:
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                return entry[0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Se carga fuera del lock global para no bloquear a quienes ya tienen su modelo.
+        with key_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    return entry[0]
+            model_name, compute_type, cpu_threads = key
+            kwargs = {"device": "cpu", "compute_type": compute_type}
+            if cpu_threads:
+                kwargs["cpu_threads"] = cpu_threads
+            model = WhisperModel(model_name, **kwargs)
+            with self._lock:
+                self._models[key] = (model, _estimate_model_mb(model_name, compute_type))
+                self._loading.pop(key, None)
+                self._evict()
+            return model
+
+    def _evict(self) -> None:
+        # Siempre se conserva el modelo más reciente aunque exceda el presupuesto.
+        while len(self._models) > 1 and self.used_mb() > self.budget_mb:
+            self._models.popitem(last=False)
+
+    def used_mb(self) -> int:
+        return sum(size for _, size in self._models.values())
+
+    def keys(self) -> List[ModelKey]:
+        with self._lock:
+            return list(self._models.keys())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+model_cache = ModelCache(budget_mb=int(os.getenv("WHISPER_MODEL_CACHE_MB", "2048")))
+
+
+def _model_key(model_name: Optional[str] = None) -> ModelKey:
+    name = model_name or os.getenv("WHISPER_MODEL", "small")
     compute_type = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
-    return WhisperModel(model_name, device="cpu", compute_type=compute_type)
+    cpu_threads = int(os.getenv("WHISPER_CPU_THREADS", "0"))
+    return name, compute_type, cpu_threads
+
+
+def _load_model(model_name: Optional[str] = None) -> WhisperModel:
+    return model_cache.get(_model_key(model_name))
+
+
+def _segment_dict(seg, offset_ms: int = 0) -> Dict:
+    return {
+        "start_ms": offset_ms + int(seg.start * 1000),
+        "end_ms": offset_ms + int(seg.end * 1000),
+        "text": (seg.text or "").strip(),
+        "confidence": None,
+        "speaker_label": None,
+    }
+
+
+class SegmentWriter:
+    """
+    Persiste los segmentos en lotes pequeños a medida que Whisper los entrega,
+    actualizando el progreso de la transcripción en cada lote.
+    """
+
+    def __init__(self, transcription_id: str, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None):
+        self.transcription_id = transcription_id
+        self.batch_size = batch_size or int(os.getenv("S2X_SEGMENT_FLUSH_SIZE", "25"))
+        self.flush_interval = flush_interval if flush_interval is not None else float(
+            os.getenv("S2X_SEGMENT_FLUSH_SEC", "2.0")
+        )
+        self.count = 0
+        self.progress: Optional[float] = None
+        self._pending: List[Dict] = []
+        self._last_flush = time.monotonic()
+
+    def add(self, segment: Dict, progress: Optional[float] = None) -> None:
+        self._pending.append(segment)
+        if progress is not None:
+            self.progress = progress
+        if (len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self.count += repo_segments.bulk_insert_segments(self.transcription_id, self._pending)
+            self._pending = []
+        if self.progress is not None:
+            repo_transcriptions.update_progress(self.transcription_id, self.progress)
+        self._last_flush = time.monotonic()
 
 
 def _run_whisper(
-    audio_path: str,
+    pcm_path: str,
     language_hint: Optional[str],
     temperature: Optional[float],
     beam_size: Optional[int],
-) -> Tuple[List[Dict], str, Optional[float], str]:
-    model = _load_model()
+    on_segment: Callable[[Dict, Optional[float]], None],
+    model_name: Optional[str] = None,
+) -> Tuple[str, Optional[float], str]:
+    model = _load_model(model_name)
     temp_value = 0.0 if temperature is None else float(temperature)
     beam_value = 5 if beam_size is None else int(beam_size)
     segments_iter, info = model.transcribe(
-        audio_path,
+        pcm_cache.open_pcm(pcm_path),
         language=language_hint,
         temperature=temp_value,
         beam_size=beam_value,
     )
-    segments: List[Dict] = []
+    duration = getattr(info, "duration", None)
     text_full_parts: List[str] = []
+    # faster-whisper decodifica de forma perezosa: cada segmento se entrega
+    # apenas está listo y no se guarda la lista completa en memoria.
     for seg in segments_iter:
-        text = seg.text or ""
-        text_full_parts.append(text.strip())
-        segments.append(
-            {
-                "start_ms": int(seg.start * 1000),
-                "end_ms": int(seg.end * 1000),
-                "text": text.strip(),
-                "confidence": None,
-                "speaker_label": None,
-            }
-        )
-    text_full = " ".join([t for t in text_full_parts if t])
+        segment = _segment_dict(seg)
+        if segment["text"]:
+            text_full_parts.append(segment["text"])
+        progress = min(1.0, seg.end / duration) if duration else None
+        on_segment(segment, progress)
+    text_full = " ".join(text_full_parts)
     detected_language = getattr(info, "language", None) or (language_hint or "")
     language_probability = getattr(info, "language_probability", None)
-    return segments, detected_language, language_probability, text_full
+    return detected_language, language_probability, text_full
+
+
+def _run_whisper_chunked(
+    pcm_path: str,
+    language_hint: Optional[str],
+    temperature: Optional[float],
+    beam_size: Optional[int],
+    on_segment: Callable[[Dict, Optional[float]], None],
+    model_name: Optional[str] = None,
+) -> Tuple[str, Optional[float], str]:
+    """
+    Modo para audios largos: corta en silencios (VAD), transcribe los trozos en
+    paralelo en un pool de procesos y une los segmentos con sus offsets. Los
+    procesos hijos mapean el mismo .npy en lugar de recibir copias del audio.
+    """
+    name, compute_type, _ = _model_key(model_name)
+    audio = pcm_cache.open_pcm(pcm_path)
+    total = len(audio)
+    target = int(long_audio.chunk_sec() * long_audio.SAMPLE_RATE)
+    spans = long_audio.plan_chunks(long_audio.find_speech(audio), total, target)
+
+    # Todos los trozos se decodifican con el mismo idioma
+    language, language_probability = language_hint, None
+    if not language:
+        language, language_probability = long_audio.detect_language(audio, name, compute_type)
+
+    options = {
+        "language": language,
+        "temperature": 0.0 if temperature is None else float(temperature),
+        "beam_size": 5 if beam_size is None else int(beam_size),
+    }
+    text_full_parts: List[str] = []
+    # Los trozos no se solapan: cada palabra se transcribe una sola vez y no
+    # hay nada que deduplicar en los cortes
+    for (_, end), segments in zip(spans, long_audio.transcribe_chunks(pcm_path, spans, name, compute_type, options)):
+        for i, segment in enumerate(segments):
+            text_full_parts.append(segment["text"])
+            # El progreso avanza por trozo completado, en orden
+            on_segment(segment, end / total if i == len(segments) - 1 else None)
+    return language or "", language_probability, " ".join(text_full_parts)
+
+
+def store_artifacts(transcription_id: str, language: Optional[str]) -> Dict[str, str]:
+    """
+    Escribe SRT, VTT y JSON en el almacén de artefactos y los registra. Los
+    tres formatos salen de una sola lectura de los segmentos y se escriben
+    lote a lote, sin armar los documentos en memoria.
+    """
+    def _parts():
+        yield {"json": '{"transcription_id":"%s","language":%s,"segments":'
+                       % (transcription_id, dumps(language or "").decode())}
+        empty = True
+        for chunk in exports.iter_render(("srt", "vtt", "json"), repo_segments.iter_segments(transcription_id)):
+            empty = empty and not chunk["srt"]
+            yield chunk
+        yield {"json": "}\n", "srt": "\n" if empty else ""}
+
+    uris = artifact_store.get_store().put_many(transcription_id, _parts())
+    for kind, uri in uris.items():
+        repo_artifacts.upsert_artifact(transcription_id, kind, uri)
+    return uris
+
+
+def finish_transcription(transcription_id: str, language: Optional[str], language_probability: Optional[float],
+                         text_full: str, num_segments: int) -> None:
+    """Genera los artefactos desde los segmentos guardados y marca 'succeeded'."""
+    store_artifacts(transcription_id, language)
+    repo_transcriptions.mark_succeeded(
+        transcription_id,
+        language_detected=language or "",
+        confidence=float(language_probability) if language_probability is not None else None,
+        text_full=text_full,
+        artifacts={"num_segments": num_segments},
+    )
+
+
+def reuse_cached_result(key: str, transcription_id: str) -> bool:
+    """Termina la transcripción con el resultado cacheado, si lo hay."""
+    src = result_cache.try_reuse(key, transcription_id)
+    if src is None:
+        return False
+    # Artefactos propios: los del origen llevan su transcription_id y se borran con él
+    store_artifacts(transcription_id, src["language_detected"])
+    repo_transcriptions.mark_succeeded(
+        transcription_id,
+        language_detected=src["language_detected"],
+        confidence=src["confidence"],
+        text_full=src["text_full"],
+        artifacts=src["artifacts"],
+    )
+    return True
 
 
 def process_transcription(transcription_id: str) -> None:
     moved = repo_transcriptions.mark_running(transcription_id)
     if not moved:
         return
+    execute_transcription(transcription_id)
+
 
+def execute_transcription(transcription_id: str, attempt: int = 1) -> None:
+    """Ejecuta una transcripción que ya está en estado 'running'."""
     if os.getenv("S2X_DISABLE_WHISPER") == "1":
         try:
-            repo_transcriptions.mark_succeeded(
-                transcription_id,
-                language_detected="",
-                confidence=None,
-                text_full="",
-                artifacts={"srt": "", "vtt": "", "num_segments": 0},
-            )
+            finish_transcription(transcription_id, "", None, "", 0)
         except Exception:
             repo_transcriptions.mark_failed(transcription_id)
             raise
         return
 
-    audio_path: Optional[str] = None
+    source: Optional[LazySource] = None
     try:
-        t = repo_transcriptions.get_transcription(transcription_id)
+        t = repo_transcriptions.get_transcription(transcription_id, view="meta")
         if not t:
             raise RuntimeError("Transcripción no encontrada")
 
@@ -159,41 +398,38 @@ def process_transcription(transcription_id: str) -> None:
         if not audio:
             raise RuntimeError("Archivo de audio no encontrado")
 
-        uri = audio["s3_uri"]
-        audio_path = download_audio_to_temp(uri)
+        if attempt > 1:
+            # Reintento tras la caída de un worker: descartar segmentos parciales
+            repo_segments.delete_segments_by_transcription(transcription_id)
 
-        segments, lang, lang_prob, text_full = _run_whisper(
-            audio_path=audio_path,
+        # Con el PCM en caché y el hash guardado la fuente no se toca
+        source = LazySource(audio["s3_uri"])
+        name, compute_type, _ = _model_key(t.get("model_name"))
+        key = result_cache.key_for(lambda: content_sha256(audio, source), name, compute_type, t)
+        if key and reuse_cached_result(key, transcription_id):
+            return
+
+        pcm_path = pcm_cache.ensure(t["audio_id"], source.path)
+        duration = audio.get("duration_sec") or pcm_cache.duration_sec(pcm_cache.open_pcm(pcm_path))
+        run = _run_whisper_chunked if long_audio.enabled_for(duration) else _run_whisper
+
+        writer = SegmentWriter(transcription_id)
+        lang, lang_prob, text_full = run(
+            pcm_path=pcm_path,
             language_hint=t.get("language_hint"),
             temperature=t.get("temperature"),
             beam_size=t.get("beam_size"),
+            on_segment=writer.add,
+            model_name=t.get("model_name"),
         )
-
-        if segments:
-            repo_segments.bulk_insert_segments(transcription_id, segments)
-
-        srt = build_srt(segments)
-        vtt = build_vtt(segments)
-        artifacts = {
-            "srt": srt,
-            "vtt": vtt,
-            "num_segments": len(segments),
-        }
-
-        repo_transcriptions.mark_succeeded(
-            transcription_id,
-            language_detected=lang or "",
-            confidence=float(lang_prob) if lang_prob is not None else None,
-            text_full=text_full,
-            artifacts=artifacts,
-        )
+        writer.flush()
+        finish_transcription(transcription_id, lang, lang_prob, text_full, writer.count)
+        if key:
+            result_cache.remember(key, transcription_id)
     except Exception:
         repo_transcriptions.mark_failed(transcription_id)
         raise
     finally:
-        if audio_path and os.path.exists(audio_path):
-            try:
-                os.remove(audio_path)
-            except OSError:
-                pass
+        if source is not None:
+            source.release()
 
@@ -0,0 +1,175 @@
+"""
+Caché en memoria (TTL + LRU) de los shares resueltos por token.
+
+Cada entrada vive como máximo S2X_SHARE_CACHE_TTL segundos y nunca más allá
+de expires_at + grace, así que un share cacheado no se sirve después de que
+resolve_share dejaría de encontrarlo. Solo se cachean los aciertos.
+
+Invalidación:
+  - en el proceso: repo_shares descarta las entradas de los shares que
+    actualiza, borra o limpia;
+  - entre procesos: triggers de db/06_shares_notify.sql hacen pg_notify en
+    el canal CHANNEL con 'share:<id>[,<id>...]' o '*' (TRUNCATE), y
+    pg_listener los entrega a invalidate_payload; los cambios de estado de
+    la transcripción llegan por 'transcription_events'
+    (db/08_transcription_events.sql).
+
+Sin LISTEN activo no hay forma de enterarse de cambios hechos por otros
+procesos, así que la caché solo se usa mientras pg_listener está escuchando.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+from app import metrics, pg_listener
+
+CHANNEL = "shares_changed"
+
+Key = Tuple[str, int]
+
+
+def ttl_sec() -> float:
+    return float(os.getenv("S2X_SHARE_CACHE_TTL", "60"))
+
+
+def max_entries() -> int:
+    return int(os.getenv("S2X_SHARE_CACHE_SIZE", "10000"))
+
+
+def enabled() -> bool:
+    return os.getenv("S2X_SHARE_CACHE", "1") == "1" and pg_listener.is_listening()
+
+
+_lock = threading.Lock()
+# clave (token, grace) -> (vence en time.time(), fila)
+_entries: "OrderedDict[Key, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+# Índices para invalidar por share o por transcripción
+_by_ref: Dict[Hashable, Set[Key]] = {}
+# Sube con cada invalidación; evita guardar una fila leída antes de un cambio
+_generation = 0
+
+
+def _refs(row: Dict[str, Any]) -> Tuple[Hashable, Hashable]:
+    return ("share", str(row["id"])), ("transcription", str(row["transcription_id"]))
+
+
+def _drop(key: Key) -> None:
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return
+    for ref in _refs(entry[1]):
+        keys = _by_ref.get(ref)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _by_ref[ref]
+
+
+def get(token: str, grace_seconds: int) -> Optional[Dict[str, Any]]:
+    key = (token, grace_seconds)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            _entries.move_to_end(key)
+            metrics.incr("share_cache.hits")
+            return dict(entry[1])
+        if entry is not None:
+            _drop(key)
+    metrics.incr("share_cache.misses")
+    return None
+
+
+def generation() -> int:
+    """Tomar antes de consultar la base y pasarlo a put()."""
+    return _generation
+
+
+def put(token: str, grace_seconds: int, row: Dict[str, Any], gen: int) -> None:
+    deadline = time.time() + ttl_sec()
+    if row.get("expires_at") is not None:
+        deadline = min(deadline, row["expires_at"].timestamp() + grace_seconds)
+    key = (token, grace_seconds)
+    with _lock:
+        if gen != _generation:
+            return
+        _drop(key)
+        _entries[key] = (deadline, dict(row))
+        for ref in _refs(row):
+            _by_ref.setdefault(ref, set()).add(key)
+        while len(_entries) > max_entries():
+            _drop(next(iter(_entries)))
+
+
+def invalidate_share(share_id: Any) -> None:
+    _invalidate(("share", str(share_id)))
+
+
+def invalidate_transcription(transcription_id: Any) -> None:
+    _invalidate(("transcription", str(transcription_id)))
+
+
+def _invalidate(ref: Hashable) -> None:
+    global _generation
+    with _lock:
+        _generation += 1
+        for key in list(_by_ref.get(ref, ())):
+            _drop(key)
+
+
+def invalidate_expired(upto: datetime) -> None:
+    """
+    Descarta los shares con expires_at <= 'upto', el mayor expires_at que
+    borró un barrido (ya fuera del margen, porque el corte es now() - margen).
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        for key, (_, row) in list(_entries.items()):
+            if row.get("expires_at") is not None and row["expires_at"] <= upto:
+                _drop(key)
+
+
+def clear() -> None:
+    global _generation
+    with _lock:
+        _generation += 1
+        _entries.clear()
+        _by_ref.clear()
+
+
+def invalidate_payload(payload: str) -> None:
+    """Manejador del canal CHANNEL."""
+    kind, _, ref = payload.partition(":")
+    if kind == "share":
+        for share_id in ref.split(","):
+            invalidate_share(share_id)
+    else:
+        clear()
+
+
+def _on_transcription_event(payload: str) -> None:
+    # El share resuelto incluye el estado; los avisos de solo progreso no cambian nada cacheado
+    event = json.loads(payload)
+    if event["status"] != event.get("previous_status"):
+        invalidate_transcription(event["id"])
+
+def stats() -> Dict[str, Any]:
+    counters = metrics.snapshot()["counters"]
+    with _lock:
+        size = len(_entries)
+    return {
+        "enabled": enabled(),
+        "entries": size,
+        "max_entries": max_entries(),
+        "ttl_sec": ttl_sec(),
+        "hits": counters.get("share_cache.hits", 0),
+        "misses": counters.get("share_cache.misses", 0),
+    }
+
+
+pg_listener.subscribe(CHANNEL, invalidate_payload, on_reconnect=clear)
+pg_listener.subscribe("transcription_events", _on_transcription_event)
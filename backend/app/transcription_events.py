@@ -0,0 +1,104 @@
+"""
+Reparto en el proceso de los eventos de estado de las transcripciones.
+
+El trigger de db/08_transcription_events.sql avisa cada transición y avance
+de progreso en el canal CHANNEL; pg_listener los recibe en su hilo (una sola
+conexión LISTEN por proceso) y aquí se reenvían solo a las colas asyncio de
+los clientes suscritos a esa transcripción. Miles de clientes esperando no
+hacen ninguna consulta. Si el LISTEN se reconecta, o un cliente lento llena
+su cola, el suscriptor recibe RESYNC y relee el estado de la base porque se
+perdieron avisos intermedios.
+"""
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Set
+
+from app import pg_listener
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "transcription_events"
+TERMINAL_STATUSES = {"succeeded", "failed"}
+RESYNC: Dict[str, Any] = {"type": "resync"}
+QUEUE_SIZE = 64
+
+
+class Subscription:
+    def __init__(self, transcription_id: str, loop: asyncio.AbstractEventLoop):
+        self.transcription_id = transcription_id
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(QUEUE_SIZE)
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        # Corre en el event loop del suscriptor
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Próximo evento, o None si no llegó ninguno en 'timeout' segundos."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+_lock = threading.Lock()
+_subscribers: Dict[str, Set[Subscription]] = {}
+
+
+def subscribe(transcription_id: str) -> Subscription:
+    sub = Subscription(str(transcription_id), asyncio.get_running_loop())
+    with _lock:
+        _subscribers.setdefault(sub.transcription_id, set()).add(sub)
+    return sub
+
+
+def unsubscribe(sub: Subscription) -> None:
+    with _lock:
+        subs = _subscribers.get(sub.transcription_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del _subscribers[sub.transcription_id]
+
+
+def subscriber_count(transcription_id: Optional[str] = None) -> int:
+    with _lock:
+        if transcription_id is not None:
+            return len(_subscribers.get(str(transcription_id), ()))
+        return sum(len(s) for s in _subscribers.values())
+
+
+def _deliver(subs, event: Dict[str, Any]) -> None:
+    for sub in subs:
+        try:
+            sub.loop.call_soon_threadsafe(sub._offer, event)
+        except RuntimeError:
+            # El event loop del suscriptor ya cerró
+            unsubscribe(sub)
+
+
+def publish(transcription_id: str, event: Dict[str, Any]) -> None:
+    with _lock:
+        subs = list(_subscribers.get(str(transcription_id), ()))
+    _deliver(subs, event)
+
+
+def _on_notify(payload: str) -> None:
+    event = json.loads(payload)
+    publish(event["id"], event)
+
+
+def _on_reconnect() -> None:
+    with _lock:
+        subs = [s for group in _subscribers.values() for s in group]
+    _deliver(subs, RESYNC)
+
+
+pg_listener.subscribe(CHANNEL, _on_notify, on_reconnect=_on_reconnect)
@@ -0,0 +1,267 @@
+"""
+Worker de transcripciones respaldado por Postgres.
+
+Uso: python -m app.worker [--concurrency N]
+
+Reclama filas 'queued' de transcriptions con FOR UPDATE SKIP LOCKED, las
+procesa en un pool de hilos, mantiene un heartbeat de los trabajos activos y
+devuelve a la cola los trabajos de workers que dejaron de latir. Además
+borra periódicamente, por lotes, los shares expirados y las carpetas de
+artefactos cuya transcripción ya no existe.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from app import repo_shares, repo_transcriptions
+from app.services import artifact_store, batching, result_cache
+from app.services.transcribe import execute_transcription
+
+log = logging.getLogger("s2x.worker")
+
+
+class Worker:
+    def __init__(
+        self,
+        concurrency: int = 1,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 10.0,
+        stale_after: int = 60,
+        max_attempts: int = 3,
+        share_sweep_interval: float = 300.0,
+        share_sweep_batch: int = 1000,
+        artifact_sweep_interval: float = 3600.0,
+    ):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.share_sweep_interval = share_sweep_interval
+        self.share_sweep_batch = share_sweep_batch
+        self.artifact_sweep_interval = artifact_sweep_interval
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="s2x-job")
+        self._active: Dict[str, Optional[Future]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def active_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._active.keys())
+
+    def _busy_slots(self) -> int:
+        # Un lote ocupa un solo hilo aunque agrupe varias transcripciones
+        with self._lock:
+            return len({id(f) if f is not None else tid for tid, f in self._active.items()})
+
+    def _run_job(self, tid: str, attempt: int) -> None:
+        try:
+            execute_transcription(tid, attempt=attempt)
+        except Exception:
+            log.exception("transcription %s failed", tid)
+        finally:
+            with self._lock:
+                self._active.pop(tid, None)
+
+    def _run_batch(self, jobs: List[Dict]) -> None:
+        try:
+            batching.run_batch(jobs)
+        except Exception:
+            log.exception("batch of %s transcriptions failed", len(jobs))
+        finally:
+            with self._lock:
+                for job in jobs:
+                    self._active.pop(str(job["id"]), None)
+
+    def claim_batch(self) -> Optional[Future]:
+        """
+        Reclama audios cortos compatibles y, si el lote no se llenó, espera una
+        ventana corta para sumar los que lleguen antes de decodificarlos juntos.
+        """
+        max_sec = batching.max_clip_sec()
+        if max_sec <= 0:
+            return None
+        size = batching.batch_size()
+        jobs = repo_transcriptions.claim_batch(self.worker_id, size, max_sec)
+        if not jobs:
+            return None
+        with self._lock:
+            # Se registran de inmediato para que el heartbeat los cubra durante la ventana
+            for job in jobs:
+                self._active[str(job["id"])] = None
+        if len(jobs) < size:
+            self._stop.wait(batching.window_sec())
+            more = repo_transcriptions.claim_batch(self.worker_id, size - len(jobs), max_sec, like=str(jobs[0]["id"]))
+            jobs.extend(more)
+        log.info("claimed batch of %s short transcription(s)", len(jobs))
+        with self._lock:
+            fut = self._executor.submit(self._run_batch, jobs)
+            for job in jobs:
+                self._active[str(job["id"])] = fut
+        return fut
+
+    def run_once(self) -> List[Future]:
+        """Reclama tantos trabajos como hilos libres haya y los encola en el pool."""
+        if self.concurrency - self._busy_slots() <= 0:
+            return []
+        futures: List[Future] = []
+        batch = self.claim_batch()
+        if batch is not None:
+            futures.append(batch)
+        free = self.concurrency - self._busy_slots()
+        if free <= 0:
+            return futures
+        for job in repo_transcriptions.claim_queued(self.worker_id, free):
+            tid = str(job["id"])
+            log.info("claimed transcription %s (attempt %s)", tid, job["attempts"])
+            with self._lock:
+                fut = self._executor.submit(self._run_job, tid, job["attempts"])
+                self._active[tid] = fut
+            futures.append(fut)
+        return futures
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                repo_transcriptions.heartbeat(self.worker_id, self.active_ids())
+                # Aciertos y fallos del caché acumulados, aunque no haya más búsquedas
+                result_cache.flush_stats(force=False)
+            except Exception:
+                log.exception("heartbeat failed")
+
+    def reap(self) -> int:
+        rows = repo_transcriptions.requeue_stale(self.stale_after, self.max_attempts)
+        for r in rows:
+            log.warning("reaped stale transcription %s -> %s", r["id"], r["status"])
+        return len(rows)
+
+    def _reaper_loop(self) -> None:
+        while not self._stop.wait(max(1.0, self.stale_after / 2)):
+            try:
+                self.reap()
+            except Exception:
+                log.exception("reaper failed")
+
+    def sweep_shares(self) -> int:
+        # Pausa entre lotes para no competir con la API por el pool de la base
+        n = repo_shares.cleanup_expired(self.share_sweep_batch, pause_sec=0.05)
+        if n:
+            log.info("swept %s expired share(s)", n)
+        return n
+
+    def _share_sweeper_loop(self) -> None:
+        while not self._stop.wait(self.share_sweep_interval):
+            try:
+                self.sweep_shares()
+            except Exception:
+                log.exception("share sweep failed")
+
+    def sweep_artifacts(self, batch_size: int = 1000) -> int:
+        """
+        Borra las carpetas de artefactos cuya transcripción ya no existe: al
+        borrar un audio o un proyecto las filas se van en cascada, los
+        archivos no.
+        """
+        store = artifact_store.get_store()
+        n = 0
+        names = iter(store.transcription_ids())
+        while True:
+            batch = []
+            for name in names:
+                try:
+                    batch.append(str(uuid.UUID(name)))
+                except ValueError:
+                    continue
+                if len(batch) >= batch_size:
+                    break
+            if not batch:
+                break
+            alive = repo_transcriptions.existing_ids(batch)
+            for tid in batch:
+                if tid not in alive:
+                    store.delete_transcription(tid)
+                    n += 1
+        if n:
+            log.info("swept %s orphaned artifact folder(s)", n)
+        return n
+
+    def _artifact_sweeper_loop(self) -> None:
+        while not self._stop.wait(self.artifact_sweep_interval):
+            try:
+                self.sweep_artifacts()
+            except Exception:
+                log.exception("artifact sweep failed")
+
+    def stop(self, *_args) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        log.info("worker %s started (concurrency=%s)", self.worker_id, self.concurrency)
+        threading.Thread(target=self._heartbeat_loop, name="s2x-heartbeat", daemon=True).start()
+        threading.Thread(target=self._reaper_loop, name="s2x-reaper", daemon=True).start()
+        if self.share_sweep_interval > 0:
+            threading.Thread(target=self._share_sweeper_loop, name="s2x-share-sweeper", daemon=True).start()
+        if self.artifact_sweep_interval > 0:
+            threading.Thread(target=self._artifact_sweeper_loop, name="s2x-artifact-sweeper", daemon=True).start()
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                log.exception("claim failed")
+                claimed = []
+            if not claimed:
+                self._stop.wait(self.poll_interval)
+        log.info("worker %s stopping, waiting for %s job(s)", self.worker_id, len(self.active_ids()))
+        # Se sigue latiendo mientras terminan los trabajos en curso
+        while True:
+            with self._lock:
+                pending = {f for f in self._active.values() if f is not None}
+            if not pending:
+                break
+            wait(pending, timeout=self.heartbeat_interval)
+            repo_transcriptions.heartbeat(self.worker_id, self.active_ids())
+        self._executor.shutdown(wait=True)
+        try:
+            result_cache.flush_stats()
+        except Exception:
+            log.exception("result cache stats flush failed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Speech2Text X transcription worker")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("S2X_WORKER_CONCURRENCY", "1")))
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("S2X_WORKER_POLL_SEC", "1.0")))
+    parser.add_argument("--heartbeat-interval", type=float, default=float(os.getenv("S2X_WORKER_HEARTBEAT_SEC", "10")))
+    parser.add_argument("--stale-after", type=int, default=int(os.getenv("S2X_WORKER_STALE_SEC", "60")))
+    parser.add_argument("--max-attempts", type=int, default=int(os.getenv("S2X_JOB_MAX_ATTEMPTS", "3")))
+    parser.add_argument("--share-sweep-interval", type=float, default=float(os.getenv("S2X_SHARE_SWEEP_SEC", "300")))
+    parser.add_argument("--share-sweep-batch", type=int, default=int(os.getenv("S2X_SHARE_SWEEP_BATCH", "1000")))
+    parser.add_argument("--artifact-sweep-interval", type=float,
+                        default=float(os.getenv("S2X_ARTIFACT_SWEEP_SEC", "3600")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    worker = Worker(
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        heartbeat_interval=args.heartbeat_interval,
+        stale_after=args.stale_after,
+        max_attempts=args.max_attempts,
+        share_sweep_interval=args.share_sweep_interval,
+        share_sweep_batch=args.share_sweep_batch,
+        artifact_sweep_interval=args.artifact_sweep_interval,
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Carga concurrente contra una ruta síncrona (def + ConnectionPool, corre en el
+threadpool de Starlette, 40 hilos por defecto) y una asíncrona (async def +
+AsyncConnectionPool, corre en el event loop). Cada petición hace una consulta
+que espera en la base (pg_sleep), como una consulta lenta o una base lejana.
+Ambos pools se crean del mismo tamaño para que el límite no sea la base.
+
+Uso (desde backend/, con DB_URL apuntando a una base accesible):
+    python -m benchmarks.bench_async_load [requests] [concurrency] [sleep_ms]
+"""
+import multiprocessing
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import requests
+import uvicorn
+from fastapi import FastAPI
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from app.db_pool import DB_URL
+
+
+def _sync_app(pool_size: int) -> FastAPI:
+    pool = ConnectionPool(conninfo=DB_URL, min_size=pool_size, max_size=pool_size, open=False)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        pool.open(wait=True)
+        yield
+        pool.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/q")
+    def q(sleep_ms: int):
+        with pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_sleep(%s)", (sleep_ms / 1000.0,))
+            cur.fetchone()
+        return {"ok": True}
+
+    return app
+
+
+def _async_app(pool_size: int) -> FastAPI:
+    state = {}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        pool = AsyncConnectionPool(conninfo=DB_URL, min_size=pool_size, max_size=pool_size, open=False)
+        await pool.open(wait=True)
+        state["pool"] = pool
+        yield
+        await pool.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/q")
+    async def q(sleep_ms: int):
+        async with state["pool"].connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT pg_sleep(%s)", (sleep_ms / 1000.0,))
+            await cur.fetchone()
+        return {"ok": True}
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run_server(mode: str, port: int, pool_size: int) -> None:
+    app = (_sync_app if mode == "sync" else _async_app)(pool_size)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _serve(mode: str, pool_size: int):
+    # El servidor va en otro proceso para que el cliente no compita por el GIL
+    port = _free_port()
+    proc = multiprocessing.Process(target=_run_server, args=(mode, port, pool_size), daemon=True)
+    proc.start()
+    url = f"http://127.0.0.1:{port}/q"
+    deadline = time.time() + 30
+    while True:
+        try:
+            requests.get(url, params={"sleep_ms": 0}, timeout=1).raise_for_status()
+            return proc, url
+        except requests.RequestException:
+            if time.time() > deadline:
+                proc.terminate()
+                raise
+            time.sleep(0.1)
+
+
+def _load(url: str, total: int, concurrency: int, sleep_ms: int):
+    local = threading.local()
+
+    def one(_):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        t0 = time.perf_counter()
+        local.session.get(url, params={"sleep_ms": sleep_ms}, timeout=120).raise_for_status()
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(concurrency)))  # calentamiento: abre las conexiones HTTP
+        t0 = time.perf_counter()
+        latencies = sorted(ex.map(one, range(total)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, latencies
+
+
+def main(total: int, concurrency: int, sleep_ms: int):
+    print(f"{total} requests, {concurrency} concurrent, pg_sleep {sleep_ms} ms, pools of {concurrency}")
+    print(f"{'mode':>6} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'max (ms)':>9}")
+    for name in ("sync", "async"):
+        proc, url = _serve(name, concurrency)
+        try:
+            elapsed, lat = _load(url, total, concurrency, sleep_ms)
+        finally:
+            proc.terminate()
+            proc.join()
+        p95 = lat[int(len(lat) * 0.95) - 1]
+        print(f"{name:>6} {total / elapsed:>8.1f} {statistics.median(lat) * 1000:>9.1f} "
+              f"{p95 * 1000:>9.1f} {lat[-1] * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [800, 80, 200][len(args):]))
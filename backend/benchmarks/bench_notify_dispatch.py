@@ -0,0 +1,90 @@
+"""
+Rendimiento del despachador de notificaciones según la cantidad de
+despachadores (procesos) que compiten por la misma cola, con un canal
+simulado que tarda S2X_BENCH_SEND_MS por envío. Verifica además que cada
+notificación se envíe exactamente una vez.
+
+Uso (desde backend/, con DB_URL apuntando a una base con el esquema):
+    python -m benchmarks.bench_notify_dispatch [N] [1 2 4]
+"""
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import Counter
+
+from app import repo_audio_files, repo_projects, repo_transcriptions, repo_users
+from app.db_pool import get_conn
+
+SEND_MS = float(os.getenv("S2X_BENCH_SEND_MS", "20"))
+
+
+class _SlowChannel:
+    def __init__(self, sent):
+        self.sent = sent
+
+    def send(self, n):
+        time.sleep(SEND_MS / 1000)
+        self.sent.append(str(n["id"]))
+
+
+def _drain(queue, ready, go):
+    from app.notifier import Dispatcher
+
+    sent = []
+    dispatcher = Dispatcher(concurrency=8, batch_size=40, channels=lambda _t: _SlowChannel(sent))
+    # Se mide solo el despacho, no el arranque del proceso
+    ready.release()
+    go.wait()
+    while dispatcher.run_once():
+        pass
+    queue.put(sent)
+
+
+def _enqueue(tid, n):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM notifications WHERE transcription_id = %s", (tid,))
+        cur.execute(
+            "INSERT INTO notifications (transcription_id, type, target) "
+            "SELECT %s, 'email', 'user' || g || '@example.com' FROM generate_series(1, %s) g",
+            (tid, n),
+        )
+        conn.commit()
+
+
+def main(n, counts):
+    user = repo_users.create_user(f"bench-{time.time_ns()}@example.com", None, "x", "user")
+    project = repo_projects.create_project(user["id"], "bench")
+    audio = repo_audio_files.create_audio(project["id"], "/dev/null")
+    tid = repo_transcriptions.create_transcription(audio["id"])["id"]
+    ctx = mp.get_context("spawn")
+    try:
+        print(f"{'dispatchers':>11} {'sent':>6} {'seconds':>8} {'msgs/s':>8} {'duplicates':>10}")
+        for k in counts:
+            _enqueue(tid, n)
+            queue, ready, go = ctx.Queue(), ctx.Semaphore(0), ctx.Event()
+            procs = [ctx.Process(target=_drain, args=(queue, ready, go)) for _ in range(k)]
+            for p in procs:
+                p.start()
+            for _ in procs:
+                ready.acquire()
+            t0 = time.perf_counter()
+            go.set()
+            sent = Counter(i for _ in procs for i in queue.get())
+            elapsed = time.perf_counter() - t0
+            for p in procs:
+                p.join()
+            dupes = sum(c - 1 for c in sent.values())
+            print(f"{k:>11} {len(sent):>6} {elapsed:>8.2f} {len(sent) / elapsed:>8.0f} {dupes:>10}")
+    finally:
+        repo_transcriptions.hard_delete(tid)
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM audio_files WHERE project_id = %(id)s", {"id": project["id"]})
+            cur.execute("DELETE FROM projects WHERE id = %(id)s", {"id": project["id"]})
+            cur.execute("DELETE FROM users WHERE id = %(id)s", {"id": user["id"]})
+            conn.commit()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0] if args else 2000, args[1:] or [1, 2, 4])
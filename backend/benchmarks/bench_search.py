@@ -0,0 +1,96 @@
+"""
+Costo de GET /search?mode=phrase para un término frecuente (en uno de cada
+'every' segmentos, por defecto todos): la página de transcripciones sin acotar las candidatas (se
+rankean todas las coincidencias en cada página) contra los límites de
+S2X_SEARCH_MAX_CANDIDATES y S2X_SEARCH_MAX_SEGMENTS_PER_CANDIDATE. Mide con
+EXPLAIN ANALYZE la primera página y una página profunda (cursor tras
+'depth' páginas) y cuenta transcripciones repetidas entre páginas.
+
+Uso (desde backend/, con DB_URL apuntando a una base con el esquema y los índices):
+    python -m benchmarks.bench_search [transcripciones] [segmentos_por_transcripcion] [uno_de_cada]
+"""
+import json
+import sys
+import time
+
+from app import repo_audio_files, repo_projects, repo_search, repo_users
+from app.db_pool import get_conn
+
+QUERY = "reunión"
+LIMIT = 20
+UNBOUNDED = 2 ** 31 - 1
+
+
+def _explain(cur, sql, params):
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0]
+    plan = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+    return plan["Execution Time"]
+
+
+def _page(cur, limits, after):
+    sql, params = repo_search._page_query(QUERY, "phrase", None, LIMIT + 1, after)
+    params["candidates"], params["per_candidate"] = limits
+    ms = _explain(cur, sql, params)
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    after = (rows[LIMIT - 1][1], rows[LIMIT - 1][0]) if len(rows) > LIMIT else None
+    return ms, [r[0] for r in rows[:LIMIT]], after
+
+
+def _walk(cur, limits, depth):
+    """
+    Tiempo de la primera página y de la página 'depth' (o la última
+    alcanzada), y si alguna transcripción se repitió entre páginas.
+    """
+    first, seen, after = _page(cur, limits, None)
+    deep, pages = first, 1
+    while after is not None and pages < depth:
+        deep, ids, after = _page(cur, limits, after)
+        seen += ids
+        pages += 1
+    return first, deep, pages, len(seen) - len(set(seen))
+
+
+def main(transcriptions, per_transcription, every=1, depth=20):
+    user = repo_users.create_user(f"bench-{time.time_ns()}@example.com", None, "x", "user")
+    project = repo_projects.create_project(user["id"], "bench")
+    audio = repo_audio_files.create_audio(project["id"], "/dev/null")
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(
+                "WITH t AS (INSERT INTO transcriptions (audio_id, status) "
+                "SELECT %(aid)s, 'succeeded' FROM generate_series(1, %(n)s) RETURNING id) "
+                "INSERT INTO segments (transcription_id, start_ms, end_ms, text) "
+                "SELECT t.id, g * 1000, g * 1000 + 900, 'acta ' || g || "
+                "CASE WHEN g %% %(every)s = 0 THEN ' de la reunión' ELSE '' END || ' sobre el presupuesto' "
+                "FROM t, generate_series(1, %(per)s) g",
+                {"aid": audio["id"], "n": transcriptions, "per": per_transcription, "every": every},
+            )
+            conn.commit()
+            cur.execute("ANALYZE segments")
+            # Calentar caché antes de medir
+            _page(cur, (UNBOUNDED, UNBOUNDED), None)
+
+            total = transcriptions * per_transcription
+            print(f"{total // every} of {total} segments match in {transcriptions} transcriptions, "
+                  f"page size {LIMIT}, S2X_SEARCH_MAX_CANDIDATES={repo_search.max_candidates()}, "
+                  f"S2X_SEARCH_MAX_SEGMENTS_PER_CANDIDATE={repo_search.max_segments_per_candidate()}")
+            print(f"{'candidates':>12} {'page 1 (ms)':>12} {'page N (ms)':>12} {'N':>4} {'repeated':>9}")
+            bounded = (repo_search.max_candidates(), repo_search.max_segments_per_candidate())
+            for label, limits in (("unbounded", (UNBOUNDED, UNBOUNDED)), ("bounded", bounded)):
+                first, deep, pages, repeated = _walk(cur, limits, depth)
+                print(f"{label:>12} {first:>12.1f} {deep:>12.1f} {pages:>4} {repeated:>9}")
+            conn.rollback()
+    finally:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM transcriptions WHERE audio_id = %(id)s", {"id": audio["id"]})
+            cur.execute("DELETE FROM audio_files WHERE id = %(id)s", {"id": audio["id"]})
+            cur.execute("DELETE FROM projects WHERE id = %(id)s", {"id": project["id"]})
+            cur.execute("DELETE FROM users WHERE id = %(id)s", {"id": user["id"]})
+            conn.commit()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args or [2000, 100]))
@@ -0,0 +1,65 @@
+"""
+Compara la inserción de segmentos fila por fila (INSERT por segmento, la
+implementación anterior) con el COPY binario de repo_segments.
+
+Uso (desde backend/, con DB_URL apuntando a una base con el esquema):
+    python -m benchmarks.bench_segment_insert [1000 10000 100000]
+"""
+import sys
+import time
+
+from app import repo_audio_files, repo_projects, repo_segments, repo_transcriptions, repo_users
+from app.db_pool import get_conn
+
+
+def _loop_insert(transcription_id, segments):
+    sql = (
+        "INSERT INTO segments (transcription_id, start_ms, end_ms, speaker_label, text, confidence) "
+        "VALUES (%(tid)s, %(start)s, %(end)s, %(spk)s, %(txt)s, %(conf)s)"
+    )
+    count = 0
+    with get_conn() as conn, conn.cursor() as cur:
+        for s in segments:
+            cur.execute(sql, {
+                "tid": transcription_id,
+                "start": s["start_ms"], "end": s["end_ms"], "spk": s.get("speaker_label"),
+                "txt": s["text"], "conf": s.get("confidence"),
+            })
+            count += 1
+        conn.commit()
+    return count
+
+
+def _segments(n):
+    return (
+        {"start_ms": i * 1000, "end_ms": i * 1000 + 900, "text": f"segmento número {i} de la prueba",
+         "confidence": 0.9}
+        for i in range(n)
+    )
+
+
+def main(sizes):
+    user = repo_users.create_user(f"bench-{time.time_ns()}@example.com", None, "x", "user")
+    project = repo_projects.create_project(user["id"], "bench")
+    audio = repo_audio_files.create_audio(project["id"], "/dev/null")
+    try:
+        print(f"{'rows':>8} {'loop (s)':>10} {'copy (s)':>10} {'speedup':>8}")
+        for n in sizes:
+            timings = []
+            for insert in (_loop_insert, repo_segments.bulk_insert_segments):
+                tid = repo_transcriptions.create_transcription(audio["id"])["id"]
+                t0 = time.perf_counter()
+                assert insert(tid, _segments(n)) == n
+                timings.append(time.perf_counter() - t0)
+                repo_transcriptions.hard_delete(tid)
+            print(f"{n:>8} {timings[0]:>10.3f} {timings[1]:>10.3f} {timings[0] / timings[1]:>7.1f}x")
+    finally:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM audio_files WHERE project_id = %(id)s", {"id": project["id"]})
+            cur.execute("DELETE FROM projects WHERE id = %(id)s", {"id": project["id"]})
+            cur.execute("DELETE FROM users WHERE id = %(id)s", {"id": user["id"]})
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,76 @@
+"""
+Compara la lectura y serialización de una lista grande de segmentos (como
+GET /segments/{tid}): la ruta anterior (tuplas + zip con cur.description +
+jsonable_encoder + JSONResponse) contra dict_row + orjson (FastJSONResponse).
+
+Uso (desde backend/, con DB_URL apuntando a una base con el esquema):
+    python -m benchmarks.bench_segment_list [1000 5000 20000]
+"""
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import repo_audio_files, repo_projects, repo_segments, repo_transcriptions, repo_users
+from app.db_pool import get_conn
+from app.responses import FastJSONResponse
+
+_SQL = (
+    "SELECT id, start_ms, end_ms, speaker_label, text, confidence FROM segments "
+    "WHERE transcription_id = %(tid)s ORDER BY start_ms ASC, id ASC LIMIT %(limit)s;"
+)
+ROUNDS = 5
+
+
+def _before(tid, n):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(_SQL, {"tid": tid, "limit": n})
+        cols = [d[0] for d in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+    return JSONResponse(jsonable_encoder(rows)).body
+
+
+def _after(tid, n):
+    return FastJSONResponse(repo_segments.list_segments(tid, n)).body
+
+
+def _segments(n):
+    return (
+        {"start_ms": i * 1000, "end_ms": i * 1000 + 900, "text": f"segmento número {i} de la prueba",
+         "confidence": 0.9, "speaker_label": "SPEAKER_00"}
+        for i in range(n)
+    )
+
+
+def _best(fn, *args):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(sizes):
+    user = repo_users.create_user(f"bench-{time.time_ns()}@example.com", None, "x", "user")
+    project = repo_projects.create_project(user["id"], "bench")
+    audio = repo_audio_files.create_audio(project["id"], "/dev/null")
+    tid = repo_transcriptions.create_transcription(audio["id"])["id"]
+    try:
+        repo_segments.bulk_insert_segments(tid, _segments(max(sizes)))
+        print(f"{'rows':>8} {'before (ms)':>12} {'after (ms)':>11} {'speedup':>8}")
+        for n in sizes:
+            before, after = _best(_before, tid, n), _best(_after, tid, n)
+            print(f"{n:>8} {before * 1000:>12.1f} {after * 1000:>11.1f} {before / after:>7.1f}x")
+    finally:
+        repo_transcriptions.hard_delete(tid)
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM audio_files WHERE project_id = %(id)s", {"id": project["id"]})
+            cur.execute("DELETE FROM projects WHERE id = %(id)s", {"id": project["id"]})
+            cur.execute("DELETE FROM users WHERE id = %(id)s", {"id": user["id"]})
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 5000, 20000])
@@ -0,0 +1,73 @@
+"""
+Compara la generación de subtítulos para transcripciones largas: la ruta
+anterior (división/módulo en float por segmento y un recorrido por formato)
+contra services.exports.render (campos de tiempo con aritmética entera de
+NumPy por lotes y SRT + VTT + TSV + JSON en una sola pasada).
+
+Uso (desde backend/, no necesita base de datos):
+    python -m benchmarks.bench_subtitle_render [10000 100000]
+"""
+import sys
+import time
+
+from app.responses import dumps
+from app.services import exports
+
+ROUNDS = 5
+FORMATS = ("srt", "vtt", "tsv", "json")
+
+
+def _ts_before(seconds, sep):
+    hrs = int(seconds // 3600)
+    mins = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    millis = int(round((seconds - int(seconds)) * 1000))
+    return f"{hrs:02}:{mins:02}:{secs:02}{sep}{millis:03}"
+
+
+def _before(segments):
+    srt, vtt, tsv = [], ["WEBVTT\n"], ["start\tend\ttext\n"]
+    for i, s in enumerate(segments, 1):
+        start_s, end_s, text = s["start_ms"] / 1000.0, s["end_ms"] / 1000.0, s["text"].strip()
+        srt.append(f"{i}\n{_ts_before(start_s, ',')} --> {_ts_before(end_s, ',')}\n{text}\n")
+    for s in segments:
+        start_s, end_s, text = s["start_ms"] / 1000.0, s["end_ms"] / 1000.0, s["text"].strip()
+        vtt.append(f"\n{_ts_before(start_s, '.')} --> {_ts_before(end_s, '.')}\n{text}\n")
+    for s in segments:
+        tsv.append(f"{s['start_ms']}\t{s['end_ms']}\t{' '.join(s['text'].split())}\n")
+    body = ",".join(dumps(s).decode("utf-8") for s in segments)
+    return {"srt": "\n".join(srt), "vtt": "".join(vtt), "tsv": "".join(tsv), "json": f"[{body}]"}
+
+
+def _after(segments):
+    return exports.render(FORMATS, segments)
+
+
+def _segments(n):
+    return [
+        {"id": i, "start_ms": i * 2500, "end_ms": i * 2500 + 2100, "speaker_label": "SPEAKER_00",
+         "text": f" segmento número {i} de la prueba ", "confidence": 0.9}
+        for i in range(n)
+    ]
+
+
+def _best(fn, *args):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(sizes):
+    print(f"{'segments':>9} {'before (ms)':>12} {'after (ms)':>11} {'speedup':>8}")
+    for n in sizes:
+        segments = _segments(n)
+        assert _before(segments) == _after(segments)
+        before, after = _best(_before, segments), _best(_after, segments)
+        print(f"{n:>9} {before * 1000:>12.1f} {after * 1000:>11.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10000, 100000])
@@ -61,3 +61,31 @@ def test_delete_audio_cascade_transcriptions(client):
     assert str(deleted) == aid
     r = client.get(f"/transcriptions/{tid}")
     assert r.status_code == 404
+
+def test_audio_waveform_is_decoded_once(client, tmp_path):
+    import wave
+    from unittest.mock import patch
+    from app.services import pcm_cache
+
+    src = tmp_path / "tone.wav"
+    with wave.open(str(src), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes((b"\x00\x40" + b"\x00\xc0") * 16000)
+    proj = _project(client)
+    aid = client.post("/audio", json={"project_id": proj["id"], "s3_uri": str(src)}).json()["id"]
+
+    r = client.get(f"/audio/{aid}/waveform?points=4")
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["duration_sec"] == 2.0 and len(body["peaks"]) == 4
+    assert body["peaks"][0] == [-0.5, 0.5]
+
+    with patch.object(pcm_cache, "_decode", side_effect=AssertionError("decoded twice")):
+        assert client.get(f"/audio/{aid}/waveform?points=2").status_code == 200
+
+def test_audio_waveform_missing_source(client):
+    proj = _project(client)
+    aid = client.post("/audio", json={"project_id": proj["id"], "s3_uri": "/audios/nope.wav"}).json()["id"]
+    assert client.get(f"/audio/{aid}/waveform").status_code == 404
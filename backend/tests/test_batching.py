@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+from app import repo_transcriptions, repo_audio_files, repo_projects, repo_users, repo_segments
+from app.services import batching
+
+
+def _audio(duration_sec):
+    u = repo_users.create_user(f"batch{duration_sec}@example.com", None, "x", "user")
+    p = repo_projects.create_project(u["id"], "B")
+    return repo_audio_files.create_audio(p["id"], "/audios/audio.mp3", duration_sec=duration_sec)
+
+
+def test_claim_batch_groups_compatible_short_jobs():
+    short, long_ = _audio(20), _audio(3600)
+    a = repo_transcriptions.create_transcription(short["id"], beam_size=1)
+    b = repo_transcriptions.create_transcription(short["id"], beam_size=1)
+    other = repo_transcriptions.create_transcription(short["id"], beam_size=5)
+    repo_transcriptions.create_transcription(long_["id"], beam_size=1)
+
+    jobs = repo_transcriptions.claim_batch("w1", 8, 60)
+    assert {str(j["id"]) for j in jobs} == {str(a["id"]), str(b["id"])}
+
+    late = repo_transcriptions.create_transcription(short["id"], beam_size=1)
+    more = repo_transcriptions.claim_batch("w1", 8, 60, like=str(a["id"]))
+    assert [str(j["id"]) for j in more] == [str(late["id"])]
+
+    rest = repo_transcriptions.claim_batch("w2", 8, 60)
+    assert [str(j["id"]) for j in rest] == [str(other["id"])]
+    assert repo_transcriptions.claim_batch("w2", 8, 60) == []
+
+
+def test_clip_timestamps_and_assignment():
+    sr = batching.SAMPLE_RATE
+    clips = batching.clip_timestamps([0, 40 * sr], [40 * sr, 10 * sr])
+    assert clips == [{"start": 0.0, "end": 30.0}, {"start": 30.0, "end": 40.0}, {"start": 40.0, "end": 50.0}]
+
+    segs = [SimpleNamespace(start=1.0, end=2.0, text=" a"), SimpleNamespace(start=35.0, end=39.5, text="b"),
+            SimpleNamespace(start=41.25, end=42.0, text="c"), SimpleNamespace(start=43.0, end=44.0, text=" ")]
+    per_job = batching.assign_segments(segs, [0, 40 * sr])
+    assert [(s["start_ms"], s["end_ms"], s["text"]) for s in per_job[0]] == [(1000, 2000, "a"), (35000, 39500, "b")]
+    assert [(s["start_ms"], s["end_ms"], s["text"]) for s in per_job[1]] == [(1250, 2000, "c")]
+
+
+def test_run_batch_writes_each_job(monkeypatch):
+    audio = _audio(5)
+    jobs = [repo_transcriptions.create_transcription(audio["id"], language_hint="es") for _ in range(3)]
+    claimed = repo_transcriptions.claim_batch("w1", 8, 60)
+    assert len(claimed) == 3
+
+    sr = batching.SAMPLE_RATE
+    calls = []
+
+    class _FakePipeline:
+        def __init__(self, model):
+            pass
+
+        def transcribe(self, audio_arr, language=None, clip_timestamps=None, **kwargs):
+            calls.append((len(audio_arr), language, clip_timestamps))
+            segs = [SimpleNamespace(start=c["start"] + 0.5, end=c["end"], text=f"clip{i}")
+                    for i, c in enumerate(clip_timestamps)]
+            return iter(segs), None
+
+    with patch.object(batching, "_load_audio", return_value=(np.zeros(2 * sr, dtype=np.float32), None)), \
+            patch.object(batching.transcribe, "_load_model", return_value=object()), \
+            patch.object(batching, "BatchedInferencePipeline", _FakePipeline):
+        batching.run_batch(claimed)
+
+    assert len(calls) == 1 and calls[0][0] == 6 * sr and calls[0][1] == "es"
+    by_id = {str(j["id"]): j for j in claimed}
+    for i, t in enumerate(j["id"] for j in claimed):
+        row = repo_transcriptions.get_transcription(t)
+        assert row["status"] == "succeeded" and row["language_detected"] == "es"
+        segs = repo_segments.list_segments(t)
+        assert [(s["start_ms"], s["end_ms"]) for s in segs] == [(500, 2000)]
+        assert segs[0]["text"] == f"clip{i}"
+    assert set(by_id) == {str(j["id"]) for j in jobs}
@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import downloads
+
+PAYLOAD = bytes(range(256)) * 1000  # 256 KB
+
+
+class _Handler(BaseHTTPRequestHandler):
+    ranges = True
+    etag = '"v1"'
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        type(self).requests_seen.append("HEAD")
+        self.send_response(200)
+        if self.etag:
+            self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+
+    def do_GET(self):
+        type(self).requests_seen.append(self.headers.get("Range"))
+        m = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range") or "")
+        if self.ranges and m:
+            start, end = int(m.group(1)), min(int(m.group(2)), len(PAYLOAD) - 1)
+            body = PAYLOAD[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            body = PAYLOAD
+            self.send_response(200)
+        if self.etag:
+            self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    monkeypatch.setenv("S2X_AUDIO_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("S2X_DOWNLOAD_PART_KB", "32")
+    handler = type("Handler", (_Handler,), {"requests_seen": []})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield handler, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_ranged_download_is_cached(server):
+    handler, base = server
+    first = downloads.fetch(f"{base}/a.wav")
+    assert not first.owned and first.bytes_downloaded == len(PAYLOAD)
+    with open(first.path, "rb") as f:
+        assert f.read() == PAYLOAD
+    # HEAD (URI desconocida) y 256 KB en partes de 32 KB
+    assert handler.requests_seen[0] == "HEAD" and len(handler.requests_seen) == 9
+
+    # Índice vigente: el acierto no toca la red
+    again = downloads.fetch(f"{base}/a.wav")
+    assert again.path == first.path and again.bytes_downloaded == 0
+    assert len(handler.requests_seen) == 9
+
+
+def test_cache_revalidates_with_head_after_ttl(server, monkeypatch):
+    handler, base = server
+    monkeypatch.setenv("S2X_AUDIO_REVALIDATE_SEC", "0")
+    first = downloads.fetch(f"{base}/c.wav")
+    del handler.requests_seen[:]
+
+    again = downloads.fetch(f"{base}/c.wav")
+    assert again.path == first.path and handler.requests_seen == ["HEAD"]
+
+    # El recurso cambió: se descarga de nuevo con la clave nueva
+    handler.etag = '"v2"'
+    changed = downloads.fetch(f"{base}/c.wav")
+    assert changed.path != first.path and changed.bytes_downloaded == len(PAYLOAD)
+    assert handler.requests_seen[1:3] == ["HEAD", "bytes=0-32767"]
+
+
+def test_server_without_ranges_or_validators(server):
+    handler, base = server
+    handler.ranges = False
+    handler.etag = None
+    d = downloads.fetch(f"{base}/b.mp3")
+    try:
+        assert d.owned and d.path.endswith(".mp3")
+        with open(d.path, "rb") as f:
+            assert f.read() == PAYLOAD
+        assert handler.requests_seen == ["HEAD", "bytes=0-32767"]
+    finally:
+        os.remove(d.path)
+
+
+def test_cache_evicts_least_recently_used(server, monkeypatch):
+    handler, base = server
+    monkeypatch.setenv("S2X_AUDIO_CACHE_MB", "1")
+    paths = [downloads.fetch(f"{base}/{i}.wav").path for i in range(5)]
+    kept = os.listdir(os.environ["S2X_AUDIO_CACHE_DIR"])
+    assert sum(os.path.getsize(os.path.join(os.environ["S2X_AUDIO_CACHE_DIR"], k)) for k in kept) <= 1024 * 1024
+    assert os.path.basename(paths[-1]) in kept
+    assert os.path.basename(paths[0]) not in kept
@@ -6,3 +6,43 @@ def test_health_ok(client):
     if body.get("status") == "ok":
         assert body.get("db") == 1
 
+
+def test_health_cache_stats(client):
+    res = client.get("/health/cache")
+    assert res.status_code == 200
+    body = res.json()
+    assert {"hits", "misses", "entries", "size_bytes", "hit_ratio"} <= set(body)
+
+
+def test_health_cache_reads_through_the_api_pool(client):
+    from app import metrics
+
+    jobs = metrics.get_histogram("db_pool_wait_ms.jobs")["count"]
+    api = metrics.get_histogram("db_pool_wait_ms.api")["count"]
+    assert client.get("/health/cache").status_code == 200
+    # El tráfico de la API no toma conexiones del pool de los workers
+    assert metrics.get_histogram("db_pool_wait_ms.jobs")["count"] == jobs
+    assert metrics.get_histogram("db_pool_wait_ms.api")["count"] == api + 1
+
+
+def test_health_db_pool_stats(client):
+    client.get("/health")
+    res = client.get("/health/db")
+    assert res.status_code == 200
+    body = res.json()
+    assert {"api", "jobs"} <= set(body)
+    api = body["api"]
+    assert {"size", "in_use", "idle", "checkouts", "timeouts", "max_size", "wait_ms_histogram"} <= set(api)
+    assert api["wait_ms_histogram"]["count"] >= 1
+    assert api["in_use"] + api["idle"] == api["size"]
+
+
+def test_pool_config_from_env(monkeypatch):
+    from app import db_pool
+
+    monkeypatch.setenv("S2X_DB_POOL_MAX", "7")
+    monkeypatch.setenv("S2X_DB_JOBS_POOL_MAX", "3")
+    monkeypatch.setenv("S2X_DB_API_POOL_TIMEOUT", "2.5")
+    assert db_pool.pool_config("jobs")["max_size"] == 3
+    assert db_pool.pool_config("api")["max_size"] == 7
+    assert db_pool.pool_config("api")["timeout"] == 2.5
@@ -0,0 +1,78 @@
+import os
+from unittest.mock import patch
+
+import numpy as np
+
+from app.services import long_audio
+from app.services import transcribe as tr
+
+
+def test_plan_chunks_cuts_in_silence_and_covers_audio():
+    speech = [{"start": 0, "end": 90}, {"start": 110, "end": 190}, {"start": 210, "end": 390}]
+    spans = long_audio.plan_chunks(speech, total_samples=400, target_samples=100)
+    assert spans == [(0, 100), (100, 200), (200, 400)]
+
+
+def test_plan_chunks_hard_cuts_without_silence():
+    spans = long_audio.plan_chunks([{"start": 0, "end": 1000}], total_samples=1000, target_samples=300)
+    assert spans == [(0, 600), (600, 1000)]
+    assert long_audio.plan_chunks([], total_samples=0, target_samples=300) == []
+
+
+def test_enabled_for_thresholds(monkeypatch):
+    monkeypatch.setenv("S2X_LONG_AUDIO_SEC", "600")
+    monkeypatch.setenv("S2X_CHUNK_WORKERS", "4")
+    assert long_audio.enabled_for(3600)
+    assert not long_audio.enabled_for(60)
+    assert not long_audio.enabled_for(None)
+    monkeypatch.setenv("S2X_CHUNK_WORKERS", "1")
+    assert not long_audio.enabled_for(3600)
+
+
+def test_run_whisper_chunked_merges_offsets_in_order(monkeypatch):
+    monkeypatch.setenv("S2X_CHUNK_SEC", "1")
+    sr = long_audio.SAMPLE_RATE
+    audio = np.zeros(3 * sr, dtype=np.float32)
+    speech = [{"start": 0, "end": sr - 100}, {"start": sr + 100, "end": 2 * sr - 100},
+              {"start": 2 * sr + 100, "end": 3 * sr}]
+    chunk_results = [
+        [{"start_ms": 0, "end_ms": 900, "text": "uno dijo que no.", "confidence": None, "speaker_label": None}],
+        [{"start_ms": 1000, "end_ms": 1900, "text": "No, tres", "confidence": None, "speaker_label": None}],
+        [{"start_ms": 2000, "end_ms": 2900, "text": "cuatro", "confidence": None, "speaker_label": None}],
+    ]
+    calls = {}
+
+    def _fake_chunks(pcm_path, spans, name, compute_type, options):
+        calls["spans"] = list(spans)
+        calls["options"] = options
+        return iter(chunk_results)
+
+    got = []
+    with patch.object(tr.pcm_cache, "open_pcm", return_value=audio), \
+            patch.object(long_audio, "find_speech", return_value=speech), \
+            patch.object(long_audio, "detect_language", return_value=("es", 0.97)), \
+            patch.object(long_audio, "transcribe_chunks", side_effect=_fake_chunks):
+        lang, prob, text = tr._run_whisper_chunked("x.npy", None, None, None, lambda s, p: got.append((s, p)))
+
+    assert calls["spans"] == [(0, sr), (sr, 2 * sr), (2 * sr, 3 * sr)]
+    assert calls["options"]["language"] == "es"
+    assert (lang, prob) == ("es", 0.97)
+    assert [s["text"] for s, _ in got] == ["uno dijo que no.", "No, tres", "cuatro"]
+    assert [round(p, 2) for _, p in got] == [0.33, 0.67, 1.0]
+    assert text == "uno dijo que no. No, tres cuatro"
+
+
+def test_pcm_cache_evicts_least_recently_used(monkeypatch, tmp_path):
+    from app.services import pcm_cache
+    monkeypatch.setenv("S2X_PCM_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("S2X_PCM_CACHE_MB", "1")
+    sr = long_audio.SAMPLE_RATE
+    # 5 s de float32 = 320 KB por audio: caben tres
+    with patch.object(pcm_cache, "_decode", return_value=np.ones(5 * sr, dtype=np.float32)):
+        paths = [pcm_cache.ensure(f"a{i}", lambda: "src.wav") for i in range(3)]
+        pcm_cache.ensure("a0", lambda: "src.wav")
+        pcm_cache.ensure("a3", lambda: "src.wav")
+    kept = sorted(os.listdir(tmp_path))
+    assert kept == ["a0.npy", "a2.npy", "a3.npy"]
+    mapped = pcm_cache.open_pcm(paths[0])
+    assert isinstance(mapped, np.memmap) and mapped.dtype == np.float32 and len(mapped) == 5 * sr
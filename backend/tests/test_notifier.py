@@ -0,0 +1,222 @@
+import socketserver
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from app import repo_audio_files, repo_notifications, repo_projects, repo_transcriptions, repo_users
+from app.db_pool import get_conn
+from app.notifier import Dispatcher, RateLimiter
+from app.services.notify_channels import DeliveryError, SmtpChannel, WhatsAppStubChannel
+
+
+class _SmtpSink(socketserver.ThreadingTCPServer):
+    """Servidor SMTP mínimo de depuración: guarda los mensajes y rechaza bounce@."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        self.messages = []
+        super().__init__(("127.0.0.1", 0), _SmtpHandler)
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self._reply("220 sink ready")
+        rcpt = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            cmd = line[:4].upper()
+            if not line or cmd == "QUIT":
+                self._reply("221 bye")
+                return
+            if cmd in ("EHLO", "HELO"):
+                self._reply("250 sink")
+            elif cmd == "RCPT":
+                if "bounce@" in line:
+                    self._reply("550 no such user")
+                else:
+                    rcpt.append(line.split(":", 1)[1].strip("<> "))
+                    self._reply("250 ok")
+            elif cmd == "DATA":
+                self._reply("354 go ahead")
+                data = []
+                while (chunk := self.rfile.readline()) != b".\r\n":
+                    data.append(chunk)
+                self.server.messages.append((rcpt, b"".join(data).decode()))
+                rcpt = []
+                self._reply("250 queued")
+            else:
+                self._reply("250 ok")
+
+
+@pytest.fixture
+def smtp_sink():
+    server = _SmtpSink()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _transcription():
+    u = repo_users.create_user("notify@example.com", None, "x", "user")
+    p = repo_projects.create_project(u["id"], "N")
+    a = repo_audio_files.create_audio(p["id"], "/audios/audio.mp3")
+    return str(repo_transcriptions.create_transcription(a["id"])["id"])
+
+
+def _get(nid):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT status::text, attempts, last_error, sent_at, next_attempt_at > now() "
+                    "FROM notifications WHERE id = %s", (nid,))
+        return cur.fetchone()
+
+
+def test_dispatcher_sends_email_and_whatsapp(smtp_sink):
+    tid = _transcription()
+    ok = repo_notifications.create_notification(tid, "email", "ana@example.com", payload={"subject": "Lista", "body": "Hola"})
+    bounce = repo_notifications.create_notification(tid, "email", "bounce@example.com")
+    wa = repo_notifications.create_notification(tid, "whatsapp", "+5491155550000")
+    bad_wa = repo_notifications.create_notification(tid, "whatsapp", "not-a-number")
+
+    smtp = SmtpChannel("127.0.0.1", smtp_sink.server_address[1], "s2x@example.com", timeout=5)
+    whatsapp = WhatsAppStubChannel()
+    dispatcher = Dispatcher(concurrency=2, channels={"email": smtp, "whatsapp": whatsapp}.__getitem__)
+    assert dispatcher.run_once() == 4
+
+    assert _get(ok["id"])[:2] == ("sent", 1) and _get(ok["id"])[3] is not None
+    assert _get(bounce["id"])[0] == "failed" and "refused" in _get(bounce["id"])[2]
+    assert _get(wa["id"])[0] == "sent" and _get(bad_wa["id"])[0] == "failed"
+    (rcpt, body), = smtp_sink.messages
+    assert rcpt == ["ana@example.com"] and "Subject: Lista" in body and "Hola" in body
+    assert whatsapp.sent == [{"to": "+5491155550000", "body": f"Transcription {tid} has an update."}]
+    assert dispatcher.run_once() == 0
+
+
+class _Flaky:
+    def __init__(self, failures):
+        self.failures = failures
+
+    def send(self, n):
+        if self.failures:
+            self.failures -= 1
+            raise DeliveryError("temporarily unavailable")
+
+
+def _make_due(nid):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE notifications SET next_attempt_at = now() WHERE id = %s", (nid,))
+        conn.commit()
+
+
+def test_dispatcher_retries_with_backoff_then_fails():
+    tid = _transcription()
+    nid = repo_notifications.create_notification(tid, "email", "retry@example.com")["id"]
+    dispatcher = Dispatcher(max_attempts=2, backoff_sec=60, channels=lambda _t: _Flaky(10))
+
+    assert dispatcher.run_once() == 1
+    status, attempts, error, _, later = _get(nid)
+    assert (status, attempts, error, later) == ("pending", 1, "temporarily unavailable", True)
+    # Todavía no vence el backoff: no se reclama
+    assert dispatcher.run_once() == 0
+
+    _make_due(nid)
+    assert dispatcher.run_once() == 1
+    assert _get(nid)[:2] == ("failed", 2)
+
+
+def test_rate_limit_defers_without_spending_attempts():
+    tid = _transcription()
+    ids = [repo_notifications.create_notification(tid, "email", "same@example.com")["id"] for _ in range(3)]
+    sent = []
+    channel = type("C", (), {"send": lambda self, n: sent.append(n["id"])})()
+    dispatcher = Dispatcher(concurrency=1, limiter=RateLimiter(per_minute=1, burst=2), channels=lambda _t: channel)
+
+    assert dispatcher.run_once() == 3
+    assert len(sent) == 2
+    (deferred,) = [nid for nid in ids if nid not in sent]
+    status, attempts, _, _, later = _get(deferred)
+    assert (status, attempts, later) == ("pending", 0, True)
+
+
+def test_concurrent_dispatchers_never_double_send():
+    tid = _transcription()
+    ids = {str(repo_notifications.create_notification(tid, "email", f"u{i}@example.com")["id"]) for i in range(60)}
+    sent = Counter()
+    lock = threading.Lock()
+
+    class _Recorder:
+        def send(self, n):
+            with lock:
+                sent[str(n["id"])] += 1
+
+    dispatchers = [Dispatcher(concurrency=4, batch_size=7, channels=lambda _t: _Recorder()) for _ in range(4)]
+
+    def drain(d):
+        while d.run_once():
+            pass
+
+    threads = [threading.Thread(target=drain, args=(d,)) for d in dispatchers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert set(sent) == ids and set(sent.values()) == {1}
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM notifications WHERE status = 'sent' AND locked_by IS NULL")
+        assert cur.fetchone()[0] == 60
+
+
+def test_results_are_recorded_while_a_send_hangs():
+    tid = _transcription()
+    slow = repo_notifications.create_notification(tid, "email", "slow@example.com")["id"]
+    fast = [repo_notifications.create_notification(tid, "email", f"f{i}@example.com")["id"] for i in range(3)]
+    release = threading.Event()
+
+    class _Hanging:
+        def send(self, n):
+            if n["target"] == "slow@example.com":
+                release.wait(10)
+
+    dispatcher = Dispatcher(concurrency=4, channels=lambda _t: _Hanging())
+    runner = threading.Thread(target=dispatcher.run_once)
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while any(_get(nid)[0] != "sent" for nid in fast) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        # Los envíos ya hechos quedan registrados sin esperar al colgado
+        assert [_get(nid)[0] for nid in fast] == ["sent"] * 3
+        assert _get(slow)[0] == "pending"
+    finally:
+        release.set()
+        runner.join()
+    assert _get(slow)[0] == "sent"
+
+
+def test_batch_size_fits_in_the_lease():
+    assert Dispatcher(concurrency=8, batch_size=50, lease_sec=300, send_timeout_sec=30).batch_size == 40
+    assert Dispatcher(concurrency=4, batch_size=10, lease_sec=300, send_timeout_sec=30).batch_size == 10
+    assert Dispatcher(concurrency=2, batch_size=50, lease_sec=30, send_timeout_sec=60).batch_size == 2
+
+
+def test_rate_limiter_prunes_idle_buckets(monkeypatch):
+    from types import SimpleNamespace
+    import app.notifier as notifier
+
+    now = [1000.0]
+    monkeypatch.setattr(notifier, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    limiter = RateLimiter(per_minute=60, burst=2)
+    for i in range(100):
+        assert limiter.acquire(f"email:u{i}@example.com") == 0
+    assert len(limiter._buckets) == 100
+    # Tras una recarga completa los baldes inactivos se descartan
+    now[0] += 3
+    limiter.acquire("email:active@example.com")
+    assert list(limiter._buckets) == ["email:active@example.com"]
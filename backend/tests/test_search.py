@@ -0,0 +1,102 @@
+import pytest
+
+from app import repo_segments
+from app.db_pool import get_conn
+
+
+def _transcription(client, project_id, segments):
+    a = client.post("/audio", json={"project_id": project_id, "s3_uri": "/audios/audio.mp3"}).json()
+    tid = client.post("/transcriptions", json={"audio_id": a["id"]}).json()["id"]
+    repo_segments.bulk_insert_segments(tid, [
+        {"start_ms": i * 1000, "end_ms": i * 1000 + 900, "text": text} for i, text in enumerate(segments)
+    ])
+    client.post(f"/transcriptions/{tid}/succeeded", json={
+        "language_detected": "es", "confidence": 0.9, "text_full": " ".join(segments), "artifacts": {},
+    })
+    return tid
+
+
+def _project(client):
+    u = client.post("/users", json={"email": "finder@example.com", "pwd_hash": "x"}).json()
+    return client.post("/projects", json={"owner_id": u["id"], "name": "Archivo"}).json()["id"]
+
+
+def test_phrase_search_returns_segment_hits(client):
+    pid = _project(client)
+    t1 = _transcription(client, pid, ["buenos días", "el presupuesto anual", "otro tema", "presupuesto anual aprobado"])
+    t2 = _transcription(client, pid, ["hablamos del presupuesto", "nada más"])
+    _transcription(client, pid, ["sin coincidencias"])
+
+    r = client.get("/search", params={"q": '"presupuesto anual"', "project_id": pid})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert [x["transcription_id"] for x in body] == [t1]
+    hit = body[0]
+    assert hit["num_hits"] == 2
+    assert [(h["start_ms"], h["end_ms"]) for h in hit["hits"]] == [(1000, 1900), (3000, 3900)]
+    assert "<mark>presupuesto</mark> <mark>anual</mark>" in hit["hits"][0]["snippet"]
+
+    r = client.get("/search", params={"q": "presupuesto"})
+    assert {x["transcription_id"] for x in r.json()} == {t1, t2}
+
+
+def test_search_keyset_pagination(client):
+    pid = _project(client)
+    tids = {_transcription(client, pid, [f"reunión número {i}", "acta de la reunión"]) for i in range(3)}
+    seen, cursor = [], None
+    while True:
+        params = {"q": "reunión", "limit": 2, "hits_per_result": 1}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get("/search", params=params)
+        assert r.status_code == 200, r.text
+        assert all(len(x["hits"]) == 1 and x["num_hits"] == 2 for x in r.json())
+        seen += [x["transcription_id"] for x in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(seen) == 3 and set(seen) == tids
+
+
+def test_search_ranks_a_bounded_candidate_set(client, monkeypatch):
+    pid = _project(client)
+    # Una transcripción larga no agota el cupo: las candidatas se cuentan por transcripción
+    tids = [_transcription(client, pid, [f"informe {j}" for j in range(30)])]
+    tids += [_transcription(client, pid, [f"informe {i}", "informe final"]) for i in range(4)]
+    monkeypatch.setenv("S2X_SEARCH_MAX_CANDIDATES", "3")
+    monkeypatch.setenv("S2X_SEARCH_MAX_SEGMENTS_PER_CANDIDATE", "2")
+    expected = sorted(tids)[:3]
+
+    r = client.get("/search", params={"q": "informe", "project_id": pid, "limit": 10})
+    assert r.status_code == 200, r.text
+    assert sorted(x["transcription_id"] for x in r.json()) == expected
+
+    # Todas las páginas rankean las mismas candidatas: el keyset no repite ni salta
+    seen, cursor = [], None
+    while True:
+        params = {"q": "informe", "project_id": pid, "limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get("/search", params=params)
+        seen += [x["transcription_id"] for x in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert sorted(seen) == expected
+
+
+def test_search_rejects_unknown_mode(client):
+    assert client.get("/search", params={"q": "x", "mode": "regex"}).status_code == 400
+
+
+def test_fuzzy_search_tolerates_typos(client):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm';")
+        if cur.fetchone() is None:
+            pytest.skip("pg_trgm not installed")
+    pid = _project(client)
+    tid = _transcription(client, pid, ["la transcripción automática", "funciona bien"])
+    r = client.get("/search", params={"q": "transcripcion automatica", "mode": "fuzzy"})
+    assert r.status_code == 200, r.text
+    assert r.json()[0]["transcription_id"] == tid
+    assert r.json()[0]["hits"][0]["start_ms"] == 0
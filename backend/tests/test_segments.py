@@ -49,3 +49,125 @@ def test_segments_negative_and_equal_and_sort_order(client):
     items = client.get(f"/segments/{tid}").json()
     starts = [s["start_ms"] for s in items]
     assert starts == sorted(starts)
+
+def _walk(client, url):
+    items, cursor = [], None
+    while True:
+        r = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        assert r.status_code == 200, r.text
+        items += r.json()
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return items
+
+def test_segments_keyset_cursor_walks_all_pages(client):
+    from app import repo_segments
+    tid = _tid(client)
+    # Empates en start_ms: el id desempata y ninguna fila se repite ni se pierde
+    repo_segments.bulk_insert_segments(tid, ({"start_ms": i // 2, "end_ms": i, "text": f"s{i}"} for i in range(25)))
+    items = _walk(client, f"/segments/{tid}?limit=4")
+    assert len(items) == 25 and len({s["id"] for s in items}) == 25
+    assert [s["start_ms"] for s in items] == sorted(s["start_ms"] for s in items)
+
+def test_list_endpoints_cursor_pagination(client):
+    u = client.post("/users", json={"email": "keyset@example.com", "pwd_hash": "x"}).json()
+    for i in range(5):
+        client.post("/projects", json={"owner_id": u["id"], "name": f"P{i}"})
+    projects = _walk(client, f"/projects?owner_id={u['id']}&limit=2")
+    assert [p["name"] for p in projects] == ["P4", "P3", "P2", "P1", "P0"]
+
+    pid = projects[0]["id"]
+    aids = [client.post("/audio", json={"project_id": pid, "s3_uri": f"/a{i}.wav"}).json()["id"] for i in range(3)]
+    assert [a["id"] for a in _walk(client, f"/audio?project_id={pid}&limit=1")] == aids[::-1]
+
+    tids = [client.post("/transcriptions", json={"audio_id": aids[0]}).json()["id"] for _ in range(3)]
+    assert sorted(t["id"] for t in _walk(client, f"/transcriptions?audio_id={aids[0]}&limit=2")) == sorted(tids)
+
+    r = client.get(f"/projects?owner_id={u['id']}&limit=5")
+    assert "X-Next-Cursor" not in r.headers
+
+def test_list_rejects_invalid_cursor(client):
+    tid = _tid(client)
+    assert client.get(f"/segments/{tid}?cursor=not-a-cursor").status_code == 400
+
+def test_list_rejects_offset_with_cursor(client):
+    from app import repo_segments
+    tid = _tid(client)
+    repo_segments.bulk_insert_segments(tid, ({"start_ms": i, "end_ms": i + 1, "text": f"s{i}"} for i in range(3)))
+    cursor = client.get(f"/segments/{tid}?limit=1").headers["X-Next-Cursor"]
+    r = client.get(f"/segments/{tid}?limit=1&offset=1&cursor={cursor}")
+    assert r.status_code == 400 and "offset" in r.json()["detail"]
+    assert client.get(f"/segments/{tid}?limit=1&offset=0&cursor={cursor}").status_code == 200
+
+
+def test_segment_list_json_matches_default_encoder(client):
+    from fastapi.encoders import jsonable_encoder
+    from app import repo_segments
+
+    tid = _setup_transcription(client)
+    repo_segments.bulk_insert_segments(tid, [
+        {"start_ms": 0, "end_ms": 900, "text": "uno", "confidence": 0.875},
+        {"start_ms": 1000, "end_ms": 1900, "text": "dos", "confidence": None, "speaker_label": "A"},
+    ])
+    r = client.get(f"/segments/{tid}")
+    assert r.headers["content-type"] == "application/json"
+    # orjson produce lo mismo que el encoder por defecto de FastAPI
+    assert r.json() == jsonable_encoder(repo_segments.list_segments(tid))
+    assert r.json()[0]["confidence"] == 0.875
+
+
+def test_export_streams_current_segments_with_revision_etag(client):
+    import json
+    from app import repo_segments
+
+    tid = _setup_transcription(client)
+    repo_segments.bulk_insert_segments(tid, [
+        {"start_ms": i * 1000, "end_ms": i * 1000 + 500, "text": f"línea {i}"} for i in range(3000)
+    ])
+    r = client.get(f"/transcriptions/{tid}/export/srt")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-subrip")
+    assert r.text.startswith("1\n00:00:00,000 --> 00:00:00,500\nlínea 0\n\n2\n")
+    assert r.text.count(" --> ") == 3000
+    etag = r.headers["etag"]
+
+    r = client.get(f"/transcriptions/{tid}/export/srt", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+
+    # Una edición cambia la revisión y por lo tanto el ETag
+    client.post(f"/segments/{tid}", json={"start_ms": 10_000_000, "end_ms": 10_000_500, "text": "agregado"})
+    r = client.get(f"/transcriptions/{tid}/export/srt", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    assert r.text.rstrip().endswith("agregado")
+
+    r = client.get(f"/transcriptions/{tid}/export/vtt")
+    assert r.text.startswith("WEBVTT\n\n00:00:00.000 --> 00:00:00.500\nlínea 0\n")
+    lines = client.get(f"/transcriptions/{tid}/export/jsonl").text.splitlines()
+    assert len(lines) == 3001 and json.loads(lines[-1])["text"] == "agregado"
+    assert client.get(f"/transcriptions/{tid}/export/docx").status_code == 404
+
+
+def test_export_pages_through_ties_without_losing_rows(client):
+    import json
+    from app import repo_segments
+
+    tid = _setup_transcription(client)
+    # Empates de start_ms en los bordes de las páginas de keyset (1000 filas)
+    repo_segments.bulk_insert_segments(tid, [
+        {"start_ms": i // 700, "end_ms": 5000, "text": f"t{i}"} for i in range(2500)
+    ])
+    lines = client.get(f"/transcriptions/{tid}/export/jsonl").text.splitlines()
+    texts = [json.loads(line)["text"] for line in lines]
+    assert len(texts) == 2500 and len(set(texts)) == 2500
+
+
+def test_segments_revision_bumps_once_per_statement(client):
+    from app import repo_segments, repo_transcriptions
+
+    tid = _setup_transcription(client)
+    rev = repo_transcriptions.get_transcription(tid)["segments_rev"]
+    repo_segments.bulk_insert_segments(tid, [{"start_ms": i, "end_ms": i + 1, "text": "x"} for i in range(50)])
+    assert repo_transcriptions.get_transcription(tid)["segments_rev"] == rev + 1
+    repo_segments.delete_segments_by_transcription(tid)
+    assert repo_transcriptions.get_transcription(tid)["segments_rev"] == rev + 2
+    assert client.delete(f"/transcriptions/{tid}").status_code == 200
@@ -43,9 +43,18 @@ def test_shares_expires_and_cleanup(client):
     assert r.status_code == 200
     r = client.get("/shares/resolve/pasttok")
     assert r.status_code == 200
+    # Expirado hace 5 s: sigue dentro del margen, el barrido no lo borra
     r = client.post("/shares/cleanup")
     assert r.status_code == 200
     r = client.get("/shares/resolve/pasttok")
+    assert r.status_code == 200
+
+    stale = (dt.datetime.utcnow() - dt.timedelta(seconds=600)).isoformat() + "Z"
+    r = client.post("/shares", json={"transcription_id": tid, "token": "staletok", "kind": "private", "expires_at": stale})
+    assert r.status_code == 200
+    r = client.post("/shares/cleanup")
+    assert r.json() == {"deleted": 1}
+    r = client.get("/shares/resolve/staletok")
     assert r.status_code == 404
 
     r = client.post("/shares", json={"transcription_id": tid, "token": "futuretok", "kind": "private", "expires_at": future})
@@ -91,3 +100,81 @@ def test_share_duplicate_token(client):
     assert r1.status_code == 200
     r2 = client.post("/shares", json={"transcription_id": tid, "token": "dup", "kind": "private"})
     assert r2.status_code == 400
+
+def _wait_for(cond, timeout=3.0):
+    import time
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return cond()
+
+def test_share_resolve_is_cached_and_invalidated(client):
+    from unittest.mock import patch
+    from app import repo_shares, share_cache
+    from app.db_pool import get_conn
+
+    tid = _setup_transcription(client)
+    sid = client.post("/shares", json={"transcription_id": tid, "token": "hot", "kind": "private"}).json()["id"]
+    assert share_cache.enabled()
+    assert client.get("/shares/resolve/hot").json()["status"] == "queued"
+
+    # Un token caliente se resuelve sin ir a la base
+    with patch.object(repo_shares, "get_async_conn", side_effect=AssertionError("DB round trip")):
+        assert client.get("/shares/resolve/hot").json()["kind"] == "private"
+
+    # Cambio desde la API del mismo proceso: invalidación inmediata
+    client.patch(f"/shares/{sid}", json={"kind": "public"})
+    assert client.get("/shares/resolve/hot").json()["kind"] == "public"
+
+    # Cambios desde otro proceso (SQL directo): llegan por LISTEN/NOTIFY
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE transcriptions SET status = 'running' WHERE id = %s", (tid,))
+        conn.commit()
+    assert _wait_for(lambda: share_cache.get("hot", 60) is None)
+    assert client.get("/shares/resolve/hot").json()["status"] == "running"
+
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE shares SET expires_at = now() - interval '1 hour' WHERE id = %s", (sid,))
+        conn.commit()
+    assert _wait_for(lambda: share_cache.get("hot", 60) is None)
+    assert client.get("/shares/resolve/hot").status_code == 404
+
+def test_cleanup_deletes_expired_in_batches(client):
+    import datetime as dt
+    from app import repo_shares, share_cache
+
+    tid = _setup_transcription(client)
+    now = dt.datetime.now(dt.timezone.utc)
+    for i in range(25):
+        repo_shares.create_share(tid, f"old{i}", expires_at=now - dt.timedelta(seconds=30, minutes=10 + i))
+    repo_shares.create_share(tid, "later", expires_at=now + dt.timedelta(hours=1))
+    repo_shares.create_share(tid, "forever")
+    # Resuelto con un margen mayor que el del barrido: queda en caché hasta el barrido
+    assert repo_shares.resolve_share("old0", grace_seconds=3600) is not None
+    assert share_cache.get("old0", 3600) is not None
+
+    assert repo_shares.cleanup_expired(batch_size=10) == 25
+    assert share_cache.get("old0", 3600) is None
+    assert client.get("/shares/resolve/old0").status_code == 404
+    assert client.get("/shares/resolve/later").status_code == 200
+    assert client.get("/shares/resolve/forever").status_code == 200
+    assert client.post("/shares/cleanup").json() == {"deleted": 0}
+
+def test_cleanup_keeps_shares_inside_the_grace_window(client, monkeypatch):
+    import datetime as dt
+    from app import repo_shares
+
+    tid = _setup_transcription(client)
+    now = dt.datetime.now(dt.timezone.utc)
+    repo_shares.create_share(tid, "recent", expires_at=now - dt.timedelta(seconds=10))
+    repo_shares.create_share(tid, "stale", expires_at=now - dt.timedelta(seconds=301))
+    # El margen del barrido nunca baja del mayor margen de resolve_share
+    monkeypatch.setenv("S2X_SHARE_SWEEP_GRACE_SEC", "0")
+    assert repo_shares.sweep_grace_seconds() == repo_shares.DEFAULT_GRACE_SECONDS
+
+    assert repo_shares.cleanup_expired(batch_size=10) == 1
+    assert client.post("/shares/cleanup").json() == {"deleted": 0}
+    assert client.get("/shares/resolve/recent").status_code == 200
+    assert repo_shares.resolve_share("stale") is None
@@ -0,0 +1,186 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+from app import repo_segments, repo_transcriptions
+from app.services import streaming
+
+SR = streaming.SAMPLE_RATE
+
+# Palabras (inicio, fin, texto) del "audio" simulado
+SCRIPT = [(0.0, 0.4, "Hola"), (0.5, 0.9, "mundo."), (1.0, 1.4, "Otra"), (1.5, 1.9, "frase")]
+
+
+class _ScriptedModel:
+    """Devuelve las palabras del guion que ya terminaron dentro del buffer."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, audio, language=None, **kwargs):
+        self.calls += 1
+        assert kwargs["word_timestamps"]
+        seconds = len(audio) / SR
+        words = [SimpleNamespace(start=s, end=e, word=" " + w) for s, e, w in SCRIPT if e <= seconds]
+        info = SimpleNamespace(language=language or "es", language_probability=0.95)
+        return iter([SimpleNamespace(words=words)]), info
+
+
+def _pcm(seconds):
+    return (np.zeros(int(seconds * SR), dtype=np.int16)).tobytes()
+
+
+def test_local_agreement_commits_stable_prefix():
+    engine = streaming.StreamingTranscriber(_ScriptedModel())
+    chunk = np.zeros(SR // 2, dtype=np.float32)
+    events = [engine.feed(chunk) for _ in range(4)]
+
+    assert events[0] == [{"type": "partial", "start_ms": 0, "text": "Hola"}]
+    finals = [e["segment"]["text"] for batch in events for e in batch if e["type"] == "final"]
+    assert finals == ["Hola mundo."]
+    assert events[-1][-1]["text"] == "Otra frase"
+
+    last = engine.finish()
+    assert [e["segment"] for e in last] == [
+        {"start_ms": 1000, "end_ms": 1900, "text": "Otra frase", "confidence": None, "speaker_label": None}
+    ]
+
+
+def test_trim_keeps_buffer_bounded(monkeypatch):
+    monkeypatch.setenv("S2X_STREAM_MAX_BUFFER_SEC", "1")
+    engine = streaming.StreamingTranscriber(_ScriptedModel(), language="es")
+    for _ in range(4):
+        engine.feed(np.zeros(SR // 2, dtype=np.float32))
+    assert len(engine.buffer) <= 2 * SR
+    assert engine.offset > 0
+
+
+def test_opus_frames_are_decoded_to_16k():
+    import av
+
+    enc = av.CodecContext.create("libopus", "w")
+    enc.sample_rate, enc.layout, enc.format = 48000, "mono", "s16"
+    tone = (0.3 * np.sin(2 * np.pi * 440 * np.arange(48000) / 48000) * 32767).astype(np.int16)
+    packets = []
+    for i in range(0, 48000, 960):
+        frame = av.AudioFrame.from_ndarray(tone[i:i + 960].reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate, frame.pts = 48000, i
+        packets += [bytes(p) for p in enc.encode(frame)]
+
+    dec = streaming.FrameDecoder("opus")
+    out = np.concatenate([dec.decode(p) for p in packets])
+    assert out.dtype == np.float32 and abs(len(out) - SR) < SR // 20
+
+
+def test_pcm_decoder_carries_partial_samples_between_frames():
+    pcm = (np.arange(-500, 500, dtype=np.int16) * 30).tobytes()
+    dec = streaming.FrameDecoder("pcm_s16le")
+    # Cortes en mitad de una muestra: el byte suelto espera al frame siguiente
+    out = np.concatenate([dec.decode(pcm[:1]), dec.decode(pcm[1:1001]), dec.decode(pcm[1001:])])
+    assert np.array_equal(out, np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0)
+
+    f32 = np.linspace(-1, 1, 100, dtype=np.float32).tobytes()
+    dec = streaming.FrameDecoder("pcm_f32le")
+    out = np.concatenate([dec.decode(f32[:7]), dec.decode(f32[7:])])
+    assert np.array_equal(out, np.frombuffer(f32, dtype="<f4"))
+
+
+def _stream_transcription(client):
+    u = client.post("/users", json={"email": "live@example.com", "pwd_hash": "x"}).json()
+    p = client.post("/projects", json={"owner_id": u["id"], "name": "Live"}).json()
+    a = client.post("/audio", json={"project_id": p["id"], "s3_uri": "live://meeting"}).json()
+    r = client.post("/transcriptions", json={"audio_id": a["id"], "mode": "stream"})
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+def test_websocket_stream_persists_final_segments(client):
+    tid = _stream_transcription(client)
+    assert repo_transcriptions.claim_queued("w1", 5) == []
+
+    with patch("app.services.transcribe._load_model", return_value=_ScriptedModel()):
+        with client.websocket_connect(f"/transcriptions/{tid}/stream") as ws:
+            seen = []
+            for _ in range(3):
+                ws.send_bytes(_pcm(0.5))
+                seen.append(ws.receive_json())
+                if seen[-1]["type"] == "final":
+                    seen.append(ws.receive_json())
+            assert [e["segment"]["text"] for e in seen if e["type"] == "final"] == ["Hola mundo."]
+            # El segmento final ya está en la base antes de terminar la sesión
+            assert [s["text"] for s in repo_segments.list_segments(tid)] == ["Hola mundo."]
+
+            ws.send_bytes(_pcm(0.5))
+            assert ws.receive_json()["type"] == "partial"
+            ws.send_text('{"event": "stop"}')
+            final = ws.receive_json()
+            done = ws.receive_json()
+
+    assert final["segment"]["text"] == "Otra frase"
+    assert done == {"type": "done", "transcription_id": tid, "num_segments": 2}
+    t = repo_transcriptions.get_transcription(tid)
+    assert t["status"] == "succeeded" and t["text_full"] == "Hola mundo. Otra frase"
+    r = client.get(f"/transcriptions/{tid}/artifacts/srt")
+    assert r.status_code == 200 and "Otra frase" in r.text
+
+
+def test_websocket_rejects_batch_transcriptions(client):
+    import pytest
+    from starlette.websockets import WebSocketDisconnect
+
+    u = client.post("/users", json={"email": "nolive@example.com", "pwd_hash": "x"}).json()
+    p = client.post("/projects", json={"owner_id": u["id"], "name": "NoLive"}).json()
+    a = client.post("/audio", json={"project_id": p["id"], "s3_uri": "/audios/audio.mp3"}).json()
+    tid = client.post("/transcriptions", json={"audio_id": a["id"]}).json()["id"]
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/transcriptions/{tid}/stream") as ws:
+            ws.receive_json()
+
+
+def test_websocket_rejects_sessions_over_the_limit(client, monkeypatch):
+    import pytest
+    from starlette.websockets import WebSocketDisconnect
+
+    monkeypatch.setenv("S2X_STREAM_MAX_SESSIONS", "1")
+    tid = _stream_transcription(client)
+    assert streaming.try_open_slot()
+    try:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect(f"/transcriptions/{tid}/stream") as ws:
+                ws.receive_json()
+        assert exc.value.code == 1013
+    finally:
+        streaming.close_slot()
+    # Rechazada antes de empezar: sigue en cola y el lugar quedó libre
+    assert repo_transcriptions.get_transcription(tid)["status"] == "queued"
+    assert streaming.active_sessions() == 0
+
+
+def test_websocket_session_keeps_its_heartbeat_fresh(client, monkeypatch):
+    import time
+    from app.db_pool import get_conn
+
+    monkeypatch.setenv("S2X_WORKER_HEARTBEAT_SEC", "0.05")
+    tid = _stream_transcription(client)
+    with patch("app.services.transcribe._load_model", return_value=_ScriptedModel()):
+        with client.websocket_connect(f"/transcriptions/{tid}/stream") as ws:
+            ws.send_bytes(_pcm(0.5))
+            ws.receive_json()
+            with get_conn() as conn, conn.cursor() as cur:
+                cur.execute("UPDATE transcriptions SET heartbeat_at = NOW() - interval '5 minutes' WHERE id = %s", (tid,))
+                conn.commit()
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                with get_conn() as conn, conn.cursor() as cur:
+                    cur.execute("SELECT heartbeat_at > NOW() - interval '1 minute' FROM transcriptions WHERE id = %s",
+                                (tid,))
+                    if cur.fetchone()[0]:
+                        break
+                time.sleep(0.02)
+            else:
+                raise AssertionError("heartbeat not refreshed during the session")
+            ws.send_text('{"event": "stop"}')
+            while ws.receive_json()["type"] != "done":
+                pass
+    assert repo_transcriptions.get_transcription(tid)["status"] == "succeeded"
@@ -1,9 +1,26 @@
+import wave
 from types import SimpleNamespace
 from unittest.mock import patch
 
-from app import repo_transcriptions, repo_audio_files, repo_projects, repo_users
+from app import repo_artifacts, repo_transcriptions, repo_audio_files, repo_projects, repo_users
 from app.db_pool import get_conn
-from app.services.transcribe import process_transcription
+from app.services import artifact_store
+from app.services.transcribe import AudioSource, process_transcription
+
+
+def _artifact_text(tid, kind):
+    uri = repo_artifacts.get_artifact(tid, kind)["s3_uri"]
+    with open(artifact_store.get_store().local_path(uri), encoding="utf-8") as f:
+        return f.read()
+
+
+def _wav(path, seconds=1.0):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(b"\x00\x00" * int(16000 * seconds))
+    return str(path)
 
 
 def _bootstrap_data():
@@ -32,30 +49,80 @@ class _FakeWhisperModel:
         return segments, info
 
 
-def test_process_transcription_success(monkeypatch):
+def test_process_transcription_success(monkeypatch, tmp_path):
     tid = _bootstrap_data()
+    audio_file = _wav(tmp_path / "audio.wav")
 
     monkeypatch.setenv("WHISPER_MODEL", "tiny")
 
-    def _fake_download(uri: str) -> str:
-        return __file__
+    def _fake_resolve(uri: str):
+        return AudioSource(audio_file, False, 0)
 
     with patch("app.services.transcribe._load_model", return_value=_FakeWhisperModel()):
-        with patch("app.services.transcribe.download_audio_to_temp", side_effect=_fake_download):
+        with patch("app.services.transcribe.resolve_audio", side_effect=_fake_resolve):
             process_transcription(tid)
 
     t = repo_transcriptions.get_transcription(tid)
     assert t and t["status"] == "succeeded"
     assert t["text_full"]
     assert t["language_detected"]
-    assert "-->" in t["artifacts"]["srt"]
-    assert t["artifacts"]["vtt"].startswith("WEBVTT")
+    assert "-->" in _artifact_text(tid, "srt")
+    assert _artifact_text(tid, "vtt").startswith("WEBVTT")
+    assert "srt" not in t["artifacts"]
 
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute("SELECT COUNT(*) FROM segments WHERE transcription_id = %(tid)s", {"tid": tid})
         n = cur.fetchone()[0]
         assert n >= 2
 
+def test_segments_are_flushed_while_decoding(monkeypatch, tmp_path):
+    tid = _bootstrap_data()
+    audio_file = _wav(tmp_path / "a.wav")
+    monkeypatch.setenv("S2X_SEGMENT_FLUSH_SIZE", "2")
+    seen = []
+
+    def _db_state():
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM segments WHERE transcription_id = %(tid)s", {"tid": tid})
+            n = cur.fetchone()[0]
+        return n, float(repo_transcriptions.get_transcription(tid)["progress"])
+
+    class _SlowModel:
+        def transcribe(self, audio_path, language=None, temperature=None, beam_size=None):
+            def _gen():
+                for i in range(5):
+                    seen.append(_db_state())
+                    yield SimpleNamespace(start=float(i), end=float(i + 1), text=f"s{i}")
+            return _gen(), SimpleNamespace(language="en", language_probability=0.9, duration=5.0)
+
+    with patch("app.services.transcribe._load_model", return_value=_SlowModel()):
+        with patch("app.services.transcribe.resolve_audio", side_effect=lambda uri: AudioSource(str(audio_file), False, 0)):
+            process_transcription(tid)
+
+    # Antes de decodificar el 5º segmento ya hay 4 persistidos y el progreso avanza
+    assert [n for n, _ in seen] == [0, 0, 2, 2, 4]
+    assert seen[-1][1] == 0.8
+    n, progress = _db_state()
+    assert n == 5 and progress == 1.0
+
+def test_repeat_job_on_cached_pcm_does_not_resolve_audio(monkeypatch, tmp_path):
+    from app.services import result_cache
+
+    tid = _bootstrap_data()
+    audio_file = _wav(tmp_path / "r.wav")
+    with patch("app.services.transcribe._load_model", return_value=_FakeWhisperModel()):
+        with patch("app.services.transcribe.resolve_audio", side_effect=lambda uri: AudioSource(audio_file, False, 0)):
+            process_transcription(tid)
+    audio_id = repo_transcriptions.get_transcription(tid)["audio_id"]
+    assert repo_audio_files.get_audio(audio_id)["content_sha256"] == result_cache.file_sha256(audio_file)
+
+    # Otros parámetros (fallo del caché de resultados) sobre el mismo audio ya decodificado
+    tid2 = repo_transcriptions.create_transcription(audio_id=audio_id, beam_size=2)["id"]
+    with patch("app.services.transcribe._load_model", return_value=_FakeWhisperModel()):
+        with patch("app.services.transcribe.resolve_audio", side_effect=AssertionError("resolved")):
+            process_transcription(tid2)
+    assert repo_transcriptions.get_transcription(tid2)["status"] == "succeeded"
+
 def _bootstrap_bad_audio():
     u = repo_users.create_user("fail@example.com", None, "x", "user")
     p = repo_projects.create_project(u["id"], "Fail")
@@ -77,7 +144,7 @@ def test_process_transcription_http_404(monkeypatch):
     import requests
     def _raise_http_error(uri: str):
         raise requests.HTTPError("404")
-    with patch("app.services.transcribe.download_audio_to_temp", side_effect=_raise_http_error):
+    with patch("app.services.transcribe.resolve_audio", side_effect=_raise_http_error):
         try:
             process_transcription(tid)
         except Exception:
@@ -91,9 +158,9 @@ def test_disable_whisper_env_produces_empty_artifacts(monkeypatch):
     process_transcription(tid)
     t = repo_transcriptions.get_transcription(tid)
     assert t and t["status"] == "succeeded"
-    assert t["artifacts"]["num_segments"] == 0
-    assert t["artifacts"]["srt"] == ""
-    assert t["artifacts"]["vtt"] == ""
+    assert t["artifacts"] == {"num_segments": 0}
+    assert _artifact_text(tid, "srt").strip() == ""
+    assert _artifact_text(tid, "vtt").strip() == "WEBVTT"
     monkeypatch.delenv("S2X_DISABLE_WHISPER", raising=False)
 
 def test_model_env_overrides(monkeypatch):
@@ -105,12 +172,34 @@ def test_model_env_overrides(monkeypatch):
             self.compute_type = compute_type
     monkeypatch.setenv("WHISPER_MODEL", "tiny")
     monkeypatch.setenv("WHISPER_COMPUTE_TYPE", "float32")
+    tr.model_cache.clear()
     with patch.object(tr, "WhisperModel", _DummyModel):
         m = tr._load_model()
+    tr.model_cache.clear()
     assert m.name == "tiny"
     assert m.device == "cpu"
     assert m.compute_type == "float32"
 
+def test_model_cache_reuses_and_evicts(monkeypatch):
+    from app.services import transcribe as tr
+    loads = []
+    class _DummyModel:
+        def __init__(self, name, device="cpu", compute_type=None):
+            loads.append(name)
+            self.name = name
+    monkeypatch.setenv("WHISPER_COMPUTE_TYPE", "int8")
+    cache = tr.ModelCache(budget_mb=300)
+    monkeypatch.setattr(tr, "model_cache", cache)
+    with patch.object(tr, "WhisperModel", _DummyModel):
+        a = tr._load_model("tiny")
+        b = tr._load_model("tiny")
+        assert a is b
+        tr._load_model("base")
+        tr._load_model("small")
+    assert loads == ["tiny", "base", "small"]
+    # small (244 MB en int8) desplaza a tiny y base del presupuesto de 300 MB
+    assert [k[0] for k in cache.keys()] == ["small"]
+
 def test_build_srt_vtt_time_boundaries():
     from app.services.transcribe import build_srt, build_vtt
     segs = [
@@ -124,6 +213,25 @@ def test_build_srt_vtt_time_boundaries():
     assert "00:00:00.000" in vtt
     assert "WEBVTT" in vtt
 
+def test_subtitle_timestamps_never_round_to_1000_ms():
+    import json
+    from app.services import exports
+    segs = [
+        {"start_ms": 1999.6, "end_ms": 59999.7, "text": " A "},
+        {"start_ms": 3599999.5, "end_ms": 360000005, "text": "B\tC"},
+    ]
+    docs = exports.render(("srt", "vtt", "tsv", "json"), segs)
+    assert "1\n00:00:02,000 --> 00:01:00,000\nA\n" in docs["srt"]
+    assert "\n2\n01:00:00,000 --> 100:00:00,005\nB\tC\n" in docs["srt"]
+    assert "00:00:02.000 --> 00:01:00.000" in docs["vtt"]
+    assert docs["tsv"] == "start\tend\ttext\n2000\t60000\tA\n3600000\t360000005\tB C\n"
+    assert [s["text"] for s in json.loads(docs["json"])] == [" A ", "B\tC"]
+    # Una sola pasada por lotes da lo mismo que cada formato por separado
+    many = [{"start_ms": i * 1500, "end_ms": i * 1500 + 999.5, "text": f"s{i}"} for i in range(2500)]
+    assert exports.render(("srt", "vtt"), many, batch_size=700) == {
+        fmt: "".join(exports.iter_export(fmt, many)) for fmt in ("srt", "vtt")
+    }
+
 def test_segments_bulk_and_pagination_order():
     from app import repo_segments, repo_transcriptions, repo_projects, repo_users, repo_audio_files
     u = repo_users.create_user("bulk@example.com", None, "x", "user")
@@ -140,6 +248,25 @@ def test_segments_bulk_and_pagination_order():
     assert page1[0]["start_ms"] == 0
     assert page2[0]["start_ms"] == 1000
 
+def test_segments_bulk_insert_accepts_generator():
+    from decimal import Decimal
+    from app import repo_segments
+    u = repo_users.create_user("copy@example.com", None, "x", "user")
+    p = repo_projects.create_project(u["id"], "Copy")
+    a = repo_audio_files.create_audio(p["id"], "/audios/audio.mp3")
+    t = repo_transcriptions.create_transcription(a["id"])
+    gen = (
+        {"start_ms": i * 10, "end_ms": i * 10 + 9, "text": f"s{i}", "confidence": 0.5 if i % 2 else None,
+         "speaker_label": "A" if i == 0 else None}
+        for i in range(3)
+    )
+    assert repo_segments.bulk_insert_segments(t["id"], gen) == 3
+    assert repo_segments.bulk_insert_segments(t["id"], iter([])) == 0
+    rows = repo_segments.list_segments(t["id"])
+    assert [(r["text"], r["confidence"], r["speaker_label"]) for r in rows] == [
+        ("s0", None, "A"), ("s1", Decimal("0.5"), None), ("s2", None, None)
+    ]
+
 def test_artifacts_uniqueness_on_upsert():
     from app import repo_artifacts, repo_transcriptions, repo_projects, repo_users, repo_audio_files
     u = repo_users.create_user("art@example.com", None, "x", "user")
@@ -151,3 +278,110 @@ def test_artifacts_uniqueness_on_upsert():
     arts = repo_artifacts.list_artifacts(t["id"])
     kinds = [x["kind"] for x in arts]
     assert kinds.count("srt") == 1
+
+def test_result_cache_reuses_previous_transcription(tmp_path):
+    from app import repo_segments
+    from app.services import result_cache
+    src = _wav(tmp_path / "voice.wav")
+    u = repo_users.create_user("cache@example.com", None, "x", "user")
+    p = repo_projects.create_project(u["id"], "Cache")
+    a = repo_audio_files.create_audio(project_id=p["id"], s3_uri=str(src))
+    before = result_cache.stats()
+
+    first = repo_transcriptions.create_transcription(audio_id=a["id"], language_hint="en")["id"]
+    with patch("app.services.transcribe._load_model", return_value=_FakeWhisperModel()) as load:
+        process_transcription(first)
+        assert load.call_count == 1
+        second = repo_transcriptions.create_transcription(audio_id=a["id"], language_hint="en")["id"]
+        process_transcription(second)
+        assert load.call_count == 1
+        other = repo_transcriptions.create_transcription(audio_id=a["id"], language_hint="en", beam_size=1)["id"]
+        process_transcription(other)
+        assert load.call_count == 2
+
+    t1, t2 = repo_transcriptions.get_transcription(first), repo_transcriptions.get_transcription(second)
+    assert t2["status"] == "succeeded"
+    assert t2["text_full"] == t1["text_full"] and t2["artifacts"] == t1["artifacts"]
+    assert _artifact_text(second, "srt") == _artifact_text(first, "srt")
+    assert [s["text"] for s in repo_segments.list_segments(second)] == ["Hello", "world"]
+    # Artefactos propios, no los archivos del origen
+    uri1, uri2 = (repo_artifacts.get_artifact(t, "json")["s3_uri"] for t in (first, second))
+    assert uri1 != uri2 and f'"transcription_id":"{second}"' in _artifact_text(second, "json")
+
+    after = result_cache.stats()
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 2
+    assert after["entries"] == 2
+
+def test_resolve_audio_uses_local_files_in_place(tmp_path):
+    from app import metrics
+    from app.services.transcribe import release_audio, resolve_audio
+    f = tmp_path / "long.wav"
+    f.write_bytes(b"x" * 4096)
+    before = metrics.snapshot()["observations"].get("audio_bytes_copied", {}).get("count", 0)
+
+    source = resolve_audio(str(f))
+    assert source == AudioSource(str(f), False, 0)
+    release_audio(source)
+    assert f.exists()
+
+    obs = metrics.snapshot()["observations"]["audio_bytes_copied"]
+    assert obs["count"] == before + 1 and obs["last"] == 0
+
+
+def test_async_export_yields_bounded_chunks():
+    import asyncio
+    from app.services import exports
+
+    async def _segments():
+        for i in range(3000):
+            yield {"start_ms": i * 1000, "end_ms": i * 1000 + 500, "text": f"línea {i}"}
+
+    async def _collect():
+        return [c async for c in exports.aiter_export("srt", _segments(), batch_size=500, chunk_bytes=4096)]
+
+    chunks = asyncio.run(_collect())
+    assert all(len(c) == 4096 for c in chunks[:-1]) and 0 < len(chunks[-1]) <= 4096
+    segs = [{"start_ms": i * 1000, "end_ms": i * 1000 + 500, "text": f"línea {i}"} for i in range(3000)]
+    assert b"".join(chunks).decode("utf-8") == exports.render(("srt",), segs)["srt"]
+
+
+def test_store_writes_several_artifacts_in_one_pass(tmp_path):
+    store = artifact_store.LocalArtifactStore(str(tmp_path))
+    parts = ({"srt": f"{i}\n", "vtt": f"v{i}\n"} for i in range(3))
+    uris = store.put_many("t1", parts)
+    with open(store.local_path(uris["vtt"]), encoding="utf-8") as f:
+        assert f.read() == "v0\nv1\nv2\n"
+
+    def _broken():
+        yield {"srt": "nuevo\n", "json": "["}
+        raise RuntimeError("boom")
+
+    try:
+        store.put_many("t1", _broken())
+    except RuntimeError:
+        pass
+    # La versión anterior queda intacta y no quedan archivos .part
+    assert sorted(p.name for p in (tmp_path / "t1").iterdir()) == ["srt.srt", "vtt.vtt"]
+    with open(store.local_path(uris["srt"]), encoding="utf-8") as f:
+        assert f.read() == "0\n1\n2\n"
+
+
+def test_result_cache_counts_lookups_in_process_and_flushes_deltas(monkeypatch):
+    from app import metrics, repo_result_cache
+    from app.services import result_cache
+
+    monkeypatch.setenv("S2X_RESULT_CACHE_STATS_FLUSH_SEC", "3600")
+    result_cache.flush_stats()
+    stored = repo_result_cache.stats()
+    before = metrics.snapshot()["counters"].get("result_cache.misses", 0)
+    for i in range(5):
+        assert result_cache.try_reuse(f"missing-{i}", "00000000-0000-0000-0000-000000000000") is None
+    # Sin escrituras por búsqueda: la fila compartida no cambia hasta el volcado
+    assert repo_result_cache.stats()["misses"] == stored["misses"]
+    assert result_cache.stats()["misses"] == stored["misses"] + 5
+    assert metrics.snapshot()["counters"]["result_cache.misses"] == before + 5
+
+    result_cache.flush_stats()
+    assert repo_result_cache.stats()["misses"] == stored["misses"] + 5
+    assert result_cache.stats()["misses"] == stored["misses"] + 5
@@ -1,3 +1,4 @@
+import os
 from unittest.mock import patch
 
 
@@ -8,8 +9,9 @@ def _bootstrap_audio(client):
     return a
 
 
-def test_transcription_create_and_poll(client):
+def test_transcription_create_and_poll(client, monkeypatch):
     a = _bootstrap_audio(client)
+    monkeypatch.setenv("S2X_JOB_EXECUTOR", "inline")
 
     with patch("app.routers.transcriptions.process_transcription", autospec=True) as proc_mock:
         r = client.post("/transcriptions", json={"audio_id": a["id"], "mode": "batch", "temperature": 0.0, "beam_size": 5})
@@ -23,6 +25,16 @@ def test_transcription_create_and_poll(client):
     assert r.status_code == 200
 
 
+def test_transcription_create_enqueues_for_worker(client):
+    a = _bootstrap_audio(client)
+    with patch("app.routers.transcriptions.process_transcription", autospec=True) as proc_mock:
+        r = client.post("/transcriptions", json={"audio_id": a["id"]})
+        assert r.status_code == 200, r.text
+        proc_mock.assert_not_called()
+    r = client.get(f"/transcriptions/{r.json()['id']}")
+    assert r.json()["status"] == "queued"
+
+
 def test_transcription_state_transitions(client):
     a = _bootstrap_audio(client)
     r = client.post("/transcriptions", json={"audio_id": a["id"]})
@@ -85,3 +97,163 @@ def test_transcription_failed_then_succeeded_allowed(client):
     payload = {"language_detected": "en", "confidence": 0.1, "text_full": "x", "artifacts": {"srt": "1", "vtt": "1"}}
     r = client.post(f"/transcriptions/{tid}/succeeded", json=payload)
     assert r.status_code == 200
+
+def test_transcription_rejects_unknown_model(client):
+    a = _bootstrap_audio(client)
+    with patch("app.routers.transcriptions.process_transcription", autospec=True) as proc_mock:
+        r = client.post("/transcriptions", json={"audio_id": a["id"], "model_name": "not-a-model"})
+        assert r.status_code == 400
+        proc_mock.assert_not_called()
+
+
+def test_async_routes_match_sync_repository(client):
+    from fastapi.encoders import jsonable_encoder
+    from app import repo_transcriptions
+
+    a = _bootstrap_audio(client)
+    tid = client.post("/transcriptions", json={"audio_id": a["id"]}).json()["id"]
+    # La ruta async devuelve la misma fila que el repositorio síncrono
+    full = client.get(f"/transcriptions/{tid}", params={"view": "full"}).json()
+    assert full == jsonable_encoder(repo_transcriptions.get_transcription(tid))
+    listed = client.get("/transcriptions", params={"audio_id": a["id"]}).json()
+    assert listed == jsonable_encoder(repo_transcriptions.list_transcriptions_by_audio(a["id"]))
+
+
+def test_transcription_views_and_heavy_resources(client):
+    a = _bootstrap_audio(client)
+    tid = client.post("/transcriptions", json={"audio_id": a["id"]}).json()["id"]
+    assert client.get(f"/transcriptions/{tid}/text").status_code == 404
+    client.post(f"/transcriptions/{tid}/running")
+    srt = "1\n00:00:00,000 --> 00:00:01,000\nhola\n"
+    client.post(f"/transcriptions/{tid}/succeeded", json={
+        "language_detected": "es", "confidence": 0.9, "text_full": "hola",
+        "artifacts": {"srt": srt, "vtt": "WEBVTT\n", "num_segments": 1},
+    })
+
+    status = client.get(f"/transcriptions/{tid}", params={"view": "status"}).json()
+    assert set(status) == {"id", "status", "progress", "mode", "started_at", "finished_at"}
+    assert status["status"] == "succeeded"
+    meta = client.get(f"/transcriptions/{tid}").json()
+    assert meta["language_detected"] == "es"
+    assert "text_full" not in meta and "artifacts" not in meta
+    assert client.get(f"/transcriptions/{tid}", params={"view": "blob"}).status_code == 400
+
+    r = client.get(f"/transcriptions/{tid}/text")
+    assert r.status_code == 200 and r.text == "hola"
+    assert r.headers["content-type"].startswith("text/plain")
+
+    listed = client.get(f"/transcriptions/{tid}/artifacts").json()
+    assert listed["num_segments"] == 1
+    assert [x["kind"] for x in listed["artifacts"]] == ["srt", "vtt"]
+    r = client.get(f"/transcriptions/{tid}/artifacts/srt")
+    assert r.status_code == 200 and r.text == srt
+    assert r.headers["content-type"].startswith("application/x-subrip")
+    assert client.get(f"/transcriptions/{tid}/artifacts/json").status_code == 404
+
+
+def test_artifact_download_from_store(client):
+    from app import repo_artifacts
+    from app.services import artifact_store
+
+    a = _bootstrap_audio(client)
+    tid = client.post("/transcriptions", json={"audio_id": a["id"]}).json()["id"]
+    body = "".join(f"{i}\n00:00:0{i % 10},000 --> 00:00:0{i % 10},500\nlínea {i}\n\n" for i in range(200))
+    uri = artifact_store.get_store().put(tid, "srt", [body])
+    repo_artifacts.upsert_artifact(tid, "srt", uri)
+    data = body.encode("utf-8")
+
+    assert [x["kind"] for x in client.get(f"/transcriptions/{tid}/artifacts").json()["artifacts"]] == ["srt"]
+    r = client.get(f"/transcriptions/{tid}/artifacts/srt")
+    assert r.status_code == 200 and r.content == data
+    assert r.headers["content-length"] == str(len(data))
+    etag = r.headers["etag"]
+
+    r = client.get(f"/transcriptions/{tid}/artifacts/srt", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    r = client.get(f"/transcriptions/{tid}/artifacts/srt", headers={"Range": "bytes=10-99"})
+    assert r.status_code == 206 and r.content == data[10:100]
+    assert r.headers["content-range"] == f"bytes 10-99/{len(data)}"
+    r = client.get(f"/transcriptions/{tid}/artifacts/srt", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert r.status_code == 200 and r.content == data
+    assert client.get(f"/transcriptions/{tid}/artifacts/vtt").status_code == 404
+
+    # Al borrar la transcripción también se borran sus archivos
+    path = artifact_store.get_store().local_path(uri)
+    assert client.delete(f"/transcriptions/{tid}").status_code == 200
+    assert not os.path.exists(path) and not os.path.exists(os.path.dirname(path))
+
+def _sse_events(body):
+    import json
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+def test_status_events_pushed_over_sse(client):
+    import threading
+    import time
+    from app import repo_transcriptions, transcription_events
+
+    a = _bootstrap_audio(client)
+    tid = client.post("/transcriptions", json={"audio_id": a["id"]}).json()["id"]
+    result = {}
+    reader = threading.Thread(target=lambda: result.update(r=client.get(f"/transcriptions/{tid}/events")))
+    reader.start()
+    deadline = time.time() + 5
+    while transcription_events.subscriber_count(tid) == 0 and time.time() < deadline:
+        time.sleep(0.01)
+
+    repo_transcriptions.mark_running(tid)
+    repo_transcriptions.update_progress(tid, 0.5)
+    repo_transcriptions.mark_succeeded(tid, "es", 0.9, "hola", {})
+    reader.join(timeout=10)
+
+    r = result["r"]
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(r.text)
+    assert [(e["status"], e["progress"]) for e in events] == [
+        ("queued", 0), ("running", 0), ("running", 0.5), ("succeeded", 1)
+    ]
+    assert events[-1]["finished_at"] is not None
+    assert transcription_events.subscriber_count(tid) == 0
+
+    # Ya terminada: un solo evento y se cierra
+    assert [e["status"] for e in _sse_events(client.get(f"/transcriptions/{tid}/events").text)] == ["succeeded"]
+    assert client.get("/transcriptions/00000000-0000-0000-0000-000000000000/events").status_code == 404
+
+def test_finished_transcription_etags_and_response_cache(client):
+    from app import repo_segments, repo_transcriptions
+
+    a = _bootstrap_audio(client)
+    tid = client.post("/transcriptions", json={"audio_id": a["id"]}).json()["id"]
+    client.post(f"/segments/{tid}", json={"start_ms": 0, "end_ms": 900, "text": "hola"})
+    client.post(f"/segments/{tid}", json={"start_ms": 1000, "end_ms": 1900, "text": "mundo"})
+
+    # En curso: ETag y 304, pero sin caché del cuerpo
+    r = client.get(f"/transcriptions/{tid}")
+    running_etag = r.headers["etag"]
+    assert r.headers["cache-control"] == "no-cache"
+    assert client.get(f"/transcriptions/{tid}", headers={"If-None-Match": running_etag}).status_code == 304
+    client.post(f"/transcriptions/{tid}/running")
+    client.post(f"/transcriptions/{tid}/succeeded", json={"language_detected": "es", "confidence": 0.9, "text_full": "hola mundo"})
+    r = client.get(f"/transcriptions/{tid}")
+    assert r.headers["etag"] != running_etag and r.json()["status"] == "succeeded"
+    etag = r.headers["etag"]
+
+    # Terminada: 304 y lecturas repetidas sin volver a buscar el cuerpo
+    assert client.get(f"/transcriptions/{tid}", headers={"If-None-Match": etag}).status_code == 304
+    segs = client.get(f"/segments/{tid}", params={"limit": 1})
+    seg_etag = segs.headers["etag"]
+    with patch.object(repo_transcriptions, "get_transcription_async", side_effect=AssertionError("body fetched")), \
+            patch.object(repo_segments, "list_segments_async", side_effect=AssertionError("segments fetched")):
+        assert client.get(f"/transcriptions/{tid}").json() == r.json()
+        cached = client.get(f"/segments/{tid}", params={"limit": 1})
+        assert cached.json() == segs.json() and cached.headers["x-next-cursor"] == segs.headers["x-next-cursor"]
+        r304 = client.get(f"/segments/{tid}", params={"limit": 1}, headers={"If-None-Match": seg_etag})
+        assert r304.status_code == 304 and r304.content == b""
+    all_etag = client.get(f"/segments/{tid}").headers["etag"]
+    assert all_etag != seg_etag
+
+    # Una edición de segmentos cambia ambas versiones: no se sirve lo cacheado
+    client.post(f"/segments/{tid}", json={"start_ms": 2000, "end_ms": 2500, "text": "agregado"})
+    segs2 = client.get(f"/segments/{tid}", headers={"If-None-Match": all_etag})
+    assert segs2.status_code == 200 and segs2.json()[-1]["text"] == "agregado"
+    assert client.get(f"/transcriptions/{tid}", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get(f"/segments/00000000-0000-0000-0000-000000000000").json() == []
@@ -0,0 +1,105 @@
+from concurrent.futures import wait
+
+from app import repo_transcriptions, repo_audio_files, repo_projects, repo_users
+from app.db_pool import get_conn
+from app.worker import Worker
+
+
+def _queued(n=1):
+    u = repo_users.create_user("worker@example.com", None, "x", "user")
+    p = repo_projects.create_project(u["id"], "W")
+    a = repo_audio_files.create_audio(p["id"], "/audios/audio.mp3")
+    return [str(repo_transcriptions.create_transcription(a["id"])["id"]) for _ in range(n)]
+
+
+def test_claim_skips_rows_already_claimed():
+    tids = _queued(3)
+    first = repo_transcriptions.claim_queued("w1", 2)
+    second = repo_transcriptions.claim_queued("w2", 5)
+    assert len(first) == 2 and len(second) == 1
+    claimed = {str(r["id"]) for r in first} | {str(r["id"]) for r in second}
+    assert claimed == set(tids)
+    assert all(r["status"] == "running" and r["attempts"] == 1 for r in first + second)
+    assert repo_transcriptions.claim_queued("w3", 5) == []
+
+
+def test_worker_runs_claimed_jobs(monkeypatch):
+    monkeypatch.setenv("S2X_DISABLE_WHISPER", "1")
+    tids = _queued(2)
+    worker = Worker(concurrency=2)
+    futures = worker.run_once()
+    assert len(futures) == 2
+    wait(futures)
+    for tid in tids:
+        assert repo_transcriptions.get_transcription(tid)["status"] == "succeeded"
+    assert worker.active_ids() == []
+
+
+def test_reaper_requeues_then_fails_stale_jobs():
+    (tid,) = _queued(1)
+    repo_transcriptions.claim_queued("dead-worker", 1)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE transcriptions SET heartbeat_at = NOW() - interval '5 minutes' WHERE id = %(id)s", {"id": tid})
+        conn.commit()
+
+    worker = Worker(stale_after=60, max_attempts=2)
+    assert worker.reap() == 1
+    t = repo_transcriptions.get_transcription(tid)
+    assert t["status"] == "queued" and t["worker_id"] is None
+
+    repo_transcriptions.claim_queued("dead-worker", 1)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE transcriptions SET heartbeat_at = NOW() - interval '5 minutes' WHERE id = %(id)s", {"id": tid})
+        conn.commit()
+    assert worker.reap() == 1
+    t = repo_transcriptions.get_transcription(tid)
+    assert t["status"] == "failed" and t["attempts"] == 2
+
+
+def test_heartbeat_only_touches_own_running_jobs():
+    (tid,) = _queued(1)
+    repo_transcriptions.claim_queued("w1", 1)
+    assert repo_transcriptions.heartbeat("w1", [tid]) == 1
+    assert repo_transcriptions.heartbeat("other", [tid]) == 0
+
+
+def test_reaper_fails_stream_sessions_whose_process_died():
+    u = repo_users.create_user("worker@example.com", None, "x", "user")
+    p = repo_projects.create_project(u["id"], "W")
+    a = repo_audio_files.create_audio(p["id"], "live://meeting")
+    tid = str(repo_transcriptions.create_transcription(a["id"], mode="stream")["id"])
+    repo_transcriptions.mark_running(tid)
+    t = repo_transcriptions.get_transcription(tid)
+    assert t["status"] == "running" and t["heartbeat_at"] is not None
+
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE transcriptions SET heartbeat_at = NOW() - interval '5 minutes' WHERE id = %(id)s", {"id": tid})
+        conn.commit()
+    # El audio en vivo no se puede repetir: no vuelve a la cola
+    assert Worker(stale_after=60, max_attempts=5).reap() == 1
+    assert repo_transcriptions.get_transcription(tid)["status"] == "failed"
+
+
+def test_artifact_sweep_removes_folders_of_cascaded_transcriptions(monkeypatch, tmp_path):
+    import uuid
+    from app.services import artifact_store
+
+    monkeypatch.setenv("S2X_ARTIFACT_DIR", str(tmp_path))
+    store = artifact_store.get_store()
+    u = repo_users.create_user("sweep@example.com", None, "x", "user")
+    kept_project = repo_projects.create_project(u["id"], "Keep")
+    gone_project = repo_projects.create_project(u["id"], "Gone")
+    kept = str(repo_transcriptions.create_transcription(
+        repo_audio_files.create_audio(kept_project["id"], "/audios/a.mp3")["id"])["id"])
+    gone = str(repo_transcriptions.create_transcription(
+        repo_audio_files.create_audio(gone_project["id"], "/audios/b.mp3")["id"])["id"])
+    for tid in (kept, gone, str(uuid.uuid4())):
+        store.put(tid, "srt", ["1\n"])
+    (tmp_path / "not-a-transcription").mkdir()
+
+    # El borrado del proyecto se lleva las filas en cascada, no los archivos
+    assert repo_projects.delete_project(gone_project["id"], u["id"])
+    assert (tmp_path / gone).is_dir()
+
+    assert Worker(concurrency=1).sweep_artifacts(batch_size=2) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([kept, "not-a-transcription"])
@@ -0,0 +1,11 @@
+-- Cola de trabajos de transcripción (backend/app/worker.py): qué worker tiene
+-- cada trabajo, su último latido y cuántas veces se intentó.
+ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS worker_id text;
+ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS heartbeat_at timestamptz;
+ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS attempts int NOT NULL DEFAULT 0;
+
+-- Reclamo de 'queued' por orden de llegada y detección de workers caídos
+CREATE INDEX IF NOT EXISTS idx_transcriptions_queued
+  ON transcriptions(started_at) WHERE status = 'queued' AND mode = 'batch';
+CREATE INDEX IF NOT EXISTS idx_transcriptions_running_hb
+  ON transcriptions(heartbeat_at) WHERE status = 'running';
@@ -0,0 +1,3 @@
+-- Avance de la transcripción (0..1) que el worker actualiza mientras guarda
+-- segmentos por lotes.
+ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS progress real NOT NULL DEFAULT 0;
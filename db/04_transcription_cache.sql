@@ -0,0 +1,19 @@
+-- Caché de resultados: hash del audio + parámetros -> transcripción ya resuelta
+-- (backend/app/repo_result_cache.py).
+CREATE TABLE IF NOT EXISTS transcription_cache (
+  cache_key          text PRIMARY KEY,
+  transcription_id   uuid NOT NULL
+                     CONSTRAINT fk_cache_transcription REFERENCES transcriptions(id) ON DELETE CASCADE,
+  size_bytes         bigint NOT NULL DEFAULT 0,
+  hits               bigint NOT NULL DEFAULT 0,
+  created_at         timestamptz NOT NULL DEFAULT now(),
+  last_hit_at        timestamptz
+);
+CREATE INDEX IF NOT EXISTS idx_transcription_cache_transcription ON transcription_cache(transcription_id);
+
+CREATE TABLE IF NOT EXISTS transcription_cache_stats (
+  id                 int PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  hits               bigint NOT NULL DEFAULT 0,
+  misses             bigint NOT NULL DEFAULT 0
+);
+INSERT INTO transcription_cache_stats (id) VALUES (1) ON CONFLICT DO NOTHING;
@@ -0,0 +1,29 @@
+-- Revisión de los segmentos de cada transcripción: la suben triggers por
+-- sentencia (una sola vez por INSERT/COPY/UPDATE/DELETE, no por fila) y la
+-- usan las exportaciones como ETag.
+ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS segments_rev bigint NOT NULL DEFAULT 0;
+ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS segments_updated_at timestamptz;
+
+CREATE OR REPLACE FUNCTION bump_segments_rev() RETURNS trigger AS $$
+BEGIN
+  UPDATE transcriptions t
+     SET segments_rev = t.segments_rev + 1, segments_updated_at = now()
+   WHERE t.id IN (SELECT DISTINCT transcription_id FROM changed_segments);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_segments_rev_insert ON segments;
+CREATE TRIGGER trg_segments_rev_insert AFTER INSERT ON segments
+  REFERENCING NEW TABLE AS changed_segments
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_segments_rev();
+
+DROP TRIGGER IF EXISTS trg_segments_rev_update ON segments;
+CREATE TRIGGER trg_segments_rev_update AFTER UPDATE ON segments
+  REFERENCING NEW TABLE AS changed_segments
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_segments_rev();
+
+DROP TRIGGER IF EXISTS trg_segments_rev_delete ON segments;
+CREATE TRIGGER trg_segments_rev_delete AFTER DELETE ON segments
+  REFERENCING OLD TABLE AS changed_segments
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_segments_rev();
@@ -0,0 +1,40 @@
+-- Avisos de cambios en shares para las cachés de resolución por token de la
+-- API (canal 'shares_changed', ver backend/app/share_cache.py). Los triggers
+-- son por sentencia y mandan 'share:<id>,<id>,...' en grupos de 200 ids
+-- (cada aviso queda bajo el límite de 8000 bytes de pg_notify), así que un
+-- borrado por lotes de expirados no vacía la caché entera; TRUNCATE avisa '*'.
+CREATE OR REPLACE FUNCTION notify_shares_changed() RETURNS trigger AS $$
+DECLARE
+  payload text;
+BEGIN
+  IF TG_OP = 'TRUNCATE' THEN
+    PERFORM pg_notify('shares_changed', '*');
+    RETURN NULL;
+  END IF;
+  FOR payload IN
+    SELECT 'share:' || string_agg(id::text, ',')
+      FROM (SELECT id, (row_number() OVER () - 1) / 200 AS grp FROM changed_shares) c
+     GROUP BY grp
+  LOOP
+    PERFORM pg_notify('shares_changed', payload);
+  END LOOP;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_shares_notify_update ON shares;
+CREATE TRIGGER trg_shares_notify_update AFTER UPDATE ON shares
+  REFERENCING NEW TABLE AS changed_shares
+  FOR EACH STATEMENT EXECUTE FUNCTION notify_shares_changed();
+
+DROP TRIGGER IF EXISTS trg_shares_notify_delete ON shares;
+CREATE TRIGGER trg_shares_notify_delete AFTER DELETE ON shares
+  REFERENCING OLD TABLE AS changed_shares
+  FOR EACH STATEMENT EXECUTE FUNCTION notify_shares_changed();
+
+DROP TRIGGER IF EXISTS trg_shares_notify_truncate ON shares;
+CREATE TRIGGER trg_shares_notify_truncate AFTER TRUNCATE ON shares
+  FOR EACH STATEMENT EXECUTE FUNCTION notify_shares_changed();
+
+-- Los cambios de estado de transcriptions llegan por 'transcription_events'
+-- (db/08_transcription_events.sql), que la caché también escucha.
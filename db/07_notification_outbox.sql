@@ -0,0 +1,13 @@
+-- Estado de entrega de notifications para el despachador (backend/app/notifier.py):
+-- intentos, próximo intento (backoff), último error y la reserva del despachador
+-- que la tomó (locked_by hasta locked_until) para que nadie más la envíe.
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS attempts int NOT NULL DEFAULT 0;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS next_attempt_at timestamptz NOT NULL DEFAULT now();
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS last_error text;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS sent_at timestamptz;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS locked_by text;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS locked_until timestamptz;
+
+-- Cola de pendientes en el orden en que se reclaman
+CREATE INDEX IF NOT EXISTS idx_notifications_pending_next
+  ON notifications (next_attempt_at, id) WHERE status = 'pending';
@@ -0,0 +1,22 @@
+-- Eventos de estado de las transcripciones: cada transición (mark_running,
+-- mark_succeeded, mark_failed, los reclamos y reencolados del worker) y cada
+-- avance de progreso hace pg_notify en 'transcription_events' con un JSON
+-- {id, status, previous_status, progress, finished_at}. La API los reparte por SSE
+-- (GET /transcriptions/{tid}/events) desde una sola conexión LISTEN por
+-- proceso. El aviso sale al confirmar la transacción que hizo el cambio.
+CREATE OR REPLACE FUNCTION notify_transcription_event() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('transcription_events', json_build_object(
+    'id', NEW.id, 'status', NEW.status, 'previous_status', OLD.status,
+    'progress', NEW.progress, 'finished_at', NEW.finished_at
+  )::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transcriptions_status_notify ON transcriptions;
+DROP FUNCTION IF EXISTS notify_transcription_status();
+DROP TRIGGER IF EXISTS trg_transcriptions_events ON transcriptions;
+CREATE TRIGGER trg_transcriptions_events AFTER UPDATE OF status, progress ON transcriptions
+  FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.progress IS DISTINCT FROM NEW.progress)
+  EXECUTE FUNCTION notify_transcription_event();
@@ -0,0 +1,15 @@
+-- Versión de la fila de transcriptions: sube con cada UPDATE (incluidos los
+-- que hacen los triggers de segments_rev), así que sirve de ETag fuerte para
+-- GET /transcriptions/{tid} y, junto con segments_rev, para GET /segments/{tid}.
+ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS rev bigint NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION bump_transcription_rev() RETURNS trigger AS $$
+BEGIN
+  NEW.rev := OLD.rev + 1;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transcriptions_rev ON transcriptions;
+CREATE TRIGGER trg_transcriptions_rev BEFORE UPDATE ON transcriptions
+  FOR EACH ROW EXECUTE FUNCTION bump_transcription_rev();
@@ -0,0 +1,4 @@
+-- sha256 de los bytes de cada audio, calculado una vez por el worker. Con el
+-- PCM ya en caché la clave del caché de resultados sale de aquí sin volver a
+-- resolver (ni descargar) la fuente.
+ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS content_sha256 text;
@@ -0,0 +1,12 @@
+-- Índices compuestos para la paginación por keyset de los listados:
+-- cada uno cubre el filtro por padre y el orden (clave, id) del cursor.
+CREATE INDEX IF NOT EXISTS idx_segments_tid_start_id
+  ON segments (transcription_id, start_ms, id);
+CREATE INDEX IF NOT EXISTS idx_transcriptions_audio_started_id
+  ON transcriptions (audio_id, started_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audio_files_project_created_id
+  ON audio_files (project_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_projects_owner_created_id
+  ON projects (owner_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_tid_created_id
+  ON notifications (transcription_id, created_at DESC, id DESC);
@@ -0,0 +1,4 @@
+-- Barrido de shares expirados (repo_shares.cleanup_expired): solo indexa las
+-- filas que pueden expirar y las recorre en orden de expires_at.
+CREATE INDEX IF NOT EXISTS idx_shares_expires_at
+  ON shares (expires_at) WHERE expires_at IS NOT NULL;
@@ -1,3 +1,8 @@
 -- Índice trigram para búsqueda rápida en text_full
 CREATE INDEX IF NOT EXISTS idx_transcriptions_text_trgm
   ON transcriptions USING gin (text_full gin_trgm_ops);
+
+-- Búsqueda por palabras/frases en segmentos (GET /search?mode=phrase); la
+-- expresión debe coincidir con la de app/repo_search.py
+CREATE INDEX IF NOT EXISTS idx_segments_text_tsv
+  ON segments USING gin (to_tsvector('simple', text));